@@ -8,6 +8,7 @@ Bot Telegram per gestione report pulizie giornalieri
 
 import os
 import sys
+import asyncio
 import logging
 import shutil
 import pandas as pd
@@ -15,19 +16,12 @@ from datetime import datetime
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 
-# PDF generation
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-
 # Import dal nostro sistema
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'funzioni'))
 from elabora_giro_giornaliero import MasterProcessor
+from http_client import client_http
+from report_pdf import ReportPDF, raggruppa_operatori, report_operatore, nome_file_operatore
+from coda_elaborazioni import CodaElaborazioni, job_elabora_pdf, job_genera_output, job_genera_pdf_operatore
 
 # Setup logging
 logging.basicConfig(
@@ -36,6 +30,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Righe di stato mostrate all'utente quando un job completa una fase
+FASI_ELABORAZIONE = {
+    'parsing': "✅ Lettura PDF completata",
+    'materiali': "✅ Materiali calcolati",
+    'percorso': "✅ Percorso ottimizzato",
+    'totali': "✅ Totali calcolati",
+    'log': "📝 Log di controllo salvato",
+    'pdf': "📄 Report PDF generato",
+    'pdf_operatori': "👤 Report per operatore generati",
+}
+
 
 class TelegramBotPulizie:
     """Bot Telegram per gestione report pulizie"""
@@ -59,9 +64,16 @@ class TelegramBotPulizie:
         for dir_path in [self.pdf_input_dir, self.pdf_output_dir, self.logs_dir]:
             os.makedirs(dir_path, exist_ok=True)
         
-        # Inizializza processore
+        # Inizializza processore (nel processo del bot serve per il percorso async)
         self.processor = MasterProcessor()
         
+        # Generazione report (anche in processo worker, vedi CodaElaborazioni)
+        self.report_pdf = ReportPDF(self.logs_dir)
+        
+        # Elaborazioni pesanti in un pool di processi (più processi che job:
+        # i PDF per operatore di un job vengono generati in parallelo)
+        self.coda = CodaElaborazioni(max_job_concorrenti=2, max_processi=max(2, min(4, os.cpu_count() or 1)))
+        
         logger.info("Bot inizializzato")
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -116,9 +128,11 @@ Sono il bot per la gestione dei report pulizie giornalieri.
             return
         
         try:
+            job_id = self.coda.nuovo_job()
+            
             # Messaggio di attesa
             status_msg = await update.message.reply_text(
-                "⏳ **Elaborazione in corso...**\n\n"
+                f"⏳ **Elaborazione in corso...** (job {job_id})\n\n"
                 "📥 Download PDF...\n"
                 "⚙️ Analisi appartamenti...\n"
                 "🗺️ Ottimizzazione percorso...\n"
@@ -134,38 +148,62 @@ Sono il bot per la gestione dei report pulizie giornalieri.
             pdf_input_path = os.path.join(self.pdf_input_dir, input_filename)
             await file.download_to_drive(pdf_input_path)
             
-            logger.info(f"PDF ricevuto e salvato: {input_filename}")
-            
-            # Elabora PDF
-            await status_msg.edit_text(
-                "⏳ **Elaborazione in corso...**\n\n"
-                "✅ Download completato\n"
-                "⚙️ Analisi appartamenti in corso..."
-            )
-            
-            report = self.processor.elabora_pdf(pdf_input_path)
-            
-            if not report:
-                await status_msg.edit_text(
-                    "❌ **Errore elaborazione**\n\n"
-                    "Non sono riuscito ad elaborare il PDF.\n"
-                    "Verifica che sia un report pulizie valido."
-                )
-                return
-            
-            # Genera file LOG (solo salvato, non inviato)
-            await status_msg.edit_text(
-                "⏳ **Elaborazione in corso...**\n\n"
-                "✅ Download completato\n"
-                "✅ Analisi completata\n"
-                "📝 Generazione report PDF..."
-            )
+            logger.info(f"[{job_id}] PDF ricevuto e salvato: {input_filename}")
             
-            self.generate_control_log(report, timestamp)
+            # Righe di stato aggiornate man mano che i worker completano le fasi
+            stato = ["✅ Download completato"]
             
-            # Genera report PDF
-            pdf_output_path = os.path.join(self.pdf_output_dir, f"report_{timestamp}.pdf")
-            self.generate_pdf_report(report, pdf_output_path)
+            async def aggiorna_stato(fase: str = None):
+                if fase:
+                    stato.append(FASI_ELABORAZIONE.get(fase, f"✅ {fase}"))
+                try:
+                    await status_msg.edit_text(
+                        f"⏳ **Elaborazione in corso...** (job {job_id})\n\n" + "\n".join(stato)
+                    )
+                except Exception as e:
+                    # Es. "message is not modified": non blocca l'elaborazione
+                    logger.debug(f"[{job_id}] Stato non aggiornato: {e}")
+            
+            if self.coda.piena:
+                stato.append(f"🕒 In coda ({self.coda.job_in_attesa + 1}° in attesa)...")
+                await aggiorna_stato()
+            
+            async with self.coda.slot(job_id, on_progress=aggiorna_stato):
+                if stato[-1].startswith("🕒"):
+                    stato.pop()
+                stato.append("⚙️ Analisi appartamenti in corso...")
+                await aggiorna_stato()
+                
+                # Parsing + materiali in un processo worker
+                report = await self.coda.esegui(job_elabora_pdf, job_id, pdf_input_path)
+                
+                if not report:
+                    await status_msg.edit_text(
+                        "❌ **Errore elaborazione**\n\n"
+                        "Non sono riuscito ad elaborare il PDF.\n"
+                        "Verifica che sia un report pulizie valido."
+                    )
+                    return
+                
+                # Percorso ottimizzato con chiamate Google Maps non bloccanti
+                await self.processor.ottimizza_percorso_async(report)
+                await aggiorna_stato('percorso')
+                
+                # Un PDF per operatore, in parallelo nei worker: ognuno disegna (e mette
+                # in cache) il dettaglio del proprio operatore
+                pdf_output_path = os.path.join(self.pdf_output_dir, f"report_{timestamp}.pdf")
+                pdf_operatori = self._pdf_operatori(report, timestamp)
+                if pdf_operatori:
+                    await asyncio.gather(*(
+                        self.coda.esegui(job_genera_pdf_operatore, job_id, report_operatore(report, operatore), path)
+                        for operatore, path in pdf_operatori.items()
+                    ))
+                    await aggiorna_stato('pdf_operatori')
+                
+                # LOG di controllo (solo salvato, non inviato) + report PDF completo,
+                # che riusa le sezioni operatore appena disegnate
+                await self.coda.esegui(job_genera_output, job_id, report, self.logs_dir,
+                                       timestamp, pdf_output_path)
             
             # Invia risultati
             await status_msg.edit_text(
@@ -173,13 +211,20 @@ Sono il bot per la gestione dei report pulizie giornalieri.
                 "📤 Invio report..."
             )
             
-            # Invia solo il report PDF
-            with open(pdf_output_path, 'rb') as f:
-                await update.message.reply_document(
-                    document=f,
-                    filename=f'report_pulizie_{datetime.now().strftime("%Y%m%d")}.pdf',
-                    caption="📄 **Report Pulizie Giornaliero**"
-                )
+            # Invia il report PDF completo, poi quelli per operatore tutti insieme
+            data_str = datetime.now().strftime("%Y%m%d")
+            await self._invia_pdf(update, pdf_output_path, f'report_pulizie_{data_str}.pdf',
+                                  "📄 **Report Pulizie Giornaliero**")
+            
+            operatori_tasks, _ = raggruppa_operatori(report['tasks'])
+            esiti = await asyncio.gather(*(
+                self._invia_pdf(update, path, f'report_pulizie_{data_str}_{nome_file_operatore(operatore)}.pdf',
+                                f"👤 **{operatore}** - {len(operatori_tasks[operatore])} immobili")
+                for operatore, path in pdf_operatori.items()
+            ), return_exceptions=True)
+            for operatore, esito in zip(pdf_operatori, esiti):
+                if isinstance(esito, Exception):
+                    logger.warning(f"[{job_id}] PDF operatore {operatore} non inviato: {esito}")
             
             # Riepilogo
             summary = report.get('summary', {})
@@ -195,6 +240,29 @@ Sono il bot per la gestione dei report pulizie giornalieri.
                 except (ValueError, TypeError):
                     continue
             
+            # Un link per operatore (giri per operatore)
+            giri_text = ''.join(
+                f"• {giro['operatore']}: {giro['total_distance_km']:.1f} km\n{giro['route_url']}\n"
+                for giro in route_info.get('giri', []) if giro.get('route_url')
+            )
+            
+            # PDF corretto rimandato in giornata: solo le differenze
+            delta = report.get('delta')
+            delta_text = f"\n🔄 **Modifiche rispetto al piano precedente:**\n{delta['testo']}\n" if delta else ''
+            
+            pdf_operatori_text = f" (+ {len(pdf_operatori)} per operatore)" if pdf_operatori else ""
+            
+            # Parti del PDF che GPT non ha interpretato: l'elenco non è completo
+            chunk_falliti = report.get('chunk_falliti') or []
+            falliti_text = ''
+            if chunk_falliti:
+                falliti_text = (
+                    f"\n⚠️ **ATTENZIONE: elenco INCOMPLETO**\n"
+                    f"{len(chunk_falliti)} parti del PDF non interpretate da GPT:\n"
+                    + ''.join(f"• da \"{f['prima_riga']}\"\n" for f in chunk_falliti)
+                    + "Rimanda il PDF per ritentare.\n"
+                )
+            
             summary_text = f"""
 ✅ **ELABORAZIONE COMPLETATA**
 
@@ -203,25 +271,25 @@ Sono il bot per la gestione dei report pulizie giornalieri.
 • Check-in: {summary.get('check_in', 0)}
 • Check-out: {summary.get('check_out', 0)}
 • Materiali totali: {tot_materiali} articoli
-
+{falliti_text}{delta_text}
 🗺️ **Percorso:**
 • Distanza: {route_info.get('total_distance_km', 0):.1f} km
 • Durata: {route_info.get('total_duration_minutes', 0)} minuti
 
 🔗 **Google Maps:**
-{route_info.get('route_url', 'N/A')}
-
+{route_info.get('route_url') or 'N/A'}
+{giri_text}
 💾 File salvati:
 • PDF Input: pdf_input/{input_filename}
 • TXT Estratto: pdf_input/pdf_to_txt_input/estratto_{timestamp}.txt
-• PDF Output: pdf_output/report_{timestamp}.pdf
+• PDF Output: pdf_output/report_{timestamp}.pdf{pdf_operatori_text}
 • Log Controllo: logs/log_{timestamp}.txt
             """
             
             await update.message.reply_text(summary_text)
             await status_msg.delete()
             
-            logger.info(f"Elaborazione completata: {input_filename}")
+            logger.info(f"[{job_id}] Elaborazione completata: {input_filename}")
             
         except Exception as e:
             logger.error(f"Errore elaborazione: {e}")
@@ -235,446 +303,27 @@ Sono il bot per la gestione dei report pulizie giornalieri.
     
 
     
+    def _pdf_operatori(self, report: dict, timestamp: str) -> dict:
+        """Path del PDF di ogni operatore (nessuno se c'è un solo operatore: basta il completo)"""
+        _, operatori = raggruppa_operatori(report['tasks'])
+        if len(operatori) < 2:
+            return {}
+        return {
+            operatore: os.path.join(self.pdf_output_dir, f"report_{timestamp}_{nome_file_operatore(operatore)}.pdf")
+            for operatore in operatori
+        }
+    
+    async def _invia_pdf(self, update: Update, path: str, filename: str, caption: str):
+        with open(path, 'rb') as f:
+            await update.message.reply_document(document=f, filename=filename, caption=caption)
+    
     def generate_control_log(self, report: dict, timestamp: str) -> str:
-        """
-        Genera file LOG di controllo con tutti i match e calcoli
-        Salvato solo localmente in logs/, non inviato in chat
-        
-        Args:
-            report: Report generato dal processor
-            timestamp: Timestamp unico per il file
-            
-        Returns:
-            Path del file LOG
-        """
-        log_path = os.path.join(self.logs_dir, f'log_{timestamp}.txt')
-        
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write("═" * 79 + "\n")
-            f.write(f"{'FILE LOG DI CONTROLLO - ' + datetime.now().strftime('%d/%m/%Y %H:%M'):^79}\n")
-            f.write("═" * 79 + "\n\n")
-            
-            f.write("📋 RIEPILOGO ELABORAZIONE\n")
-            f.write("─" * 79 + "\n")
-            f.write(f"PDF Fonte: {report.get('pdf_source', 'N/A')}\n")
-            f.write(f"Data Elaborazione: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-            f.write(f"Totale Appartamenti Trovati: {report.get('totale_task', len(report.get('tasks', [])))}\n")
-            f.write(f"Check-in: {report.get('summary', {}).get('check_in', 0)}\n")
-            f.write(f"Check-out: {report.get('summary', {}).get('check_out', 0)}\n\n\n")
-            
-            f.write("🏠 APPARTAMENTI RICONOSCIUTI E ANALIZZATI\n")
-            f.write("═" * 79 + "\n\n")
-            
-            for i, task in enumerate(report['tasks'], 1):
-                f.write(f"┌─ APPARTAMENTO {i:02d} " + "─" * 60 + "┐\n")
-                f.write(f"│ Nome Proprietà: {task['nome_proprieta']:<64}│\n")
-                f.write(f"│ Nome OTA: {task['nome_ota']:<70}│\n")
-                f.write(f"│ Indirizzo: {task['indirizzo']:<67}│\n")
-                f.write("├" + "─" * 77 + "┤\n")
-                f.write(f"│ N. Persone: {task['num_persone']:<66}│\n")
-                f.write(f"│ Magazzino: {task.get('magazzino', 'N/A'):<67}│\n")
-                f.write("├" + "─" * 77 + "┤\n")
-                f.write(f"│ 🛏️  STRUTTURA:                                                          │\n")
-                f.write(f"│   • Camere Matrimoniali: {int(task.get('camere_matrimoniali', 0)):<47}│\n")
-                f.write(f"│   • Camere Singole: {int(task.get('camere_singole', 0)):<52}│\n")
-                f.write(f"│   • Bagni: {int(task.get('bagni', 0)):<63}│\n")
-                f.write("├" + "─" * 77 + "┤\n")
-                f.write(f"│ 📦 MATERIALI CALCOLATI:                                                 │\n")
-                
-                materiali = task.get('materiali_necessari', {})
-                for mat_key, qty in materiali.items():
-                    # Converti qty a intero (può essere stringa dall'Excel)
-                    try:
-                        qty_int = int(qty) if qty != '' else 0
-                    except (ValueError, TypeError):
-                        continue
-                    
-                    if qty_int > 0:
-                        nome_mat = mat_key.replace('_', ' ').title()
-                        f.write(f"│   • {nome_mat}: {qty_int} {('set' if 'lenzuola' in mat_key else 'pz'):<50}│\n")
-                
-                f.write("├" + "─" * 77 + "┤\n")
-                if task.get('note'):
-                    # Spezza note lunghe
-                    note_lines = [task['note'][i:i+70] for i in range(0, len(task['note']), 70)]
-                    f.write(f"│ 📝 NOTE:                                                                │\n")
-                    for line in note_lines:
-                        f.write(f"│   {line:<73}│\n")
-                    f.write("├" + "─" * 77 + "┤\n")
-                
-                f.write(f"│ 🔍 CONTESTO RAW (per verifica):                                         │\n")
-                context_lines = [task.get('raw_context', 'N/A')[i:i+70] for i in range(0, min(len(task.get('raw_context', '')), 140), 70)]
-                for line in context_lines:
-                    f.write(f"│   {line:<73}│\n")
-                
-                f.write("└" + "─" * 77 + "┘\n\n")
-            
-            # Sezione materiali totali
-            f.write("\n" + "═" * 79 + "\n")
-            f.write("📊 RIEPILOGO MATERIALI TOTALI\n")
-            f.write("═" * 79 + "\n\n")
-            
-            for mat, qty in report['materiali_totali'].items():
-                # Salta campi non-materiali
-                if mat in ['flag_preparare_lenzuola', 'tipo_macchina_caffe']:
-                    continue
-                
-                # Converti qty a intero (può essere stringa dall'Excel)
-                try:
-                    qty_int = int(qty) if qty != '' else 0
-                except (ValueError, TypeError):
-                    continue
-                
-                nome_mat = mat.replace('_', ' ').title()
-                unita = 'set' if 'lenzuola' in mat else 'pz'
-                f.write(f"{nome_mat:<50} {qty_int:>5} {unita}\n")
-            
-            # Sezione route
-            if report.get('route_info'):
-                f.write("\n\n" + "═" * 79 + "\n")
-                f.write("🗺️  INFORMAZIONI PERCORSO\n")
-                f.write("═" * 79 + "\n\n")
-                route = report['route_info']
-                f.write(f"Distanza Totale: {route['total_distance_km']:.2f} km\n")
-                f.write(f"Durata Stimata: {route['total_duration_minutes']} minuti\n")
-                f.write(f"Ordine Ottimizzato: {route.get('optimized_order', [])}\n\n")
-                f.write(f"Link Google Maps:\n{route.get('route_url', 'N/A')}\n")
-            
-            # Footer
-            f.write("\n\n" + "═" * 79 + "\n")
-            f.write(f"{'FINE LOG DI CONTROLLO':^79}\n")
-            f.write("═" * 79 + "\n")
-            f.write(f"Generato automaticamente da Bot Telegram Pulizie\n")
-            f.write(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-        
-        logger.info(f"Log di controllo generato: {log_path}")
-        return log_path
+        """Genera file LOG di controllo (vedi ReportPDF.generate_control_log)"""
+        return self.report_pdf.generate_control_log(report, timestamp)
     
     def generate_pdf_report(self, report: dict, output_path: str):
-        """
-        Genera report PDF professionale
-        
-        Args:
-            report: Report generato dal processor
-            output_path: Path dove salvare il PDF
-        """
-        doc = SimpleDocTemplate(output_path, pagesize=A4,
-                                rightMargin=2*cm, leftMargin=2*cm,
-                                topMargin=2*cm, bottomMargin=2*cm)
-        
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Stili custom
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#1f4788'),
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#2c5aa0'),
-            spaceAfter=12,
-            spaceBefore=16
-        )
-        
-        # Header
-        story.append(Paragraph("REPORT PULIZIE GIORNALIERO", title_style))
-        story.append(Paragraph(f"Data: {datetime.now().strftime('%d/%m/%Y')}", styles['Normal']))
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Riepilogo generale
-        story.append(Paragraph("📊 RIEPILOGO GENERALE", heading_style))
-        
-        summary_data = [
-            ['Totale Appartamenti:', str(report.get('totale_task', len(report.get('tasks', []))))]
-        ]
-        
-        summary_table = Table(summary_data, colWidths=[8*cm, 8*cm])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-        ]))
-        story.append(summary_table)
-        story.append(Spacer(1, 0.5*cm))
-        
-        # === SOMMARIO PER OPERATORE ===
-        story.append(Paragraph("👤 SOMMARIO PER OPERATORE", heading_style))
-        
-        # Raggruppa task per operatore
-        operatori_tasks = {}
-        for task in report['tasks']:
-            operatore = task.get('operatore', 'Non assegnato')
-            if operatore not in operatori_tasks:
-                operatori_tasks[operatore] = []
-            operatori_tasks[operatore].append(task)
-        
-        # Ordina operatori alfabeticamente (ma "Non assegnato" alla fine)
-        operatori_ordinati = sorted([op for op in operatori_tasks.keys() if op != 'Non assegnato'])
-        if 'Non assegnato' in operatori_tasks:
-            operatori_ordinati.append('Non assegnato')
-        
-        # Crea tabella sommario per ogni operatore
-        for operatore in operatori_ordinati:
-            tasks_operatore = operatori_tasks[operatore]
-            num_immobili = len(tasks_operatore)
-            
-            # Header operatore con colore distintivo
-            op_header_data = [[f"👤 {operatore} ({num_immobili} immobili)"]]
-            op_header_table = Table(op_header_data, colWidths=[16*cm])
-            op_header_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#673AB7')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ]))
-            story.append(op_header_table)
-            
-            # Lista immobili per questo operatore
-            for idx, task in enumerate(tasks_operatore, 1):
-                nome_prop = task.get('nome_proprieta', 'N/A')
-                indirizzo = task.get('indirizzo', 'N/A')
-                tipo_evento = task.get('tipo_evento', 'N/A')
-                num_persone = task.get('num_persone', 0)
-                
-                # Verifica se esterno
-                pulizie_interne = task.get('pulizie_interne', True)
-                is_esterno = str(pulizie_interne).lower() in ['falso', 'false', 'no', '0']
-                badge_esterno = " 🔶" if is_esterno else ""
-                
-                immobile_data = [[f"  {idx}. {nome_prop}{badge_esterno} | {tipo_evento} | 👥 {num_persone} pers. | 📍 {indirizzo[:40]}..."]]
-                immobile_table = Table(immobile_data, colWidths=[16*cm])
-                immobile_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#EDE7F6')),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                    ('TOPPADDING', (0, 0), (-1, -1), 4),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ]))
-                story.append(immobile_table)
-            
-            story.append(Spacer(1, 0.3*cm))
-        
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Percorso ottimizzato
-        if report.get('route_info'):
-            route = report['route_info']
-            story.append(Paragraph("🗺️ PERCORSO OTTIMIZZATO", heading_style))
-            
-            route_data = [
-                ['Distanza Totale:', f"{route.get('total_distance_km', 0):.2f} km"],
-                ['Durata Stimata:', f"{route.get('total_duration_minutes', 0)} minuti"]
-            ]
-            
-            route_table = Table(route_data, colWidths=[8*cm, 8*cm])
-            route_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-            ]))
-            story.append(route_table)
-            story.append(Spacer(1, 0.3*cm))
-            
-            # Google Maps link (troncato se troppo lungo)
-            maps_url = route.get('route_url', 'N/A')
-            if len(maps_url) > 100:
-                maps_url = maps_url[:100] + '...'
-            story.append(Paragraph(f"<i>Link Google Maps: {maps_url}</i>", styles['Normal']))
-            story.append(Spacer(1, 0.5*cm))
-        
-        # Materiali totali
-        story.append(Paragraph("📦 MATERIALI NECESSARI TOTALI", heading_style))
-        
-        materiali_data = [['Materiale', 'Quantità']]
-        for mat, qty in report['materiali_totali'].items():
-            # Salta campi non-materiali
-            if mat in ['flag_preparare_lenzuola', 'tipo_macchina_caffe']:
-                continue
-            
-            # Converti qty a intero (può essere stringa dall'Excel)
-            try:
-                qty_int = int(qty) if qty != '' else 0
-            except (ValueError, TypeError):
-                continue
-            
-            nome = mat.replace('_', ' ').title()
-            unita = 'set' if 'lenzuola' in mat else 'pz'
-            materiali_data.append([nome, f"{qty_int} {unita}"])
-        
-        materiali_table = Table(materiali_data, colWidths=[12*cm, 4*cm])
-        materiali_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-        ]))
-        story.append(materiali_table)
-        
-        # Info lenzuola esterne
-        if report.get('lenzuola_esterne'):
-            lenz = report['lenzuola_esterne']
-            story.append(Paragraph("ℹ️ INFO LENZUOLA TOTALI", heading_style))
-            lenz_text = f"Set lenzuola TOTALI (tutte incluse, interne ed esterne): {lenz['set_lenzuola_matrimoniali']} matrimoniali, {lenz['set_lenzuola_singole']} singole"
-            story.append(Paragraph(lenz_text, styles['Normal']))
-            story.append(Spacer(1, 0.5*cm))
-        
-        # Nuova pagina per dettaglio task
-        story.append(PageBreak())
-        
-        # LISTA UNICA APPARTAMENTI (tutti insieme, senza distinzioni)
-        story.append(Paragraph("📋 LISTA APPARTAMENTI (ORDINE PERCORSO)", heading_style))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Itera su TUTTI i task senza distinzioni
-        for i, task in enumerate(report['tasks'], 1):
-                # Box per ogni appartamento
-                operatore = task.get('operatore', 'Non assegnato')
-                destinazione = task.get('destinazione_riferimento', 'Abitazione/cantina')
-                ha_cantina = task.get('ha_cantina', False)
-                
-                # Determina dove portare i materiali
-                if destinazione == 'Abitazione/cantina':
-                    luogo_materiali = "🔑 MATERIALI IN CANTINA" if ha_cantina else "⬆️ SALIRE IN APPARTAMENTO"
-                else:
-                    luogo_materiali = f"📦 PORTARE IN MAGAZZINO: {destinazione}"
-                
-                # Usa note come titolo SOLO se flag titolo_note=True
-                note_task = task.get('note', '').strip()
-                usa_note = task.get('titolo_note', False)
-                titolo_task = note_task if (usa_note and note_task) else task['nome_proprieta']
-                
-                # Verifica se appartamento ha pulizie esterne (Pulizie Interne = Falso)
-                pulizie_interne = task.get('pulizie_interne', True)  # Default True
-                is_esterno = str(pulizie_interne).lower() in ['falso', 'false', 'no', '0']
-                
-                # Aggiungi badge ESTERNO se necessario
-                if is_esterno:
-                    titolo_task = f"{titolo_task} 🔶 ESTERNO"
-                
-                task_data = [
-                    [f"#{i} - {titolo_task}"],
-                    [f"👤 Operatore: {operatore}"],
-                    [f"{luogo_materiali}"],
-                    [f"🏠 {task['tipo_evento']} - {task['tipo_pulizia']}"],
-                    [f"📍 {task['indirizzo']}"],
-                    [f"👥 {task['num_persone']} persone | 🛏️ {int(task.get('camere_matrimoniali', 0))}M + {int(task.get('camere_singole', 0))}S | 🚿 {int(task.get('bagni', 0))} bagni"],
-                ]
-                
-                # Colori diversi per appartamenti esterni
-                if is_esterno:
-                    header_color = colors.HexColor('#FF6F00')  # Arancione scuro
-                    body_color = colors.HexColor('#FFE0B2')    # Arancione chiaro
-                else:
-                    header_color = colors.HexColor('#2196F3')  # Blu
-                    body_color = colors.HexColor('#E3F2FD')    # Blu chiaro
-                
-                task_table = Table(task_data, colWidths=[16*cm])
-                task_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, 0), header_color),
-                    ('TEXTCOLOR', (0, 0), (0, 0), colors.whitesmoke),
-                    ('BACKGROUND', (0, 1), (0, -1), body_color),
-                    ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-                ]))
-                story.append(task_table)
-                
-                # Materiali per questo task
-                self._add_materiali_to_story(story, task, styles)
-                
-                # Note (se presenti) subito dopo i materiali
-                note_complete = task.get('note_raw', '').strip() or task.get('note', '').strip()
-                if note_complete:
-                    note_box_data = [[Paragraph(f'<font size=8><b>📝 NOTE:</b> <i>{note_complete}</i></font>', styles['Normal'])]]
-                    note_box = Table(note_box_data, colWidths=[16*cm])
-                    note_box.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFFDE7')),
-                        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#FBC02D')),
-                        ('TOPPADDING', (0, 0), (-1, -1), 6),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                        ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                    ]))
-                    story.append(note_box)
-                
-                story.append(Spacer(1, 0.4*cm))
-        
-        # Footer
-        story.append(Spacer(1, 1*cm))
-        story.append(Paragraph(f"<i>Report generato automaticamente - {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>", 
-                               styles['Normal']))
-        
-        # Build PDF
-        doc.build(story)
-        logger.info(f"Report PDF generato: {output_path}")
-    
-    def _add_materiali_to_story(self, story, task, styles):
-        """Helper per aggiungere materiali nel PDF + messaggi informativi"""
-        materiali = task.get('materiali_necessari', {})
-        
-        mat_list = []
-        tipo_macchina = None
-        messaggi_info = materiali.get('_messaggi_info', [])
-        
-        for mat, qty in materiali.items():
-            # Salta campi speciali
-            if mat in ['tipo_macchina_caffe', '_messaggi_info']:
-                if mat == 'tipo_macchina_caffe':
-                    tipo_macchina = qty
-                continue
-            
-            try:
-                qty_int = int(qty) if qty != '' else 0
-            except (ValueError, TypeError):
-                continue
-            
-            if qty_int > 0:
-                nome = mat.replace('_', ' ').title()
-                unita = 'set' if 'lenzuola' in mat else 'pz'
-                mat_list.append(f"• {nome}: {qty_int} {unita}")
-        
-        if mat_list:
-            mat_text = "<br/>".join(mat_list)
-            
-            # Aggiungi info macchina caffè
-            if tipo_macchina and tipo_macchina != 'Non specificata':
-                mat_text += f"<br/><b>☕ Macchina caffè: {tipo_macchina}</b>"
-            
-            story.append(Paragraph(f'<font size=8>📦 <b>Materiali:</b><br/>{mat_text}</font>', styles['Normal']))
-        
-        # MESSAGGI INFORMATIVI (se presenti)
-        if messaggi_info:
-            story.append(Spacer(1, 0.2*cm))
-            msg_text = "<br/>".join(messaggi_info)
-            story.append(Paragraph(f'<font size=8 color="#0066CC"><i>{msg_text}</i></font>', styles['Normal']))
+        """Genera report PDF professionale (vedi ReportPDF.generate_pdf_report)"""
+        self.report_pdf.generate_pdf_report(report, output_path)
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handler errori globale"""
@@ -686,12 +335,17 @@ Sono il bot per la gestione dei report pulizie giornalieri.
                 "Riprova o contatta l'amministratore."
             )
     
+    async def post_shutdown(self, application: Application):
+        """Chiude le connessioni keep-alive verso Google Maps e il pool di processi"""
+        await client_http.chiudi()
+        self.coda.chiudi()
+    
     def run(self):
         """Avvia il bot"""
         logger.info("Avvio bot Telegram...")
         
         # Crea application
-        application = Application.builder().token(self.token).build()
+        application = Application.builder().token(self.token).post_shutdown(self.post_shutdown).build()
         
         # Handler
         application.add_handler(CommandHandler("start", self.start))
@@ -0,0 +1,156 @@
+"""
+Anagrafica appartamenti condivisa (Database/appartamenti.xlsx)
+
+Il file Excel viene letto una volta sola e riletto solo quando cambia
+(mtime/size). Tiene:
+- le righe come dict (stesso formato di row.to_dict())
+- un indice dict su 'Ciao Booking Nome' per i lookup O(1)
+- un indice a trigrammi su 'Ciao Booking Nome' e 'Nome OTA' (IndiceNomi),
+  costruito alla prima richiesta
+- le coordinate ('Coordinate GPS' = "lat,lon") per indirizzo, usate dal
+  calcolo del percorso locale
+- i nomi operatore della colonna 'Operatore' (se presente), usati
+  dall'estrattore locale delle righe
+
+Usata da GPTPDFParser (lista master e indice per il match dei nomi) e da
+MasterProcessor (calcolo materiali per task).
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from indice_nomi import IndiceNomi, normalizza_nome
+
+
+def _percorso_default() -> str:
+    # Database condiviso a livello superiore (parent della root del bot)
+    bot_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(os.path.dirname(bot_dir), 'Database', 'appartamenti.xlsx')
+
+
+def _parse_coordinate(valore) -> Optional[Tuple[float, float]]:
+    """'44.63,10.91' -> (44.63, 10.91); None se mancante o non valido"""
+    if not isinstance(valore, str) or ',' not in valore:
+        return None
+    try:
+        lat, lon = (float(x) for x in valore.split(',', 1))
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class AnagraficaAppartamenti:
+    """DataFrame appartamenti in memoria con indice per nome"""
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: Percorso appartamenti.xlsx (default: Database/appartamenti.xlsx)
+        """
+        self.path = path or _percorso_default()
+        self._lock = threading.RLock()
+        self._firma = None
+        self._righe: List[Dict] = []
+        self._per_nome: Dict[str, Dict] = {}
+        self._indice: Optional[IndiceNomi] = None
+        self._coordinate: Dict[str, Tuple[float, float]] = {}
+        self._operatori: List[str] = []
+
+    def esiste(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _valida(self):
+        """Rilegge l'Excel solo se mtime/size sono cambiati"""
+        st = os.stat(self.path)
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._firma:
+            return
+
+        df = pd.read_excel(self.path)
+        righe = df.to_dict('records')
+
+        per_nome = {}
+        coordinate = {}
+        operatori = {}
+        for riga in righe:
+            operatore = riga.get('Operatore')
+            if isinstance(operatore, str) and operatore.strip():
+                operatori.setdefault(operatore.strip(), None)
+
+            indirizzo = riga.get('Indirizzo')
+            coord = _parse_coordinate(riga.get('Coordinate GPS'))
+            if isinstance(indirizzo, str) and coord is not None:
+                coordinate.setdefault(normalizza_nome(indirizzo), coord)
+
+            nome = riga.get('Ciao Booking Nome')
+            if not isinstance(nome, str):
+                continue
+            # Come df[df[col] == nome].iloc[0]: vince la prima riga
+            per_nome.setdefault(nome, riga)
+
+        self._righe = righe
+        self._per_nome = per_nome
+        self._indice = None
+        self._coordinate = coordinate
+        self._operatori = list(operatori)
+        self._firma = firma
+        print(f"[OK] Anagrafica appartamenti caricata: {len(righe)} record")
+
+    def versione(self) -> str:
+        """Firma del file Excel caricato (cambia quando l'anagrafica viene modificata)"""
+        with self._lock:
+            self._valida()
+            return f"{self._firma[0]}:{self._firma[1]}"
+
+    def righe(self) -> List[Dict]:
+        """Tutte le righe come dict, nell'ordine dell'Excel"""
+        with self._lock:
+            self._valida()
+            return self._righe
+
+    def indice(self) -> IndiceNomi:
+        """Indice a trigrammi sui nomi (ricostruito se l'Excel cambia)"""
+        with self._lock:
+            self._valida()
+            if self._indice is None:
+                self._indice = IndiceNomi(self._righe)
+            return self._indice
+
+    def coordinate(self, indirizzo: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) dell'appartamento con questo indirizzo (a meno di maiuscole/punteggiatura)"""
+        if not indirizzo:
+            return None
+        with self._lock:
+            self._valida()
+            return self._coordinate.get(normalizza_nome(indirizzo))
+
+    def operatori(self) -> List[str]:
+        """Valori distinti della colonna 'Operatore' (vuoto se la colonna manca)"""
+        with self._lock:
+            self._valida()
+            return self._operatori
+
+    def get(self, nome: str) -> Optional[Dict]:
+        """Riga con 'Ciao Booking Nome' esattamente uguale a nome"""
+        with self._lock:
+            self._valida()
+            return self._per_nome.get(nome)
+
+
+# Istanza condivisa per processo
+_anagrafica = None
+_anagrafica_lock = threading.Lock()
+
+
+def get_anagrafica() -> AnagraficaAppartamenti:
+    """Anagrafica condivisa da parser, calcolo materiali e percorso"""
+    global _anagrafica
+    with _anagrafica_lock:
+        if _anagrafica is None:
+            _anagrafica = AnagraficaAppartamenti()
+        return _anagrafica
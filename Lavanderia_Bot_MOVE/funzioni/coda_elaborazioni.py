@@ -0,0 +1,198 @@
+"""
+Coda elaborazioni PDF - MO.VE Property Management
+Esegue le parti pesanti del workflow (pdfplumber, GPT, pandas, reportlab) in
+un pool di processi, così l'event loop del bot resta libero per gli altri
+coordinatori.
+
+- ogni elaborazione ha un job_id
+- al massimo max_job_concorrenti job alla volta, gli altri aspettano in coda
+- i worker inviano eventi di progresso (job_id, fase) su una multiprocessing
+  Queue; un thread del processo principale li inoltra alle callback async
+  registrate per quel job
+- esegui() non occupa slot: dentro il proprio slot un job può lanciare più
+  chiamate in parallelo (es. un PDF per operatore) con asyncio.gather
+
+Le funzioni eseguite nei worker sono a livello di modulo (devono essere
+picklable anche con il metodo di avvio 'spawn' usato su Windows).
+"""
+
+import uuid
+import queue
+import asyncio
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Awaitable, Dict, Optional
+
+
+# ==================== LATO WORKER ====================
+
+_coda_progresso = None      # multiprocessing.Queue verso il processo principale
+_processor = None           # MasterProcessor, uno per processo worker
+_report_pdf = None          # ReportPDF, uno per processo worker
+
+
+def _inizializza_worker(coda_progresso):
+    """Initializer del pool: salva la coda progressi nel processo worker"""
+    global _coda_progresso
+    _coda_progresso = coda_progresso
+
+
+def _notifica(job_id: str, fase: str):
+    if _coda_progresso is not None:
+        _coda_progresso.put((job_id, fase))
+
+
+def job_elabora_pdf(job_id: str, pdf_path: str) -> Optional[dict]:
+    """Parsing PDF + calcolo materiali (senza percorso, fatto in async dal bot)"""
+    global _processor
+    if _processor is None:
+        from elabora_giro_giornaliero import MasterProcessor
+        _processor = MasterProcessor()
+
+    return _processor.elabora_pdf(
+        pdf_path,
+        ottimizza_percorso=False,
+        progress_callback=lambda fase: _notifica(job_id, fase)
+    )
+
+
+def job_genera_output(job_id: str, report: dict, logs_dir: str, timestamp: str, pdf_output_path: str) -> str:
+    """LOG di controllo + report PDF"""
+    global _report_pdf
+    if _report_pdf is None:
+        from report_pdf import ReportPDF
+        _report_pdf = ReportPDF(logs_dir)
+
+    _report_pdf.logs_dir = logs_dir
+    _report_pdf.generate_control_log(report, timestamp)
+    _notifica(job_id, 'log')
+    _report_pdf.generate_pdf_report(report, pdf_output_path)
+    _notifica(job_id, 'pdf')
+    return pdf_output_path
+
+
+def job_genera_pdf_operatore(job_id: str, report_operatore: dict, pdf_output_path: str) -> str:
+    """Report PDF di un solo operatore (report già ridotto con report_operatore)"""
+    global _report_pdf
+    if _report_pdf is None:
+        from report_pdf import ReportPDF
+        _report_pdf = ReportPDF(None)
+
+    _report_pdf.generate_pdf_report(report_operatore, pdf_output_path)
+    return pdf_output_path
+
+
+# ==================== LATO BOT ====================
+
+CallbackProgresso = Callable[[str], Awaitable[None]]
+
+
+class CodaElaborazioni:
+    """Pool di processi con job_id, limite di job concorrenti e progressi async"""
+
+    def __init__(self, max_job_concorrenti: int = 2, max_processi: int = 2):
+        """
+        Args:
+            max_job_concorrenti: Elaborazioni contemporanee (le altre attendono in coda)
+            max_processi: Processi worker del pool
+        """
+        self.max_job_concorrenti = max_job_concorrenti
+        self.max_processi = max_processi
+
+        self._ctx = multiprocessing.get_context('spawn')
+        self._coda_progresso = self._ctx.Queue()
+        self._pool = None
+        self._semaforo = None
+        self._loop = None
+        self._callbacks: Dict[str, CallbackProgresso] = {}
+        self._in_attesa = 0
+        self._thread_progressi = None
+        self._chiusa = False
+
+    def _avvia(self):
+        """Crea pool, semaforo e thread progressi alla prima richiesta (dentro l'event loop)"""
+        if self._pool is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._semaforo = asyncio.Semaphore(self.max_job_concorrenti)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_processi,
+            mp_context=self._ctx,
+            initializer=_inizializza_worker,
+            initargs=(self._coda_progresso,)
+        )
+        self._thread_progressi = threading.Thread(
+            target=self._inoltra_progressi, name='coda-progressi', daemon=True
+        )
+        self._thread_progressi.start()
+        print(f"[OK] Coda elaborazioni avviata ({self.max_processi} processi, max {self.max_job_concorrenti} job)")
+
+    def _inoltra_progressi(self):
+        """Thread: legge gli eventi dei worker e li passa alle callback nel loop"""
+        while not self._chiusa:
+            try:
+                job_id, fase = self._coda_progresso.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            callback = self._callbacks.get(job_id)
+            if callback is not None:
+                asyncio.run_coroutine_threadsafe(self._chiama(callback, fase), self._loop)
+
+    @staticmethod
+    async def _chiama(callback: CallbackProgresso, fase: str):
+        try:
+            await callback(fase)
+        except Exception as e:
+            print(f"[WARN] Errore callback progresso: {e}")
+
+    def nuovo_job(self) -> str:
+        return uuid.uuid4().hex[:8]
+
+    @property
+    def piena(self) -> bool:
+        """True se tutti gli slot sono occupati (un nuovo job finirebbe in coda)"""
+        return self._semaforo is not None and self._semaforo.locked()
+
+    @property
+    def job_in_attesa(self) -> int:
+        """Job che aspettano uno slot libero"""
+        return self._in_attesa
+
+    @contextlib.asynccontextmanager
+    async def slot(self, job_id: str, on_progress: CallbackProgresso = None):
+        """
+        Riserva uno dei max_job_concorrenti slot per tutta la durata del job.
+        on_progress(fase) riceve gli eventi inviati dai worker per questo job.
+        """
+        self._avvia()
+        self._in_attesa += 1
+        try:
+            await self._semaforo.acquire()
+        finally:
+            self._in_attesa -= 1
+
+        if on_progress is not None:
+            self._callbacks[job_id] = on_progress
+        try:
+            yield
+        finally:
+            self._callbacks.pop(job_id, None)
+            self._semaforo.release()
+
+    async def esegui(self, funzione, *args):
+        """Esegue funzione(*args) in un processo worker e ne attende il risultato"""
+        self._avvia()
+        return await self._loop.run_in_executor(self._pool, funzione, *args)
+
+    def chiudi(self):
+        """Ferma il pool (attende i job in corso)"""
+        self._chiusa = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
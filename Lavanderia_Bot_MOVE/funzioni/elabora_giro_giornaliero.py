@@ -11,10 +11,13 @@ import sys
 import glob
 import json
 from datetime import datetime
-import pandas as pd
 
 from route_optimizer import RouteOptimizer
 from gpt_pdf_parser import GPTPDFParser
+from anagrafica_appartamenti import get_anagrafica
+from motore_regole import MotoreRegole
+from piano_giornaliero import (ArchivioPiani, assegna_chiavi, firma_task, firma_materiali,
+                               confronta, delta_materiali, testo_delta)
 
 
 class MasterProcessor:
@@ -27,49 +30,29 @@ class MasterProcessor:
         # Directory input PDF
         self.input_dir = os.path.join(self.base_dir, 'pdf_input')
         
-        # Carica regole materiali
-        self.regole_bagno = self._load_regole_bagno()
+        # Regole materiali compilate in matrice (ricaricate se l'Excel cambia)
+        # Database condiviso a livello superiore
+        regole_path = os.path.join(os.path.dirname(self.base_dir), 'Database', 'Regole', 'regole_materiali.xlsx')
+        self.motore_regole = MotoreRegole(regole_path)
         self.regole_camera = self._load_regole_camera()
-        self.regole_cucina = self._load_regole_cucina()
+        
+        # Anagrafica appartamenti condivisa (Excel letto una volta, riletto se cambia)
+        self.anagrafica = get_anagrafica()
         
         # Parser PDF con GPT (unico parser)
-        self.gpt_parser = GPTPDFParser()
+        self.gpt_parser = GPTPDFParser(anagrafica=self.anagrafica)
         
         # Route optimizer
-        self.route_optimizer = RouteOptimizer()
+        self.route_optimizer = RouteOptimizer(anagrafica=self.anagrafica)
         
-        print("[OK] Master Processor inizializzato")
-    
-    def _load_regole_bagno(self):
-        """Carica regole materiali per bagno da Excel con tipo_calcolo dinamico"""
-        # Database condiviso a livello superiore
-        regole_path = os.path.join(os.path.dirname(self.base_dir), 'Database', 'Regole', 'regole_materiali.xlsx')
+        # True: un giro per operatore (deposito, capacità, orari check-in)
+        # False: giro unico dal magazzino centrale
+        self.giri_per_operatore = True
         
-        if not os.path.exists(regole_path):
-            print("[ERROR] File regole_materiali.xlsx NON trovato!")
-            print(f"[ERROR] Percorso atteso: {regole_path}")
-            raise FileNotFoundError(f"File regole_materiali.xlsx obbligatorio non trovato in {regole_path}")
+        # Ultimo piano di ogni giornata, per i PDF corretti rimandati lo stesso giorno
+        self.archivio_piani = ArchivioPiani()
         
-        df = pd.read_excel(regole_path, sheet_name='Regole per Bagno', skiprows=1)
-        regole = []
-        
-        for _, row in df.iterrows():
-            articolo = str(row['Articolo']).strip()
-            qty = row['Quantità per Bagno']
-            tipo_calcolo = int(row['se 1=per persona se 2=per numero di bagni se 0= commento in cella di fianco'])
-            
-            # Leggi messaggio dalla colonna Note (se presente)
-            messaggio = row.get('Note', row.get('se 1=per persona se 2=per numero di bagni se 0= commento in cella di fianco', '')) if tipo_calcolo == 0 else ''
-            
-            regole.append({
-                'articolo': articolo,
-                'quantita': int(qty) if pd.notna(qty) else 0,
-                'tipo_calcolo': tipo_calcolo,  # 1=persona, 2=bagni, 0=messaggio
-                'messaggio': str(messaggio).strip() if pd.notna(messaggio) and messaggio else ''
-            })
-        
-        print(f"[OK] Caricate regole bagno: {len(regole)} articoli")
-        return regole
+        print("[OK] Master Processor inizializzato")
     
     def _load_regole_camera(self):
         """
@@ -84,34 +67,13 @@ class MasterProcessor:
             'doppia': 2         # 2 set per camera doppia (se mai usata)
         }
     
-    def _load_regole_cucina(self):
-        """Carica regole materiali cucina da Excel con tipo_calcolo dinamico"""
-        # Database condiviso a livello superiore
-        regole_path = os.path.join(os.path.dirname(self.base_dir), 'Database', 'Regole', 'regole_materiali.xlsx')
-        
-        if not os.path.exists(regole_path):
-            print("[ERROR] File regole_materiali.xlsx NON trovato!")
-            print(f"[ERROR] Percorso atteso: {regole_path}")
-            raise FileNotFoundError(f"File regole_materiali.xlsx obbligatorio non trovato in {regole_path}")
-        
-        df = pd.read_excel(regole_path, sheet_name='Regole Cucina', skiprows=1)
-        regole = []
-        
-        for _, row in df.iterrows():
-            articolo = str(row['Articolo']).strip()
-            qty = row['Quantità Base']
-            tipo_calcolo = int(row['se 1=per persona se 2=per numero di bagni se 0= commento in cella di fianco'])
-            note = row.get('Note', '')
-            
-            regole.append({
-                'articolo': articolo,
-                'quantita': int(qty) if pd.notna(qty) else 0,
-                'tipo_calcolo': tipo_calcolo,  # 1=persona, 2=bagni, 0=messaggio
-                'messaggio': str(note).strip() if pd.notna(note) and note else ''
-            })
-        
-        print(f"[OK] Caricate regole cucina: {len(regole)} articoli")
-        return regole
+    @property
+    def regole_bagno(self):
+        return self.motore_regole.regole_bagno
+    
+    @property
+    def regole_cucina(self):
+        return self.motore_regole.regole_cucina
     
     def calcola_materiali_intelligente(self, appartamento_info, num_persone):
         """
@@ -119,61 +81,11 @@ class MasterProcessor:
         - tipo_calcolo = 1: moltiplica per num_persone
         - tipo_calcolo = 2: moltiplica per num_bagni
         - tipo_calcolo = 0: messaggio informativo (non conta nelle somme)
-        """
-        
-        materiali = {}
-        messaggi_info = []
-        
-        # Ottieni info appartamento
-        num_bagni = int(appartamento_info.get('Bagni', 1))
-        num_camere_matrimoniali = int(appartamento_info.get('Camere Matrimoniali', 0))
-        num_camere_singole = int(appartamento_info.get('Camere Singole', 0))
-        tipo_macchina_caffe = appartamento_info.get('Tipologia Cialde Caffè', 'Non specificata')
-        
-        # === REGOLE PER BAGNO (dinamiche) ===
-        for regola in self.regole_bagno:
-            articolo = regola['articolo']
-            qty_base = regola['quantita']
-            tipo_calcolo = regola['tipo_calcolo']
-            messaggio = regola.get('messaggio', '')
-            
-            articolo_key = articolo.lower().replace(' ', '_').replace('/', '_')
-            
-            if tipo_calcolo == 1:
-                materiali[articolo_key] = qty_base * num_persone
-            elif tipo_calcolo == 2:
-                materiali[articolo_key] = qty_base * num_bagni
-            elif tipo_calcolo == 0 and messaggio:
-                messaggi_info.append(f"ℹ️ {articolo}: {messaggio}")
-        
-        # === REGOLE PER CAMERA (set lenzuola) ===
-        materiali['set_lenzuola_matrimoniali'] = num_camere_matrimoniali
-        materiali['set_lenzuola_singole'] = num_camere_singole
-        
-        # === REGOLE CUCINA (dinamiche) ===
-        for regola in self.regole_cucina:
-            articolo = regola['articolo']
-            qty_base = regola['quantita']
-            tipo_calcolo = regola['tipo_calcolo']
-            messaggio = regola.get('messaggio', '')
-            
-            articolo_key = articolo.lower().replace(' ', '_').replace('/', '_').replace('+', '_')
-            
-            if tipo_calcolo == 1:
-                materiali[articolo_key] = qty_base * num_persone
-            elif tipo_calcolo == 2:
-                materiali[articolo_key] = qty_base * num_bagni
-            elif tipo_calcolo == 0 and messaggio:
-                messaggi_info.append(f"ℹ️ {articolo}: {messaggio}")
-        
-        # Info macchina caffè
-        materiali['tipo_macchina_caffe'] = tipo_macchina_caffe
         
-        # Aggiungi messaggi informativi
-        if messaggi_info:
-            materiali['_messaggi_info'] = messaggi_info
-        
-        return materiali
+        Per più task insieme usare self.motore_regole.materiali_tasks (un solo
+        prodotto matriciale per tutta la giornata).
+        """
+        return self.motore_regole.materiali_tasks([(appartamento_info, num_persone)])[0]
     
     def trova_pdf_input(self):
         """Trova PDF più recente in cartella input"""
@@ -196,10 +108,27 @@ class MasterProcessor:
         print(f"[OK] PDF trovato: {os.path.basename(latest_pdf)}")
         return latest_pdf
     
-    def elabora_pdf(self, pdf_path):
+    def elabora_pdf(self, pdf_path, ottimizza_percorso=True, progress_callback=None, confronta_piano=True):
         """
         Elabora PDF: parsing → calcolo materiali intelligente → route optimization
+        
+        Con ottimizza_percorso=False lo step 3 viene saltato: il bot lo esegue
+        dopo con ottimizza_percorso_async() senza bloccare l'event loop.
+        
+        Con confronta_piano=True, se per la data del giro (intestazione del PDF)
+        c'è già un piano elaborato (PDF corretto rimandato) i materiali dei
+        task invariati vengono riusati e report['delta'] riassume le
+        differenze; il piano viene poi sostituito.
+        
+        progress_callback(fase: str), se indicato, viene chiamato alla fine di
+        ogni step ('parsing', 'materiali', 'percorso', 'totali').
         """
+        def progresso(fase):
+            if progress_callback:
+                try:
+                    progress_callback(fase)
+                except Exception as e:
+                    print(f"[WARN] Errore callback progresso: {e}")
         
         print("\n" + "="*70)
         print("ELABORAZIONE PDF")
@@ -223,11 +152,28 @@ class MasterProcessor:
         print(f"[OK] Trovati {len(report['tasks'])} appartamenti")
         
         # Step 2: Ricalcola materiali con regole intelligenti + materiali extra da GPT
+        progresso('parsing')
+        
         print("\n[STEP 2] Calcolo materiali con regole intelligenti...")
         
+        # Piano già elaborato per la stessa giornata (PDF corretto): task abbinati per chiave
+        if not report.get('data_giro'):
+            print("[WARN] Data del giro non trovata nel PDF: uso la data di elaborazione")
+        piano_precedente = self.archivio_piani.precedente(report) if confronta_piano else None
+        tasks_precedenti = {}
+        if piano_precedente:
+            tasks_precedenti = {t.get('chiave_piano'): t for t in piano_precedente['tasks']}
+            print(f"[INFO] Piano precedente del {piano_precedente.get('data')} trovato "
+                  f"({piano_precedente.get('pdf_source')}): ricalcolo solo i task cambiati")
+        assegna_chiavi(report['tasks'])
+        versione_regole = self.motore_regole.versione()
+        
+        da_calcolare = []  # (task, apt_info, num_persone)
+        riusati = 0
         for task in report['tasks']:
             nome_apt = task['nome_proprieta']
             num_persone = task.get('num_persone', 2)
+            task['firma_piano'] = firma_task(task)
             
             # CASO SPECIALE: Appartamenti generici (senza DB)
             if task.get('appartamento_generico', False):
@@ -254,42 +200,59 @@ class MasterProcessor:
                 task['materiali_necessari'] = materiali_smart
                 continue
             
-            # Carica database appartamenti (Database condiviso a livello superiore)
-            appartamenti_file = os.path.join(os.path.dirname(self.base_dir), 'Database', 'appartamenti.xlsx')
-            df_appartamenti = pd.read_excel(appartamenti_file)
+            # Trova info appartamento (lookup O(1) sull'anagrafica condivisa)
+            apt_info = self.anagrafica.get(nome_apt)
             
-            # Trova info appartamento da Excel
-            apt_row = df_appartamenti[
-                df_appartamenti['Ciao Booking Nome'] == nome_apt
-            ]
+            if apt_info is not None:
+                task['firma_materiali'] = firma_materiali(
+                    self.motore_regole.caratteristiche(apt_info, num_persone),
+                    apt_info.get('Tipologia Cialde Caffè'), versione_regole
+                )
+                precedente = tasks_precedenti.get(task['chiave_piano'])
+                if (precedente and precedente.get('materiali_necessari')
+                        and precedente.get('firma_materiali') == task['firma_materiali']):
+                    # Stesso appartamento, persone e regole: materiali invariati
+                    task['materiali_necessari'] = dict(precedente['materiali_necessari'])
+                    riusati += 1
+                    continue
+                da_calcolare.append((task, apt_info, num_persone))
+        
+        if riusati:
+            print(f"  [OK] Materiali invariati riusati dal piano precedente: {riusati} task")
+        
+        # Materiali di tutti i task in un solo prodotto matriciale (senza materiali extra)
+        materiali_calcolati = self.motore_regole.materiali_tasks(
+            [(apt_info, num_persone) for _, apt_info, num_persone in da_calcolare]
+        )
+        for (task, _, num_persone), materiali_smart in zip(da_calcolare, materiali_calcolati):
+            # Assegna materiali al task
+            task['materiali_necessari'] = materiali_smart
             
-            if not apt_row.empty:
-                apt_info = apt_row.iloc[0].to_dict()
-                
-                # Calcola materiali dalle regole (senza materiali extra)
-                materiali_smart = self.calcola_materiali_intelligente(apt_info, num_persone)
-                
-                # Assegna materiali al task
-                task['materiali_necessari'] = materiali_smart
-                
-                # Conta solo articoli numerici (esclude tipo_macchina_caffe)
-                num_articoli = sum(v for k, v in materiali_smart.items() if isinstance(v, (int, float)))
-                print(f"  [OK] {nome_apt}: {num_persone} persone → {num_articoli} articoli")
+            # Conta solo articoli numerici (esclude tipo_macchina_caffe)
+            num_articoli = sum(v for k, v in materiali_smart.items() if isinstance(v, (int, float)))
+            print(f"  [OK] {task['nome_proprieta']}: {num_persone} persone → {num_articoli} articoli")
         
         # Step 3: Ottimizza route
+        progresso('materiali')
+        
         print("\n[STEP 3] Ottimizzazione percorso...")
         
-        if self.route_optimizer.api_key:
+        if not ottimizza_percorso:
+            print("[INFO] Ottimizzazione percorso rimandata al chiamante")
+        elif self.route_optimizer.disponibile:
             # optimize_tasks_route ritorna (tasks_ordinati, route_info)
-            tasks_ordinati, route_info = self.route_optimizer.optimize_tasks_route(report['tasks'])
-            report['route_info'] = route_info
-            report['tasks'] = tasks_ordinati  # Task già riordinati
-            
-            print(f"[OK] Route ottimizzata: {route_info['total_distance_km']:.1f} km, {route_info['total_duration_minutes']} min")
+            if self.giri_per_operatore:
+                tasks_ordinati, route_info = self.route_optimizer.optimize_tasks_per_operatore(report['tasks'])
+            else:
+                tasks_ordinati, route_info = self.route_optimizer.optimize_tasks_route(report['tasks'])
+            self._applica_route(report, tasks_ordinati, route_info)
         else:
-            print("[WARN] Google Maps API key mancante, skip route optimization")
+            print("[WARN] Nessun risolutore percorso disponibile, skip route optimization")
         
         # Step 4: Calcola materiali totali e separa task speciali
+        if ottimizza_percorso:
+            progresso('percorso')
+        
         print("\n[STEP 4] Calcolo materiali totali...")
         
         tasks_generici = []
@@ -365,14 +328,64 @@ class MasterProcessor:
         }
         report['totale_task'] = len(report['tasks'])
         
+        # Differenze rispetto al piano precedente di oggi
+        if piano_precedente:
+            esito = confronta(piano_precedente['tasks'], report['tasks'])
+            delta = {
+                'pdf_precedente': piano_precedente.get('pdf_source'),
+                'aggiunti': [t['nome_proprieta'] for t in esito['aggiunti']],
+                'rimossi': [t['nome_proprieta'] for t in esito['rimossi']],
+                'modificati': [t['nome_proprieta'] for t in esito['modificati']],
+                'materiali': delta_materiali(piano_precedente.get('materiali_totali', {}), materiali_totali),
+            }
+            delta['testo'] = testo_delta(delta)
+            report['delta'] = delta
+            print(f"[OK] Modifiche rispetto al piano precedente: {delta['testo']}")
+        # Un piano incompleto (chunk GPT falliti) non sostituisce quello salvato
+        if report.get('chunk_falliti'):
+            print(f"[WARN] {len(report['chunk_falliti'])} parti del PDF non interpretate da GPT: "
+                  f"elenco appartamenti incompleto, piano giornaliero non salvato")
+        elif confronta_piano:
+            self.archivio_piani.salva(report)
+        
         # Conta solo articoli numerici
         num_articoli = sum(v for v in materiali_totali.values() if isinstance(v, (int, float)))
         print(f"[OK] Totali: {num_articoli} articoli, {len(materiali_totali)} tipologie")
+        progresso('totali')
         
         print("\n" + "="*70)
         
         return report
     
+    def _applica_route(self, report, tasks_ordinati, route_info):
+        """Salva route_info nel report e riordina i task secondo il percorso"""
+        report['route_info'] = route_info
+        report['tasks'] = tasks_ordinati  # Task già riordinati
+        
+        # Le liste derivate seguono lo stesso ordine (se già calcolate)
+        posizione = {id(task): i for i, task in enumerate(tasks_ordinati)}
+        for chiave in ('tasks_generici', 'tasks_non_identificati'):
+            if chiave in report:
+                report[chiave] = sorted(report[chiave], key=lambda t: posizione.get(id(t), len(posizione)))
+        
+        if route_info.get('success'):
+            print(f"[OK] Route ottimizzata: {route_info['total_distance_km']:.1f} km, {route_info['total_duration_minutes']} min")
+            for giro in route_info.get('giri', []):
+                print(f"  - {giro['operatore']}: {giro['tappe']} tappe, {giro['total_distance_km']:.1f} km")
+    
+    async def ottimizza_percorso_async(self, report):
+        """Step 3 di elabora_pdf in versione async (chiamate Google Maps non bloccanti)"""
+        if not self.route_optimizer.disponibile:
+            print("[WARN] Nessun risolutore percorso disponibile, skip route optimization")
+            return report
+        
+        if self.giri_per_operatore:
+            tasks_ordinati, route_info = await self.route_optimizer.optimize_tasks_per_operatore_async(report['tasks'])
+        else:
+            tasks_ordinati, route_info = await self.route_optimizer.optimize_tasks_route_async(report['tasks'])
+        self._applica_route(report, tasks_ordinati, route_info)
+        return report
+    
     def salva_report_txt(self, report):
         """Salva report in formato TXT leggibile nella cartella Output"""
         
@@ -403,6 +416,11 @@ class MasterProcessor:
             f.write(f"Pulizie Ordinarie:    {report['summary']['pulizia']}\n\n")
             f.write(f"Magazzini Coinvolti:  {', '.join(report['summary']['magazzini_coinvolti'])}\n\n\n")
             
+            if report.get('delta'):
+                f.write("🔄 MODIFICHE RISPETTO AL PIANO PRECEDENTE\n")
+                f.write("─" * 79 + "\n")
+                f.write(f"{report['delta']['testo']}\n\n\n")
+            
             # Materiali totali
             f.write("📦 MATERIALI NECESSARI TOTALI\n")
             f.write("─" * 79 + "\n")
@@ -424,6 +442,12 @@ class MasterProcessor:
                 minuti = route['total_duration_minutes'] % 60
                 f.write(f"Durata Stimata:      {ore} ore e {minuti} minuti\n\n")
                 f.write(f"Link Google Maps:\n{route.get('route_url', 'N/A')}\n")
+                
+                for giro in route.get('giri', []):
+                    f.write(f"\n👤 {giro['operatore']} - {giro['tappe']} tappe, {giro['viaggi']} viaggi, "
+                            f"{giro['total_distance_km']:.2f} km, {giro['total_duration_minutes']} min\n")
+                    f.write(f"   Partenza: {giro['deposito']}\n")
+                    f.write(f"   {giro['route_url'] or 'N/A'}\n")
             
             # Dettaglio task
             f.write("\n\n📋 DETTAGLIO TASK (ORDINE PERCORSO OTTIMIZZATO)\n")
@@ -436,7 +460,11 @@ class MasterProcessor:
                 f.write(f"   📍 {task['indirizzo']}\n")
                 f.write(f"   🔑 {task['nome_ota']}\n")
                 f.write(f"   🏠 {task['tipo_evento']} - {task['tipo_pulizia']}\n")
-                f.write(f"   👥 {task['num_persone']} persone\n\n")
+                f.write(f"   👥 {task['num_persone']} persone\n")
+                if task.get('ora_arrivo_stimata'):
+                    vincolo = f" (entro {task['orario_vincolo']})" if task.get('orario_vincolo') else ""
+                    f.write(f"   🕒 {task.get('operatore', 'Non assegnato')}: arrivo stimato {task['ora_arrivo_stimata']}{vincolo}\n")
+                f.write("\n")
                 
                 # Struttura
                 f.write("   🛏️  Struttura:\n")
@@ -0,0 +1,207 @@
+"""
+Estrattore locale delle righe appartamento del PDF giornaliero
+
+La maggior parte delle righe del report segue lo schema
+
+    <Nome appartamento> x <persone> <Check-in|Check-out> <OPERATORE>
+
+Il testo viene diviso in blocchi (una riga "x N" + eventuali righe successive
+senza "x N", cioè note su più righe). Un blocco viene risolto localmente, senza
+GPT, solo se:
+- è una sola riga (nessuna nota da interpretare)
+- il nome corrisponde con alta confidenza a un appartamento (IndiceNomi)
+- il tipo evento è esplicito e il resto della riga è vuoto o è esattamente
+  un operatore conosciuto (colonna 'Operatore' dell'anagrafica o operatori di
+  Config/depositi.json)
+
+Tutto il resto (note, "APPARTAMENTO DA PULIRE", nomi ambigui, testo in
+maiuscolo dopo l'evento che non è un operatore noto, es. "NOHA SALEM ATRIS
+CHIAVI SOTTO ZERBINO") va a GPT.
+I risultati locali hanno lo stesso formato delle voci restituite da GPT.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from indice_nomi import IndiceNomi
+
+# Riga appartamento: nome, " x N", resto della riga
+RIGA_APPARTAMENTO = re.compile(r'^(?P<nome>.*[A-Za-zÀ-ÿ].*?)\s+x\s*(?P<persone>\d{1,2})\b(?P<resto>.*)$', re.IGNORECASE)
+
+EVENTO_CHECKOUT = re.compile(r'\b(check[\s\-]?out|partenza)\b', re.IGNORECASE)
+EVENTO_CHECKIN = re.compile(r'\b(check[\s\-]?in|arrivo)\b', re.IGNORECASE)
+
+# Parole della riga che non fanno parte del nome operatore (colonna Assegnato)
+PAROLE_NON_OPERATORE = {'NO', 'SI', 'SÌ'}
+
+TESTO_LIBERO = ('appartamento da pulire',)
+
+# Confidenza minima per risolvere un nome senza GPT
+SOGLIA_LOCALE = 0.9
+DISTACCO_MINIMO = 0.15
+
+
+def normalizza_operatore(nome: str) -> str:
+    """Maiuscole e spazi singoli, per il confronto con gli operatori noti"""
+    return ' '.join(str(nome).split()).upper()
+
+
+def dividi_blocchi(righe: List[str]) -> Tuple[List[str], List[List[str]]]:
+    """(righe prima del primo appartamento, blocchi appartamento)"""
+    intestazione = []
+    blocchi = []
+    for line in righe:
+        if RIGA_APPARTAMENTO.match(line):
+            blocchi.append([line])
+        elif blocchi:
+            blocchi[-1].append(line)
+        else:
+            intestazione.append(line)
+    return intestazione, blocchi
+
+
+def dividi_in_chunk(testo: str, max_caratteri: int) -> List[str]:
+    """
+    Divide il testo in chunk di circa max_caratteri senza spezzare i blocchi
+    appartamento (riga "x N" + note). Le righe di intestazione sono ripetute
+    in testa a ogni chunk come contesto. Un blocco più lungo di max_caratteri
+    diventa un chunk da solo: nessun testo viene troncato.
+    """
+    righe = [line.strip() for line in testo.split('\n') if line.strip()]
+    intestazione, blocchi = dividi_blocchi(righe)
+
+    # Nessuna riga "x N": si divide riga per riga
+    if not blocchi:
+        intestazione, blocchi = [], [[line] for line in intestazione]
+
+    testa = '\n'.join(intestazione)
+    chunks = []
+    corrente = []
+    dimensione = len(testa)
+    for blocco in blocchi:
+        testo_blocco = '\n'.join(blocco)
+        if corrente and dimensione + len(testo_blocco) + 1 > max_caratteri:
+            chunks.append(corrente)
+            corrente = []
+            dimensione = len(testa)
+        corrente.append(testo_blocco)
+        dimensione += len(testo_blocco) + 1
+    if corrente:
+        chunks.append(corrente)
+
+    return ['\n'.join(([testa] if testa else []) + chunk) for chunk in chunks]
+
+
+class EstrattoreRighe:
+    """Risolve localmente le righe "Nome x N" ad alta confidenza"""
+
+    def __init__(self, indice: IndiceNomi, operatori: Iterable[str] = ()):
+        """
+        Args:
+            indice: Indice nomi dell'anagrafica
+            operatori: Nomi operatore conosciuti (anagrafica + depositi.json)
+        """
+        self.indice = indice
+        self.operatori = {}
+        for nome in operatori:
+            if nome and str(nome).strip():
+                self.operatori.setdefault(normalizza_operatore(nome), str(nome).strip())
+
+    def match_nome(self, nome: str) -> Tuple[Optional[Dict], float]:
+        """
+        Appartamento per nome e confidenza (0-1).
+        Nome identico (a meno di maiuscole/punteggiatura) = 1.0, altrimenti
+        similarità di Dice del migliore candidato se staccato dal secondo.
+        """
+        riga = self.indice.esatto(nome)
+        if riga is not None:
+            return riga, 1.0
+
+        candidati = self.indice.cerca(nome, k=2)
+        if not candidati:
+            return None, 0.0
+
+        migliore = candidati[0]
+        secondo = candidati[1].dice if len(candidati) > 1 else 0.0
+        if migliore.dice - secondo < DISTACCO_MINIMO:
+            return migliore.riga, min(migliore.dice, 0.5)
+        return migliore.riga, migliore.dice
+
+    def _risolvi(self, blocco: List[str]) -> Optional[Dict]:
+        """Voce (formato GPT) per il blocco, o None se serve GPT"""
+        if len(blocco) != 1:
+            return None
+
+        line = blocco[0]
+        if any(t in line.lower() for t in TESTO_LIBERO):
+            return None
+
+        m = RIGA_APPARTAMENTO.match(line)
+        nome = m.group('nome').strip()
+        resto = m.group('resto')
+
+        if EVENTO_CHECKOUT.search(resto):
+            tipo_evento = 'Check-out'
+            resto = EVENTO_CHECKOUT.sub(' ', resto)
+        elif EVENTO_CHECKIN.search(resto):
+            tipo_evento = 'Check-in'
+            resto = EVENTO_CHECKIN.sub(' ', resto)
+        else:
+            return None
+
+        # Il resto deve essere esattamente un operatore noto: altrimenti
+        # contiene note (es. "CHIAVI SOTTO ZERBINO") e va interpretato da GPT
+        parole = [p for p in resto.split() if p not in PAROLE_NON_OPERATORE]
+        operatore = ''
+        if parole:
+            operatore = self.operatori.get(normalizza_operatore(' '.join(parole)))
+            if operatore is None:
+                return None
+
+        riga, confidenza = self.match_nome(nome)
+        if riga is None or confidenza < SOGLIA_LOCALE:
+            return None
+
+        voce = {
+            'nome_pdf': nome,
+            'nome_master_matched': riga['Ciao Booking Nome'],
+            'confidence': round(confidenza, 2),
+            'tipo_evento': tipo_evento,
+            'num_persone': int(m.group('persone')),
+            'usa_note_come_titolo': False,
+            'note_raw': '',
+            'match_locale': True
+        }
+        if operatore:
+            voce['operatore_pdf'] = operatore
+        return voce
+
+    def estrai(self, pdf_text: str) -> Tuple[List[Dict], str]:
+        """
+        Le righe prima del primo appartamento (intestazioni) vanno a GPT come
+        contesto insieme ai blocchi non risolti; da sole solo se contengono
+        testo libero ("APPARTAMENTO DA PULIRE").
+
+        Returns:
+            (voci risolte localmente, testo da inviare a GPT - vuoto se non serve)
+        """
+        righe = [line.strip() for line in pdf_text.split('\n') if line.strip()]
+        intestazione, blocchi = dividi_blocchi(righe)
+
+        locali = []
+        per_gpt = []
+        for blocco in blocchi:
+            voce = self._risolvi(blocco)
+            if voce is not None:
+                locali.append(voce)
+            else:
+                per_gpt.extend(blocco)
+
+        # Nessuna riga "x N" riconosciuta: tutto il testo a GPT
+        if not blocchi:
+            return [], pdf_text
+
+        testo_libero = any(t in line.lower() for line in intestazione for t in TESTO_LIBERO)
+        if not per_gpt and not testo_libero:
+            return locali, ''
+        return locali, '\n'.join(intestazione + per_gpt)
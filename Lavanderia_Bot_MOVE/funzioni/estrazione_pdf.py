@@ -0,0 +1,124 @@
+"""
+Estrazione testo PDF pagina per pagina, con cache per pagina
+
+- le pagine sono lette una alla volta (generatore): niente concatenazioni
+  ripetute del testo completo
+- pulizia con una tabella str.translate precompilata (BOM, zero-width space,
+  nbsp, caratteri di controllo) invece di un filtro carattere per carattere
+- il testo di ogni pagina è salvato in cache/pagine/ con chiave l'impronta
+  della pagina (content stream + font + dimensioni): un PDF re-inviato, anche
+  con solo alcune pagine cambiate, riusa le pagine già estratte senza
+  rifare l'analisi di layout di pdfplumber
+"""
+
+import os
+import hashlib
+import logging
+from typing import Iterator, Optional
+
+from file_cache import cartella_cache, scrivi_atomico
+
+logger = logging.getLogger(__name__)
+
+# Tabella pulizia: rimuove BOM, zero-width space e caratteri di controllo
+# (tranne newline, carriage return e tab), nbsp → spazio normale
+TABELLA_PULIZIA = {c: None for c in range(32) if chr(c) not in '\n\r\t'}
+TABELLA_PULIZIA.update({
+    0xFEFF: None,      # BOM
+    0x200B: None,      # Zero-width space
+    0xA0: ' ',         # Non-breaking space
+})
+TABELLA_PULIZIA = str.maketrans(TABELLA_PULIZIA)
+
+
+def pulisci_testo(testo: str) -> str:
+    return testo.translate(TABELLA_PULIZIA)
+
+
+class CachePagine:
+    """Testo estratto per pagina, un file per impronta in cache/pagine/"""
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Args:
+            cache_dir: Cartella della cache (default: <root bot>/cache/pagine)
+        """
+        self.cache_dir = cache_dir or cartella_cache('pagine')
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def impronta_pagina(page) -> Optional[str]:
+        """
+        Impronta di una pagina pdfplumber: content stream decodificati, nomi
+        dei font e dimensioni. None se la pagina non è leggibile (niente cache).
+        """
+        try:
+            from pdfminer.pdftypes import resolve1
+
+            h = hashlib.sha256()
+            h.update(repr((page.width, page.height)).encode())
+
+            contents = page.page_obj.contents or []
+            for stream in contents:
+                h.update(resolve1(stream).get_data())
+
+            # Stesso content stream con font diversi = testo diverso
+            fonts = resolve1(page.page_obj.resources.get('Font', {})) or {}
+            for nome in sorted(fonts):
+                font = resolve1(fonts[nome]) or {}
+                h.update(f"{nome}={font.get('BaseFont')}".encode())
+            return h.hexdigest()
+        except Exception as e:
+            logger.debug(f"Impronta pagina non calcolabile: {e}")
+            return None
+
+    def _path(self, impronta: str) -> str:
+        return os.path.join(self.cache_dir, f"{impronta}.txt")
+
+    def get(self, impronta: str) -> Optional[str]:
+        try:
+            with open(self._path(impronta), 'r', encoding='utf-8') as f:
+                return f.read()
+        except (FileNotFoundError, OSError):
+            return None
+
+    def set(self, impronta: str, testo: str):
+        try:
+            scrivi_atomico(self._path(impronta), testo)
+        except OSError as e:
+            logger.warning(f"⚠️ Cache pagina non salvata: {e}")
+
+
+def pagine_testo(pdf_path: str, cache: Optional[CachePagine] = None, statistiche: dict = None) -> Iterator[str]:
+    """
+    Testo pulito di ogni pagina, una alla volta.
+
+    Args:
+        pdf_path: Percorso PDF
+        cache: Cache pagine (None = nessuna cache)
+        statistiche: se passato, aggiornato con 'pagine' e 'dalla_cache'
+    """
+    import pdfplumber
+
+    if statistiche is not None:
+        statistiche.update(pagine=0, dalla_cache=0)
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            impronta = cache.impronta_pagina(page) if cache is not None else None
+            testo = cache.get(impronta) if impronta else None
+
+            if testo is not None:
+                if statistiche is not None:
+                    statistiche['dalla_cache'] += 1
+            else:
+                testo = pulisci_testo(page.extract_text() or "")
+                if impronta:
+                    cache.set(impronta, testo)
+
+            # Libera gli oggetti di layout della pagina prima della successiva
+            page.close()
+
+            if statistiche is not None:
+                statistiche['pagine'] += 1
+            yield testo
@@ -0,0 +1,65 @@
+"""
+File di cache su disco condivisi tra processi (cartella cache/ alla root del bot)
+
+- cartella_cache('gpt') -> <root bot>/cache/gpt, default delle varie cache
+- scrivi_atomico(): file temporaneo del processo + os.replace, così un
+  lettore (anche un altro processo worker) non vede mai un file a metà
+- leggi_json() / scrivi_json(): JSON UTF-8 con scrittura atomica; un file
+  mancante o illeggibile restituisce il valore di default
+"""
+
+import os
+import json
+import logging
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cartella_cache(nome: str = None) -> str:
+    """<root bot>/cache, o una sua sottocartella"""
+    cartella = os.path.join(BOT_DIR, 'cache')
+    return os.path.join(cartella, nome) if nome else cartella
+
+
+def scrivi_atomico(path: str, dati: Union[str, bytes]):
+    """Scrive il file in modo atomico (solleva OSError se non riesce)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if isinstance(dati, bytes):
+            with open(tmp_path, 'wb') as f:
+                f.write(dati)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(dati)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def scrivi_json(path: str, dati: Any, **opzioni):
+    """
+    JSON scritto in modo atomico; opzioni passate a json.dumps (es. indent, default).
+    Solleva OSError, TypeError o ValueError se non riesce.
+    """
+    scrivi_atomico(path, json.dumps(dati, ensure_ascii=False, **opzioni))
+
+
+def leggi_json(path: str, default: Any = None, descrizione: str = None) -> Any:
+    """JSON del file, o default se manca o è illeggibile (con warning se c'è descrizione)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (json.JSONDecodeError, OSError) as e:
+        if descrizione:
+            logger.warning(f"⚠️ {descrizione} illeggibile, ignorato: {e}")
+        return default
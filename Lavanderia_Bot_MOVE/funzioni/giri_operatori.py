@@ -0,0 +1,199 @@
+"""
+Giri per operatore (VRP semplificato)
+
+Invece di un unico giro dal magazzino centrale, i task del giorno sono divisi
+tra gli operatori e ogni operatore ha il suo percorso:
+
+1. partizione: i task con operatore (colonna Assegnato del PDF) restano suoi;
+   i task 'Non assegnato' vanno all'operatore con la tappa più vicina,
+   penalizzando chi dovrebbe tornare al deposito per caricare altra biancheria
+2. deposito: da Config/depositi.json per operatore o per magazzino
+   (Destinazione_Riferimento), altrimenti il magazzino centrale
+3. capacità: i set lenzuola caricabili in un viaggio sono limitati
+   (CAPACITA_SET_VIAGGIO); se il giro ne richiede di più viene diviso in
+   viaggi con ritorno al deposito
+4. finestre orarie: i check-in con orario_vincolo (es. arrivo anticipato
+   ospiti) devono essere raggiunti entro quell'ora; se il giro ottimo non lo
+   permette i check-in vincolati vengono anticipati in testa al giro
+
+Qui solo le funzioni di calcolo: i percorsi sono risolti da RouteOptimizer.
+
+Esempio Config/depositi.json:
+    {
+      "operatori": {"NOHA SALEM ATRIS": "Corso Adriano 12, Modena"},
+      "magazzini": {"Corso Adriano": "Corso Adriano 12, Modena"}
+    }
+"""
+
+import os
+import re
+import json
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+OPERATORE_NON_ASSEGNATO = 'Non assegnato'
+
+# Set lenzuola (matrimoniali + singoli) trasportabili in un viaggio
+CAPACITA_SET_VIAGGIO = 20
+
+# Simulazione orari del giro
+ORA_INIZIO_GIRO = '08:30'
+MINUTI_PER_INTERVENTO = 45
+MINUTI_TRATTA_DEFAULT = 15  # tratta con coordinate sconosciute
+
+_ORARIO = re.compile(r'\b([01]?\d|2[0-3])[:.]([0-5]\d)\b')
+
+
+def carica_depositi(config_dir: str) -> Dict[str, Dict[str, str]]:
+    """Config/depositi.json ({'operatori': {...}, 'magazzini': {...}}), vuoto se assente"""
+    path = os.path.join(config_dir, 'depositi.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            dati = json.load(f)
+    except FileNotFoundError:
+        dati = {}
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"[WARN] Config depositi non leggibile ({path}): {e}")
+        dati = {}
+    return {
+        'operatori': dict(dati.get('operatori') or {}),
+        'magazzini': dict(dati.get('magazzini') or {}),
+    }
+
+
+def nome_operatore(task: Dict) -> str:
+    operatore = str(task.get('operatore') or '').strip()
+    return operatore or OPERATORE_NON_ASSEGNATO
+
+
+def ordina_operatori(operatori) -> List[str]:
+    """Ordine alfabetico con 'Non assegnato' in fondo (come nel report PDF)"""
+    operatori = set(operatori)
+    ordinati = sorted(op for op in operatori if op != OPERATORE_NON_ASSEGNATO)
+    if OPERATORE_NON_ASSEGNATO in operatori:
+        ordinati.append(OPERATORE_NON_ASSEGNATO)
+    return ordinati
+
+
+def deposito_operatore(operatore: str, tasks: List[Dict], depositi: Dict, predefinito: str) -> str:
+    """Deposito per operatore, poi per magazzino più frequente dei suoi task"""
+    if operatore in depositi['operatori']:
+        return depositi['operatori'][operatore]
+    magazzini = Counter(t.get('magazzino') for t in tasks if t.get('magazzino') in depositi['magazzini'])
+    if magazzini:
+        return depositi['magazzini'][magazzini.most_common(1)[0][0]]
+    return predefinito
+
+
+def set_lenzuola(task: Dict) -> int:
+    """Set lenzuola da portare per il task (materiali calcolati, altrimenti camere)"""
+    materiali = task.get('materiali_necessari') or {}
+    chiavi = ('set_lenzuola_matrimoniali', 'set_lenzuola_singole')
+    if any(k in materiali for k in chiavi):
+        valori = [materiali.get(k, 0) for k in chiavi]
+    else:
+        valori = [task.get('camere_matrimoniali', 0), task.get('camere_singole', 0)]
+    totale = 0
+    for v in valori:
+        try:
+            totale += int(v or 0)
+        except (TypeError, ValueError):
+            continue
+    return totale
+
+
+def minuti_da_orario(testo) -> Optional[int]:
+    """'12:00' / 'entro le 12.30' -> minuti dalla mezzanotte (None se assente)"""
+    if not testo:
+        return None
+    m = _ORARIO.search(str(testo))
+    if not m:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def orario_da_minuti(minuti: float) -> str:
+    minuti = int(round(minuti))
+    return f"{minuti // 60:02d}:{minuti % 60:02d}"
+
+
+def scadenza_task(task: Dict) -> Optional[int]:
+    """Orario entro cui arrivare: solo per i check-in con orario_vincolo"""
+    if task.get('tipo_task') != 'check-in':
+        return None
+    return minuti_da_orario(task.get('orario_vincolo'))
+
+
+def costo_assegnazione(km_tappa: float, km_deposito: float, carico: int, set_task: int,
+                       capacita: int = CAPACITA_SET_VIAGGIO) -> float:
+    """
+    Costo (km) per aggiungere un task al giro di un operatore: distanza dalla
+    sua tappa più vicina, più andata e ritorno dal deposito se il task non
+    entra nei viaggi già necessari.
+    """
+    viaggi_attuali = max(1, -(-carico // capacita))
+    viaggi_nuovi = max(1, -(-(carico + set_task) // capacita))
+    if viaggi_nuovi > viaggi_attuali:
+        return km_tappa + 2 * km_deposito
+    return km_tappa
+
+
+def dividi_viaggi(carichi: Sequence[int], capacita: int = CAPACITA_SET_VIAGGIO) -> List[List[int]]:
+    """
+    Divide le tappe (già in ordine di giro) in viaggi consecutivi senza
+    superare la capacità. Una tappa più grande della capacità fa un viaggio
+    da sola.
+
+    Returns:
+        Posizioni delle tappe per viaggio
+    """
+    viaggi = []
+    corrente = []
+    carico = 0
+    for pos, set_tappa in enumerate(carichi):
+        if corrente and carico + set_tappa > capacita:
+            viaggi.append(corrente)
+            corrente = []
+            carico = 0
+        corrente.append(pos)
+        carico += set_tappa
+    if corrente:
+        viaggi.append(corrente)
+    return viaggi
+
+
+def simula_orari(minuti_tratte: Sequence[float], scadenze: Sequence[Optional[int]],
+                 inizio: int = None, durata: int = MINUTI_PER_INTERVENTO) -> Tuple[List[float], List[int]]:
+    """
+    Orari di arrivo lungo il giro.
+
+    Args:
+        minuti_tratte: minuti_tratte[i] = tragitto verso la tappa i (dalla
+            precedente o dal deposito)
+        scadenze: orario limite di arrivo per tappa (minuti, None = libero)
+        inizio: partenza dal deposito (minuti, default ORA_INIZIO_GIRO)
+        durata: minuti di lavoro per tappa
+
+    Returns:
+        (arrivi, posizioni delle tappe in ritardo)
+    """
+    ora = minuti_da_orario(ORA_INIZIO_GIRO) if inizio is None else inizio
+    arrivi = []
+    ritardi = []
+    for pos, (tratta, scadenza) in enumerate(zip(minuti_tratte, scadenze)):
+        ora += tratta
+        arrivi.append(ora)
+        if scadenza is not None and ora > scadenza:
+            ritardi.append(pos)
+        ora += durata
+    return arrivi, ritardi
+
+
+def anticipa_vincolati(scadenze: Sequence[Optional[int]]) -> List[int]:
+    """
+    Nuovo ordine (posizioni): prima le tappe con scadenza, per orario, poi le
+    altre nell'ordine del giro ottimizzato.
+    """
+    vincolate = sorted((pos for pos, s in enumerate(scadenze) if s is not None), key=lambda pos: scadenze[pos])
+    libere = [pos for pos, s in enumerate(scadenze) if s is None]
+    return vincolate + libere
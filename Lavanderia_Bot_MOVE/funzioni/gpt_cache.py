@@ -0,0 +1,112 @@
+"""
+Cache persistente dei risultati GPT (parsing PDF)
+
+Chiave = sha256 di (testo PDF normalizzato, versione anagrafica appartamenti,
+versione prompt, modello): se uno qualsiasi cambia la voce non viene più
+trovata e GPT viene richiamato. Una voce per file JSON in cache/gpt/ alla
+root del bot, scritta in modo atomico (più processi worker possono leggerla).
+
+Le statistiche (hit, token e costo risparmiati) sono cumulative e salvate in
+cache/gpt/stats.json; l'aggiornamento (lettura + scrittura) avviene sotto un
+FileLock, perché lo fanno in contemporanea i thread di più processi worker.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict
+
+from filelock import FileLock, Timeout
+
+from file_cache import cartella_cache, leggi_json, scrivi_json
+
+logger = logging.getLogger(__name__)
+
+
+def normalizza_testo(testo: str) -> str:
+    """Testo per la chiave: spazi multipli e righe vuote non contano"""
+    righe = (' '.join(riga.split()) for riga in testo.splitlines())
+    return '\n'.join(riga for riga in righe if riga)
+
+
+def impronta(testo: str) -> str:
+    return hashlib.sha256(testo.encode('utf-8')).hexdigest()
+
+
+class CacheGPT:
+    """Cache su disco delle risposte GPT, con statistiche"""
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Args:
+            cache_dir: Cartella della cache (default: <root bot>/cache/gpt)
+        """
+        self.cache_dir = cache_dir or cartella_cache('gpt')
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.stats_path = os.path.join(self.cache_dir, 'stats.json')
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.stats_path}.lock", timeout=10)
+
+    @staticmethod
+    def chiave(pdf_text: str, versione_master: str, versione_prompt: str, modello: str) -> str:
+        """Chiave della voce di cache per una richiesta GPT"""
+        return impronta(json.dumps(
+            [normalizza_testo(pdf_text), versione_master, versione_prompt, modello],
+            ensure_ascii=False
+        ))
+
+    def _path(self, chiave: str) -> str:
+        return os.path.join(self.cache_dir, f"{chiave}.json")
+
+    def get(self, chiave: str) -> Optional[Dict]:
+        """Voce in cache ({'risposta', 'usage', 'costo'}) oppure None"""
+        return leggi_json(self._path(chiave), descrizione="Voce cache GPT")
+
+    def set(self, chiave: str, risposta: Dict, usage: Dict, costo: float):
+        """Salva la risposta GPT già decodificata con token e costo della chiamata"""
+        try:
+            scrivi_json(self._path(chiave), {
+                'risposta': risposta,
+                'usage': usage,
+                'costo': costo,
+                'creato': time.time()
+            })
+        except OSError as e:
+            logger.error(f"❌ Errore salvataggio cache GPT: {e}")
+
+    def registra(self, hit: bool, voce: Dict = None) -> Dict:
+        """Aggiorna le statistiche cumulative e le restituisce"""
+        with self._lock:
+            try:
+                with self._file_lock:
+                    return self._aggiorna_stats(hit, voce)
+            except Timeout:
+                logger.warning("⚠️ Statistiche cache GPT bloccate da un altro processo, non aggiornate")
+                return self._leggi_stats()
+
+    def _leggi_stats(self) -> Dict:
+        stats = leggi_json(self.stats_path) or {}
+        stats.setdefault('richieste', 0)
+        stats.setdefault('hit', 0)
+        stats.setdefault('token_risparmiati', 0)
+        stats.setdefault('costo_risparmiato', 0.0)
+        return stats
+
+    def _aggiorna_stats(self, hit: bool, voce: Dict = None) -> Dict:
+        """Lettura-modifica-scrittura di stats.json (chiamare sotto FileLock)"""
+        stats = self._leggi_stats()
+        stats['richieste'] += 1
+        if hit and voce:
+            stats['hit'] += 1
+            stats['token_risparmiati'] += int(voce.get('usage', {}).get('total_tokens', 0))
+            stats['costo_risparmiato'] += float(voce.get('costo', 0.0))
+
+        try:
+            scrivi_json(self.stats_path, stats)
+        except OSError as e:
+            logger.warning(f"⚠️ Statistiche cache GPT non salvate: {e}")
+        return stats
@@ -2,7 +2,7 @@
 Parser PDF intelligente con GPT-3.5-turbo
 Estrae appartamenti dal PDF usando AI invece di regex
 INTERPRETA NOTE per calcolare materiali extra automaticamente
-USA PRE-FILTRO per ridurre token inviati a GPT (ottimizzazione costi)
+USA PRE-FILTRO (indice a trigrammi) per ridurre token inviati a GPT (ottimizzazione costi)
 """
 
 import os
@@ -10,24 +10,50 @@ import json
 import logging
 import re
 import pandas as pd
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+from anagrafica_appartamenti import AnagraficaAppartamenti, get_anagrafica
+from gpt_cache import CacheGPT, impronta
+from estrazione_pdf import CachePagine, pagine_testo
+from estrattore_righe import EstrattoreRighe, dividi_in_chunk
+from giri_operatori import carica_depositi
+from piano_giornaliero import data_giro
 
 logger = logging.getLogger(__name__)
 
+# Chunk di testo inviati a GPT (niente troncamento, richieste in parallelo)
+MAX_CARATTERI_CHUNK = 6000
+MAX_RICHIESTE_GPT = 3
+TENTATIVI_CHUNK = 2  # un chunk in errore viene ritentato una volta
+
+# Pre-filtro candidati (indice a trigrammi)
+CANDIDATI_PER_RIGA = 5
+SOGLIA_CANDIDATO = 0.6
+PATTERN_OSPITI = re.compile(r'\bx\s*\d', re.IGNORECASE)
+
 
 class GPTPDFParser:
     """Parser PDF con GPT-3.5-turbo per riconoscimento intelligente appartamenti"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, anagrafica: Optional[AnagraficaAppartamenti] = None):
         """
         Inizializza parser GPT con prompts da Config/gpt_prompts.json
         
         Args:
             api_key: OpenAI API key (se None, cerca in Config/gpt_api_key.txt)
+            anagrafica: Anagrafica appartamenti condivisa (default: get_anagrafica())
         """
+        self.anagrafica = anagrafica or get_anagrafica()
+        self.cache = CacheGPT()
+        self.cache_pagine = CachePagine()
+        self._dimensione_master = None  # (versione anagrafica, caratteri JSON, appartamenti)
+        self.chunk_falliti: List[Dict] = []  # chunk non interpretati dall'ultimo parse_pdf_text
+        
         # Percorsi Config (parent di funzioni/)
         base_dir = os.path.dirname(os.path.dirname(__file__))
         config_dir = os.path.join(base_dir, 'Config')
+        self.config_dir = config_dir
         api_key_file = os.path.join(config_dir, 'gpt_api_key.txt')
         prompts_file = os.path.join(config_dir, 'gpt_prompts.json')
         
@@ -97,15 +123,6 @@ class GPTPDFParser:
             return {'tasks': [], 'pdf_source': pdf_path}
         
         try:
-            # Estrai testo da PDF
-            import pdfplumber
-            pdf_text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    pdf_text += page.extract_text() or ""
-            
-            logger.info(f"📄 PDF estratto: {len(pdf_text)} caratteri")
-            
             # Salva TXT estratto in sottocartella pdf_to_txt_input (a root del bot)
             bot_dir = os.path.dirname(os.path.dirname(__file__))
             pdf_input_dir = os.path.join(bot_dir, 'pdf_input')
@@ -114,35 +131,39 @@ class GPTPDFParser:
             
             timestamp = pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')
             txt_path = os.path.join(txt_extracted_dir, f'estratto_{timestamp}.txt')
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(pdf_text)
-            logger.info(f"💾 TXT estratto salvato: {txt_path}")
             
-            # Pulisci testo da BOM e caratteri speciali che causano errori Unicode
-            pdf_text = pdf_text.replace('\ufeff', '')  # BOM
-            pdf_text = pdf_text.replace('\u200b', '')  # Zero-width space
-            pdf_text = pdf_text.replace('\xa0', ' ')   # Non-breaking space → spazio normale
-            # Rimuovi caratteri di controllo (mantieni solo newline e tab)
-            pdf_text = ''.join(char for char in pdf_text if ord(char) >= 32 or char in '\n\r\t')
-            logger.info(f"🧹 Testo pulito: {len(pdf_text)} caratteri")
+            # Estrai testo pagina per pagina (già pulito da BOM e caratteri di controllo),
+            # scrivendo il TXT man mano; le pagine già viste vengono dalla cache
+            pagine = []
+            statistiche = {}
+            with open(txt_path, 'w', encoding='utf-8') as f:
+                for testo_pagina in pagine_testo(pdf_path, self.cache_pagine, statistiche):
+                    if pagine:
+                        f.write('\n')
+                    f.write(testo_pagina)
+                    pagine.append(testo_pagina)
+            pdf_text = '\n'.join(pagine)
+            del pagine
             
-            # Carica database appartamenti
-            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            appartamenti_file = os.path.join(base_dir, 'Database', 'appartamenti.xlsx')
+            logger.info(f"📄 PDF estratto: {len(pdf_text)} caratteri, {statistiche['pagine']} pagine "
+                        f"({statistiche['dalla_cache']} dalla cache)")
+            logger.info(f"💾 TXT estratto salvato: {txt_path}")
             
-            if not os.path.exists(appartamenti_file):
-                logger.error(f"File appartamenti non trovato: {appartamenti_file}")
+            # Database appartamenti (anagrafica condivisa, riletta solo se il file cambia)
+            if not self.anagrafica.esiste():
+                logger.error(f"File appartamenti non trovato: {self.anagrafica.path}")
                 return {'tasks': [], 'pdf_source': pdf_path}
             
-            df_appartamenti = pd.read_excel(appartamenti_file)
-            logger.info(f"📊 Database appartamenti: {len(df_appartamenti)} record")
+            logger.info(f"📊 Database appartamenti: {len(self.anagrafica.righe())} record")
             
             # Parse con GPT
-            tasks = self.parse_pdf_text(pdf_text, df_appartamenti)
+            tasks = self.parse_pdf_text(pdf_text)
             
             return {
                 'tasks': tasks,
                 'pdf_source': os.path.basename(pdf_path),
+                'data_giro': data_giro(pdf_text),  # dall'intestazione del PDF, None se assente
+                'chunk_falliti': list(self.chunk_falliti),
                 'parser_used': 'GPT-3.5-turbo',
                 'timestamp': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
             }
@@ -153,88 +174,47 @@ class GPTPDFParser:
             traceback.print_exc()
             return {'tasks': [], 'pdf_source': pdf_path}
     
-    def parse_pdf_text(self, pdf_text: str, df_appartamenti: pd.DataFrame) -> List[Dict]:
+    def parse_pdf_text(self, pdf_text: str) -> List[Dict]:
         """
         Estrae appartamenti dal testo PDF usando GPT con interpretazione NOTE
+        Gli appartamenti master vengono dall'anagrafica condivisa.
+        Le righe "Nome x N" senza note e con nome certo sono risolte localmente
+        (EstrattoreRighe): a GPT va solo il resto del testo.
+        
+        I chunk che GPT non è riuscito a interpretare (anche dopo il nuovo
+        tentativo) restano in self.chunk_falliti: la lista è incompleta.
         
         Args:
             pdf_text: Testo estratto dal PDF
-            df_appartamenti: DataFrame con appartamenti master
             
         Returns:
             Lista di task con materiali_extra interpretati da GPT
         """
+        self.chunk_falliti = []
         if not self.is_available():
             logger.warning("GPT Parser non disponibile - usa parser classico")
             return []
         
         try:
-            # INVIA TUTTI GLI APPARTAMENTI A GPT (pre-filtro rimosso)
-            logger.info("📊 Invio database completo a GPT (senza pre-filtro)...")
-            appartamenti_master = []
-            for _, apt in df_appartamenti.iterrows():
-                appartamenti_master.append({
-                    'nome_ciao': apt['Ciao Booking Nome'],
-                    'nome_ota': str(apt.get('Nome OTA', '')),
-                    'indirizzo': apt['Indirizzo'],
-                    'camere_matrimoniali': int(apt.get('Camere Matrimoniali', 0)),
-                    'camere_singole': int(apt.get('Camere Singole', 0)),
-                    'bagni': int(apt.get('Bagni', 0))
-                })
-            
-            logger.info(f"✅ Database completo preparato: {len(appartamenti_master)} appartamenti totali")
+            # ESTRAZIONE LOCALE: righe "Nome x N" ad alta confidenza risolte senza GPT
+            operatori = self.anagrafica.operatori() + list(carica_depositi(self.config_dir)['operatori'])
+            estrattore = EstrattoreRighe(self.anagrafica.indice(), operatori)
+            appartamenti_locali, testo_gpt = estrattore.estrai(pdf_text)
+            logger.info(f"⚡ Estrazione locale: {len(appartamenti_locali)} appartamenti risolti senza GPT")
             
-            # Carica prompts da Config o usa default
-            system_prompt = self.prompts.get('pdf_parser_system', self._get_default_system_prompt())
-            user_template = self.prompts.get('pdf_parser_user_template', self._get_default_user_template())
-            
-            # Limita testo PDF per token
-            pdf_text_limited = pdf_text[:8000]
-            
-            # Costruisci user prompt con template (SOLO appartamenti filtrati)
-            user_prompt = user_template.format(
-                appartamenti_json=json.dumps(appartamenti_master, indent=2, ensure_ascii=False),
-                pdf_text=pdf_text_limited
-            )
-
-            # Chiama GPT per parsing PDF
-            logger.info("📡 Chiamata GPT-4o-mini per parsing PDF...")
-            logger.info(f"   📤 Token INVIATI (stimati): ~{len(system_prompt)//4 + len(user_prompt)//4} token")
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.1,
-                max_tokens=8000
-            )
-            
-            # Log uso token da risposta GPT
-            usage = response.usage
-            logger.info(f"   📊 TOKEN USAGE:")
-            logger.info(f"      • Input (prompt): {usage.prompt_tokens} token")
-            logger.info(f"      • Output (risposta): {usage.completion_tokens} token")
-            logger.info(f"      • TOTALE: {usage.total_tokens} token")
-            
-            # Calcola costo approssimativo (GPT-3.5-turbo pricing)
-            cost_input = (usage.prompt_tokens / 1000) * 0.0005  # $0.0005 per 1K input tokens
-            cost_output = (usage.completion_tokens / 1000) * 0.0015  # $0.0015 per 1K output tokens
-            total_cost = cost_input + cost_output
-            logger.info(f"      💰 Costo stimato: ${total_cost:.6f} (~€{total_cost * 0.95:.6f})")
-            
-            # Parse risposta JSON
-            content = response.choices[0].message.content.strip()
-            result = json.loads(content)
-            appartamenti_gpt = result.get('appartamenti', [])
-            
-            logger.info(f"✅ GPT ha trovato {len(appartamenti_gpt)} appartamenti")
+            appartamenti_gpt = []
+            if testo_gpt:
+                appartamenti_gpt, self.chunk_falliti = self._parse_con_gpt(testo_gpt)
+                logger.info(f"✅ GPT ha trovato {len(appartamenti_gpt)} appartamenti")
+                if self.chunk_falliti:
+                    logger.warning(f"⚠️ {len(self.chunk_falliti)} chunk non interpretati da GPT: "
+                                   f"elenco appartamenti INCOMPLETO")
+            else:
+                logger.info("⚡ Nessuna riga da interpretare - chiamata GPT saltata")
             
             # Converti in formato task con materiali_extra
             tasks = []
-            for apt_gpt in appartamenti_gpt:
+            for apt_gpt in appartamenti_locali + appartamenti_gpt:
                 usa_note_come_titolo = apt_gpt.get('usa_note_come_titolo', False)
                 nome_master = apt_gpt.get('nome_master_matched', apt_gpt.get('nome_master', ''))
                 
@@ -248,24 +228,12 @@ class GPTPDFParser:
                     if not nome_master:
                         continue
                     
-                    # Trova appartamento master
-                    apt_master = df_appartamenti[
-                        df_appartamenti['Ciao Booking Nome'].str.contains(nome_master, case=False, na=False, regex=False)
-                    ]
-                    
-                    if apt_master.empty:
-                        # Prova fuzzy match più permissivo
-                        for _, row in df_appartamenti.iterrows():
-                            if nome_master.lower() in row['Ciao Booking Nome'].lower() or \
-                               row['Ciao Booking Nome'].lower() in nome_master.lower():
-                                apt_master = pd.DataFrame([row])
-                                break
+                    # Trova appartamento master (nome esatto, poi indice a trigrammi)
+                    apt_row = self.anagrafica.indice().migliore(nome_master)
                     
-                    if apt_master.empty:
+                    if apt_row is None:
                         logger.warning(f"⚠️ '{nome_master}' non trovato in master - skip")
                         continue
-                    
-                    apt_row = apt_master.iloc[0]
                 
                 # Determina tipo pulizia e tipo_task normalizzato
                 tipo_evento = apt_gpt.get('tipo_evento', 'Check-in')
@@ -327,7 +295,7 @@ class GPTPDFParser:
                         
                         # Confidence
                         'confidence_gpt': apt_gpt.get('confidence', 0.8),
-                        'raw_context': f"GPT Match: {apt_gpt.get('nome_pdf', 'N/A')} -> {apt_row['Ciao Booking Nome']} (confidence: {apt_gpt.get('confidence', 0.8):.2f})",
+                        'raw_context': f"{'Match locale' if apt_gpt.get('match_locale') else 'GPT Match'}: {apt_gpt.get('nome_pdf', 'N/A')} -> {apt_row['Ciao Booking Nome']} (confidence: {apt_gpt.get('confidence', 0.8):.2f})",
                         
                         # Info strutturali da master
                         'camere_matrimoniali': int(apt_row.get('Camere Matrimoniali', 0)),
@@ -339,6 +307,9 @@ class GPTPDFParser:
                         'operatore': apt_gpt.get('operatore_pdf', apt_row.get('Operatore', 'Non assegnato')),
                         'pulizie_interne': apt_row.get('Pulizie Interne', 'Vero'),  # Campo per distinguere esterni
                         'non_identificato': False,
+                        
+                        # Orario da rispettare (es. arrivo anticipato ospiti), usato dai giri per operatore
+                        'orario_vincolo': (apt_gpt.get('istruzioni_operative') or {}).get('orario_vincolo'),
                     }
                 
                 tasks.append(task)
@@ -351,10 +322,6 @@ class GPTPDFParser:
             
             return tasks
             
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Errore parsing JSON da GPT: {e}")
-            logger.error(f"Risposta GPT: {content if 'content' in locals() else 'N/A'}")
-            return []
         except Exception as e:
             logger.error(f"❌ Errore GPT parsing: {e}")
             import traceback
@@ -363,6 +330,187 @@ class GPTPDFParser:
     
 
     
+    def _parse_con_gpt(self, pdf_text: str) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Voci appartamento (JSON GPT) per il testo non risolto localmente.
+        Il testo è diviso in chunk sui confini dei blocchi appartamento, inviati
+        in parallelo (max MAX_RICHIESTE_GPT richieste in corso); ogni chunk ha i
+        propri candidati (pre-filtro) e la propria voce di cache.
+        
+        Returns:
+            (voci, chunk falliti) - chunk falliti: {'chunk', 'totale', 'errore', 'prima_riga'}
+        """
+        chunks = dividi_in_chunk(pdf_text, MAX_CARATTERI_CHUNK)
+        if len(chunks) <= 1:
+            chunks = [pdf_text]
+            esiti = [self._parse_chunk(pdf_text, 1, 1)]
+        else:
+            logger.info(f"✂️ Testo diviso in {len(chunks)} chunk "
+                        f"(max {MAX_RICHIESTE_GPT} richieste GPT in parallelo)")
+            with ThreadPoolExecutor(max_workers=min(MAX_RICHIESTE_GPT, len(chunks)),
+                                    thread_name_prefix='gpt-chunk') as executor:
+                futures = [executor.submit(self._parse_chunk, chunk, i, len(chunks))
+                           for i, chunk in enumerate(chunks, 1)]
+                esiti = [f.result() for f in futures]
+        
+        # Chunk falliti anche al secondo tentativo: segnalati nel report, mai ignorati
+        falliti = []
+        for i, (chunk, (_, errore)) in enumerate(zip(chunks, esiti), 1):
+            if errore is not None:
+                righe = [line for line in chunk.split('\n') if PATTERN_OSPITI.search(line)]
+                falliti.append({'chunk': i, 'totale': len(chunks), 'errore': errore,
+                                'prima_riga': (righe or chunk.split('\n'))[0][:80]})
+        
+        risultati = [voci for voci, _ in esiti]
+        if len(risultati) == 1:
+            return risultati[0], falliti
+        
+        # Unisci nell'ordine dei chunk, senza duplicati (intestazione ripetuta in ogni chunk)
+        appartamenti = []
+        visti = set()
+        for voci in risultati:
+            for voce in voci:
+                chiave = (
+                    str(voce.get('nome_pdf', '')).strip().lower(),
+                    str(voce.get('nome_master_matched', voce.get('nome_master', ''))).strip().lower(),
+                    str(voce.get('tipo_evento', '')).strip().lower(),
+                    str(voce.get('num_persone', '')),
+                    str(voce.get('note_raw', voce.get('note', ''))).strip()
+                )
+                if chiave in visti:
+                    continue
+                visti.add(chiave)
+                appartamenti.append(voce)
+        
+        duplicati = sum(len(v) for v in risultati) - len(appartamenti)
+        if duplicati:
+            logger.info(f"   🔁 Rimossi {duplicati} duplicati tra i chunk")
+        return appartamenti, falliti
+    
+    def _parse_chunk(self, chunk_text: str, numero: int, totale: int) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Chiamata GPT per un chunk (TENTATIVI_CHUNK tentativi); un chunk in
+        errore non blocca gli altri.
+        
+        Returns:
+            (voci, None) o ([], errore) se tutti i tentativi sono falliti
+        """
+        etichetta = f"[chunk {numero}/{totale}] " if totale > 1 else ""
+        
+        # PRE-FILTRO LOCALE: solo i candidati per le righe del chunk (indice a trigrammi)
+        appartamenti_master = self._filtra_appartamenti_candidati(chunk_text)
+        
+        # Carica prompts da Config o usa default
+        system_prompt = self.prompts.get('pdf_parser_system', self._get_default_system_prompt())
+        user_template = self.prompts.get('pdf_parser_user_template', self._get_default_user_template())
+        
+        # Costruisci user prompt con template (SOLO appartamenti filtrati)
+        appartamenti_json = json.dumps(appartamenti_master, ensure_ascii=False, separators=(',', ':'))
+        user_prompt = user_template.format(
+            appartamenti_json=appartamenti_json,
+            pdf_text=chunk_text
+        )
+        
+        # Dimensione prompt rispetto al database completo con indent=2 (vecchio formato)
+        caratteri_completo, totale_master = self._dimensione_master_completo()
+        prompt_completo = len(user_prompt) - len(appartamenti_json) + caratteri_completo
+        logger.info(f"   📏 {etichetta}Prompt: {prompt_completo} → {len(user_prompt)} caratteri "
+                    f"(~{prompt_completo//4} → ~{len(user_prompt)//4} token, "
+                    f"{len(appartamenti_master)}/{totale_master} appartamenti)")
+        
+        # Chiave cache: testo PDF + versione anagrafica + versione prompt + modello
+        chiave = self.cache.chiave(
+            chunk_text,
+            impronta(json.dumps(appartamenti_master, sort_keys=True, ensure_ascii=False, default=str)),
+            impronta(system_prompt + user_template),
+            self.model
+        )
+        
+        errore = None
+        for tentativo in range(1, TENTATIVI_CHUNK + 1):
+            try:
+                result = self._chiama_gpt(system_prompt, user_prompt, chiave)
+                return result.get('appartamenti', []), None
+            except json.JSONDecodeError as e:
+                errore = f"JSON non valido: {e}"
+                logger.error(f"❌ {etichetta}Errore parsing JSON da GPT (tentativo {tentativo}/{TENTATIVI_CHUNK}): {e}")
+            except Exception as e:
+                errore = str(e)
+                logger.error(f"❌ {etichetta}Errore chiamata GPT (tentativo {tentativo}/{TENTATIVI_CHUNK}): {e}")
+        return [], errore
+    
+    def _dimensione_master_completo(self):
+        """
+        (caratteri, appartamenti) del database completo serializzato con
+        indent=2, solo per il log: ricalcolato quando cambia l'anagrafica.
+        """
+        versione = self.anagrafica.versione()
+        if self._dimensione_master is None or self._dimensione_master[0] != versione:
+            master_completo = [self._voce_master(apt) for apt in self.anagrafica.righe()]
+            caratteri = len(json.dumps(master_completo, indent=2, ensure_ascii=False))
+            self._dimensione_master = (versione, caratteri, len(master_completo))
+        return self._dimensione_master[1], self._dimensione_master[2]
+    
+    def _chiama_gpt(self, system_prompt: str, user_prompt: str, chiave: str) -> Dict:
+        """
+        Risposta GPT (JSON decodificato) per il prompt, dalla cache se già vista.
+        Logga TOKEN USAGE e statistiche cache.
+        """
+        voce = self.cache.get(chiave)
+        if voce is not None:
+            stats = self.cache.registra(hit=True, voce=voce)
+            usage = voce.get('usage', {})
+            logger.info("💾 Risposta GPT dalla cache (nessuna chiamata)")
+            logger.info(f"   📊 TOKEN USAGE:")
+            logger.info(f"      • Risparmiati: {usage.get('total_tokens', 0)} token (${voce.get('costo', 0.0):.6f})")
+            self._log_stats_cache(stats)
+            return voce['risposta']
+        
+        # Chiama GPT per parsing PDF
+        logger.info("📡 Chiamata GPT-4o-mini per parsing PDF...")
+        logger.info(f"   📤 Token INVIATI (stimati): ~{len(system_prompt)//4 + len(user_prompt)//4} token")
+        
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.1,
+            max_tokens=8000
+        )
+        
+        # Log uso token da risposta GPT
+        usage = response.usage
+        logger.info(f"   📊 TOKEN USAGE:")
+        logger.info(f"      • Input (prompt): {usage.prompt_tokens} token")
+        logger.info(f"      • Output (risposta): {usage.completion_tokens} token")
+        logger.info(f"      • TOTALE: {usage.total_tokens} token")
+        
+        # Calcola costo approssimativo (GPT-3.5-turbo pricing)
+        cost_input = (usage.prompt_tokens / 1000) * 0.0005  # $0.0005 per 1K input tokens
+        cost_output = (usage.completion_tokens / 1000) * 0.0015  # $0.0015 per 1K output tokens
+        total_cost = cost_input + cost_output
+        logger.info(f"      💰 Costo stimato: ${total_cost:.6f} (~€{total_cost * 0.95:.6f})")
+        
+        # Parse risposta JSON
+        content = response.choices[0].message.content.strip()
+        result = json.loads(content)
+        
+        self.cache.set(chiave, result, {
+            'prompt_tokens': usage.prompt_tokens,
+            'completion_tokens': usage.completion_tokens,
+            'total_tokens': usage.total_tokens
+        }, total_cost)
+        self._log_stats_cache(self.cache.registra(hit=False))
+        return result
+    
+    def _log_stats_cache(self, stats: Dict):
+        logger.info(f"   💾 CACHE GPT: {stats['hit']}/{stats['richieste']} hit, "
+                    f"{stats['token_risparmiati']} token risparmiati "
+                    f"(${stats['costo_risparmiato']:.6f})")
+    
     def _get_default_system_prompt(self) -> str:
         """Prompt system di default se gpt_prompts.json non disponibile"""
         return """Sei un assistente esperto nell'analisi di report pulizie appartamenti.
@@ -382,148 +530,58 @@ Estrai tutti gli appartamenti e matchali con il database.
 Per appartamenti generici ("APPARTAMENTO DA PULIRE"), usa usa_note_come_titolo=true.
 Rispondi in JSON con struttura: appartamenti[nome_pdf, nome_master_matched, confidence, tipo_evento, num_persone, note_raw, usa_note_come_titolo]"""
     
-    def _filtra_appartamenti_candidati(self, pdf_text: str, df_appartamenti: pd.DataFrame) -> List[Dict]:
+    @staticmethod
+    def _voce_master(apt: Dict) -> Dict:
+        """Appartamento nel formato inviato a GPT"""
+        return {
+            'nome_ciao': apt['Ciao Booking Nome'],
+            'nome_ota': str(apt.get('Nome OTA', '')),
+            'indirizzo': apt['Indirizzo'],
+            'camere_matrimoniali': int(apt.get('Camere Matrimoniali', 0)),
+            'camere_singole': int(apt.get('Camere Singole', 0)),
+            'bagni': int(apt.get('Bagni', 0))
+        }
+    
+    def _filtra_appartamenti_candidati(self, pdf_text: str) -> List[Dict]:
         """
-        Pre-filtra appartamenti rilevanti usando fuzzy matching locale (GRATIS).
-        Riduce drasticamente i token inviati a GPT (risparmio ~85%).
+        Pre-filtra appartamenti rilevanti con l'indice a trigrammi (GRATIS, locale).
+        Per ogni riga del PDF prende i migliori CANDIDATI_PER_RIGA appartamenti
+        con contenimento >= SOGLIA_CANDIDATO (nome presente quasi per intero nella riga).
+        
+        Rete di sicurezza: se una riga con numero ospiti ("x N") non ha nessun
+        candidato, o non si trova nessun candidato, si invia il database completo.
         
         Args:
             pdf_text: Testo estratto dal PDF
-            df_appartamenti: DataFrame completo appartamenti
             
         Returns:
-            Lista max 15 appartamenti candidati con score similarità
+            Lista appartamenti da inviare a GPT (ordine dell'anagrafica)
         """
-        # Estrai possibili nomi appartamenti dal PDF con regex
-        nomi_pdf = self._estrai_nomi_da_pdf(pdf_text)
-        
-        if not nomi_pdf:
-            logger.warning("⚠️ Nessun nome appartamento riconosciuto nel PDF")
-            return []
+        righe = self.anagrafica.righe()
+        indice = self.anagrafica.indice()
         
-        logger.info(f"   📝 Nomi trovati nel PDF: {nomi_pdf[:5]}...")  # Log primi 5
-        
-        # Calcola similarità con ogni appartamento nel database
-        candidati = []
-        for _, apt in df_appartamenti.iterrows():
-            nome_db = apt['Ciao Booking Nome']
-            nome_ota = str(apt.get('Nome OTA', ''))
-            
-            # Calcola score massimo tra tutti i nomi trovati nel PDF
-            max_score = 0
-            for nome_pdf in nomi_pdf:
-                # Similarità semplice (ratio di caratteri comuni)
-                score = self._fuzzy_ratio(nome_pdf.lower(), nome_db.lower())
-                
-                # Prova anche con nome OTA se disponibile
-                if nome_ota:
-                    score_ota = self._fuzzy_ratio(nome_pdf.lower(), nome_ota.lower())
-                    score = max(score, score_ota)
-                
-                max_score = max(max_score, score)
-            
-            # Aggiungi se similarità sufficiente
-            if max_score > 50:  # Threshold: 50% similarità minima
-                candidati.append({
-                    'nome_ciao': nome_db,
-                    'nome_ota': nome_ota,
-                    'indirizzo': apt['Indirizzo'],
-                    'camere_matrimoniali': int(apt.get('Camere Matrimoniali', 0)),
-                    'camere_singole': int(apt.get('Camere Singole', 0)),
-                    'bagni': int(apt.get('Bagni', 0)),
-                    'score': max_score
-                })
-        
-        # Ordina per score decrescente e prendi top 15
-        candidati.sort(key=lambda x: x['score'], reverse=True)
-        top_candidati = candidati[:15]
-        
-        if top_candidati:
-            logger.info(f"   🎯 Top candidati:")
-            for i, c in enumerate(top_candidati[:3], 1):  # Log top 3
-                logger.info(f"      {i}. {c['nome_ciao']} (score: {c['score']}%)")
-        
-        return top_candidati
-    
-    def _estrai_nomi_da_pdf(self, pdf_text: str) -> List[str]:
-        """
-        Estrae possibili nomi appartamenti dal PDF usando pattern comuni.
-        
-        Returns:
-            Lista nomi trovati (anche parziali)
-        """
-        nomi_trovati = set()
-        
-        # Processo riga per riga per migliore accuratezza
+        selezionati = set()
+        righe_scoperte = []
         for line in pdf_text.split('\n'):
             line = line.strip()
+            if not line:
+                continue
             
-            # Pattern 1: Keywords specifiche nel nome (case-insensitive)
-            keywords = ['Palace', 'Relax', 'Pastore', 'Parini', 'Formigine', 'Stefania', 'Pioppa', 
-                       'Adriano', 'Bellaria', 'Gozzi', 'Next Stop', 'Rua']
-            for keyword in keywords:
-                if keyword.lower() in line.lower():
-                    # Estrai nome fino a "x" o numeri di persone
-                    match = re.search(rf'([A-Za-zÀ-ÿ\s\-:\'0-9]*{keyword}[A-Za-zÀ-ÿ\s\-:\'0-9]*?)(?:\s*x\s*\d|\s+\d{{1,2}}\s+NO)', line, re.IGNORECASE)
-                    if match:
-                        nome = match.group(1).strip()
-                        # Pulisci da "x" trailing
-                        nome = re.sub(r'\s*x\s*$', '', nome).strip()
-                        if len(nome) > 3:
-                            nomi_trovati.add(nome)
-                            break
-        
-        # Pattern 2: Linee che iniziano con maiuscola e contengono "x" (numero ospiti)
-        pattern_ospiti = r'^([A-Z][A-Za-zÀ-ÿ\s\-\'0-9:]+?)\s*x\s*\d'
-        for line in pdf_text.split('\n'):
-            match = re.search(pattern_ospiti, line.strip())
-            if match:
-                nome = match.group(1).strip()
-                # Escludi date e numeri puri
-                if not re.match(r'^\d', nome) and 'Mercoledì' not in nome and len(nome) > 3:
-                    nomi_trovati.add(nome)
-        
-        # Filtra nomi che contengono parole da escludere
-        nomi_filtrati = []
-        for nome in nomi_trovati:
-            nome_lower = nome.lower()
-            if not any(exc in nome_lower for exc in ['gia', 'pulito', 'appartamento da', 'note', 'preparare', 'mercoledì']):
-                nomi_filtrati.append(nome)
-        
-        logger.info(f"   📝 Nomi estratti dal PDF: {nomi_filtrati[:10]}")
-        return nomi_filtrati
-    
-    def _fuzzy_ratio(self, s1: str, s2: str) -> int:
-        """
-        Calcola similarità tra due stringhe (0-100%).
-        Implementazione semplice senza librerie esterne.
-        
-        Returns:
-            Score 0-100 (100 = match perfetto)
-        """
-        # Rimuovi spazi multipli e normalizza
-        s1 = ' '.join(s1.split())
-        s2 = ' '.join(s2.split())
-        
-        # Match esatto
-        if s1 == s2:
-            return 100
-        
-        # Substring match
-        if s1 in s2 or s2 in s1:
-            return 85
-        
-        # Conta parole in comune
-        words1 = set(s1.split())
-        words2 = set(s2.split())
-        
-        if not words1 or not words2:
-            return 0
-        
-        common_words = words1.intersection(words2)
-        total_words = words1.union(words2)
+            candidati = indice.cerca(line, k=CANDIDATI_PER_RIGA, soglia=SOGLIA_CANDIDATO)
+            for c in candidati:
+                selezionati.add(id(c.riga))
+            
+            if not candidati and PATTERN_OSPITI.search(line):
+                righe_scoperte.append(line)
         
-        # Percentuale parole comuni
-        score = int((len(common_words) / len(total_words)) * 100)
+        if righe_scoperte or not selezionati:
+            if righe_scoperte:
+                logger.warning(f"⚠️ {len(righe_scoperte)} righe con ospiti senza candidati "
+                               f"(es. '{righe_scoperte[0][:60]}') - invio database completo")
+            else:
+                logger.warning("⚠️ Nessun appartamento riconosciuto nel PDF - invio database completo")
+            return [self._voce_master(apt) for apt in righe]
         
-        return score
+        candidati = [self._voce_master(apt) for apt in righe if id(apt) in selezionati]
+        logger.info(f"   🎯 Pre-filtro: {len(candidati)}/{len(righe)} appartamenti candidati")
+        return candidati
@@ -0,0 +1,132 @@
+"""
+Client HTTP condiviso per le API esterne (Google Maps)
+
+- ClientHttp.get_json(): versione async (httpx) da usare negli handler Telegram,
+  non blocca l'event loop dell'Application
+- ClientHttp.get_json_sync(): versione sincrona (requests.Session) per script
+  e thread in background
+
+Entrambe riusano le connessioni (keep-alive), limitano le richieste
+contemporanee e ritentano con backoff esponenziale su errori di rete,
+HTTP 429 e 5xx.
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Status HTTP per cui ha senso ritentare
+STATUS_RITENTABILI = {429, 500, 502, 503, 504}
+
+
+class ClientHttp:
+    """Client HTTP con pool di connessioni, concorrenza limitata e retry"""
+
+    def __init__(self, max_connessioni: int = 10, max_concorrenti: int = 5,
+                 tentativi: int = 3, backoff_base: float = 0.5, timeout: float = 10):
+        self.max_connessioni = max_connessioni
+        self.max_concorrenti = max_concorrenti
+        self.tentativi = tentativi
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+
+        # Client async e semaforo sono legati all'event loop che li ha creati
+        self._client_async: Optional[httpx.AsyncClient] = None
+        self._semaforo_async: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._semaforo_sync = threading.BoundedSemaphore(max_concorrenti)
+
+    def _attesa(self, tentativo: int) -> float:
+        """Backoff esponenziale con un po' di jitter"""
+        return self.backoff_base * (2 ** tentativo) * (1 + random.random() * 0.25)
+
+    # ==================== ASYNC ====================
+
+    def _prepara_async(self):
+        loop = asyncio.get_running_loop()
+        if self._client_async is None or self._loop is not loop:
+            self._client_async = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connessioni,
+                                    max_keepalive_connections=self.max_connessioni)
+            )
+            self._semaforo_async = asyncio.Semaphore(self.max_concorrenti)
+            self._loop = loop
+        return self._client_async, self._semaforo_async
+
+    async def get_json(self, url: str, params: dict = None, timeout: float = None) -> dict:
+        """
+        GET asincrona che restituisce il JSON della risposta.
+        Solleva l'ultima eccezione se tutti i tentativi falliscono.
+        """
+        client, semaforo = self._prepara_async()
+
+        for tentativo in range(self.tentativi):
+            try:
+                async with semaforo:
+                    response = await client.get(url, params=params, timeout=timeout or self.timeout)
+                if response.status_code in STATUS_RITENTABILI and tentativo < self.tentativi - 1:
+                    logger.warning(f"HTTP {response.status_code} da {url}, nuovo tentativo")
+                else:
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError as e:
+                if tentativo == self.tentativi - 1:
+                    raise
+                logger.warning(f"Errore di rete verso {url} ({e}), nuovo tentativo")
+            await asyncio.sleep(self._attesa(tentativo))
+
+    async def chiudi(self):
+        """Chiude le connessioni async (da chiamare allo shutdown del bot)"""
+        if self._client_async is not None:
+            await self._client_async.aclose()
+            self._client_async = None
+            self._loop = None
+
+    # ==================== SYNC ====================
+
+    def _prepara_sync(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_connessioni,
+                                      pool_maxsize=self.max_connessioni)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def get_json_sync(self, url: str, params: dict = None, timeout: float = None) -> dict:
+        """Come get_json ma bloccante, per script e thread in background"""
+        session = self._prepara_sync()
+
+        for tentativo in range(self.tentativi):
+            try:
+                with self._semaforo_sync:
+                    response = session.get(url, params=params, timeout=timeout or self.timeout)
+                if response.status_code in STATUS_RITENTABILI and tentativo < self.tentativi - 1:
+                    logger.warning(f"HTTP {response.status_code} da {url}, nuovo tentativo")
+                else:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if tentativo == self.tentativi - 1:
+                    raise
+                logger.warning(f"Errore di rete verso {url} ({e}), nuovo tentativo")
+            time.sleep(self._attesa(tentativo))
+
+
+# Istanza condivisa da tutto il bot
+client_http = ClientHttp()
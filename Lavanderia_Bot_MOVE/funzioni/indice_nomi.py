@@ -0,0 +1,138 @@
+"""
+Indice nomi appartamenti (trigrammi di caratteri)
+
+Indice invertito trigramma -> nomi su 'Ciao Booking Nome' e 'Nome OTA'.
+Per un testo (riga del PDF o nome restituito da GPT) i nomi candidati si
+trovano scorrendo solo le liste dei trigrammi presenti nel testo, senza
+confrontare il testo con tutto il database.
+
+Punteggi (0-1):
+- contenimento: quota dei trigrammi del nome presenti nel testo
+  (1.0 = il nome compare per intero nella riga)
+- copertura: quota dei trigrammi del testo presenti nel nome
+  (1.0 = il testo è una parte del nome)
+- dice: similarità di Dice tra i due insiemi di trigrammi
+  (1.0 = stessi trigrammi, penalizza le righe lunghe)
+"""
+
+import re
+import unicodedata
+from collections import Counter, namedtuple
+from typing import Dict, List, Optional, Set
+
+Candidato = namedtuple('Candidato', ['riga', 'nome', 'contenimento', 'copertura', 'dice'])
+
+_NON_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizza_nome(testo: str) -> str:
+    """Minuscolo, senza accenti e punteggiatura, spazi singoli"""
+    testo = unicodedata.normalize('NFKD', str(testo))
+    testo = ''.join(c for c in testo if not unicodedata.combining(c))
+    return _NON_ALFANUMERICO.sub(' ', testo.lower()).strip()
+
+
+def trigrammi(testo_normalizzato: str) -> Set[str]:
+    """Trigrammi di ' testo ' (lo spazio ai bordi marca inizio/fine parola)"""
+    if not testo_normalizzato:
+        return set()
+    s = f" {testo_normalizzato} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class IndiceNomi:
+    """Indice invertito a trigrammi sui nomi degli appartamenti"""
+
+    COLONNE_NOMI = ('Ciao Booking Nome', 'Nome OTA')
+
+    def __init__(self, righe: List[Dict]):
+        """
+        Args:
+            righe: Righe dell'anagrafica (dict come row.to_dict())
+        """
+        self.righe = righe
+        self._nomi: List[str] = []                 # nome originale
+        self._riga_nome: List[int] = []            # nome -> posizione in righe
+        self._trigrammi_nome: List[int] = []       # nome -> numero trigrammi
+        self._esatti: Dict[str, int] = {}          # nome normalizzato -> id nome
+        self._postings: Dict[str, List[int]] = {}  # trigramma -> id nomi
+
+        for pos, riga in enumerate(righe):
+            visti = set()
+            for colonna in self.COLONNE_NOMI:
+                nome = riga.get(colonna)
+                if not isinstance(nome, str):
+                    continue
+                norm = normalizza_nome(nome)
+                if not norm or norm in visti:
+                    continue
+                visti.add(norm)
+
+                id_nome = len(self._nomi)
+                tg = trigrammi(norm)
+                self._nomi.append(nome)
+                self._riga_nome.append(pos)
+                self._trigrammi_nome.append(len(tg))
+                self._esatti.setdefault(norm, id_nome)
+                for t in tg:
+                    self._postings.setdefault(t, []).append(id_nome)
+
+    def __len__(self):
+        return len(self._nomi)
+
+    def cerca(self, testo: str, k: int = 5, soglia: float = 0.0) -> List[Candidato]:
+        """
+        Migliori k appartamenti (uno per riga dell'anagrafica) per testo,
+        ordinati per (contenimento, dice).
+
+        Args:
+            testo: Riga PDF o nome da cercare
+            k: Numero massimo di candidati
+            soglia: Contenimento minimo
+        """
+        tg_testo = trigrammi(normalizza_nome(testo))
+        if not tg_testo:
+            return []
+
+        comuni = Counter()
+        for t in tg_testo:
+            for id_nome in self._postings.get(t, ()):
+                comuni[id_nome] += 1
+
+        migliori: Dict[int, Candidato] = {}
+        for id_nome, n in comuni.items():
+            n_nome = self._trigrammi_nome[id_nome]
+            contenimento = n / n_nome
+            if contenimento < soglia:
+                continue
+            copertura = n / len(tg_testo)
+            dice = 2 * n / (n_nome + len(tg_testo))
+
+            pos = self._riga_nome[id_nome]
+            attuale = migliori.get(pos)
+            if attuale is None or (contenimento, dice) > (attuale.contenimento, attuale.dice):
+                migliori[pos] = Candidato(self.righe[pos], self._nomi[id_nome], contenimento, copertura, dice)
+
+        ordinati = sorted(migliori.values(), key=lambda c: (c.contenimento, c.dice), reverse=True)
+        return ordinati[:k]
+
+    def esatto(self, nome: str) -> Optional[Dict]:
+        """Riga con nome (Ciao Booking o OTA) identico a meno di maiuscole/accenti/punteggiatura"""
+        id_nome = self._esatti.get(normalizza_nome(nome))
+        return None if id_nome is None else self.righe[self._riga_nome[id_nome]]
+
+    def migliore(self, nome: str, soglia: float = 0.8) -> Optional[Dict]:
+        """
+        Riga per un nome restituito da GPT: nome identico, altrimenti il
+        candidato più simile (Dice) che contiene il nome o è contenuto in esso
+        (contenimento o copertura >= soglia).
+        """
+        riga = self.esatto(nome)
+        if riga is not None:
+            return riga
+
+        candidati = [c for c in self.cerca(nome, k=len(self.righe))
+                     if max(c.contenimento, c.copertura) >= soglia]
+        if not candidati:
+            return None
+        return max(candidati, key=lambda c: c.dice).riga
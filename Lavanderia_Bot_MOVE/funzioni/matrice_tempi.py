@@ -0,0 +1,207 @@
+"""
+Matrice persistente dei tempi di percorrenza (Google Distance Matrix API)
+
+Gli appartamenti sono sempre gli stessi: tempi e distanze stradali tra due
+indirizzi vengono chiesti a Google una volta e salvati in
+cache/tempi_percorrenza.json (chiave = indirizzi normalizzati, origine ->
+destinazione, i tempi non sono simmetrici). Ogni voce scade dopo TTL_GIORNI.
+
+Il riempimento chiede solo le coppie mancanti o scadute, raggruppate in
+rettangoli origini x destinazioni che rispettano i limiti dell'API
+(max 25 origini, 25 destinazioni e 100 elementi per richiesta):
+- indirizzi nuovi: nuovi x tutti e noti x nuovi
+- coppie sparse tra indirizzi noti: per origine
+
+Formato file:
+    {"via roma 1 modena": {"viale amendola 160 modena": [secondi, metri, ts], ...}, ...}
+    (secondi e metri null = percorso non trovato)
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from indice_nomi import normalizza_nome
+from file_cache import cartella_cache, leggi_json, scrivi_json
+
+logger = logging.getLogger(__name__)
+
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+
+# Limiti Distance Matrix API per richiesta
+MAX_ORIGINI = 25
+MAX_DESTINAZIONI = 25
+MAX_ELEMENTI = 100
+
+TTL_GIORNI = 30
+
+# Elementi richiesti al massimo in un riempimento (il resto al giro successivo)
+MAX_ELEMENTI_RIEMPIMENTO = 2500
+
+Rettangolo = Tuple[List[str], List[str]]
+
+
+def chiave_indirizzo(indirizzo: str) -> str:
+    return normalizza_nome(indirizzo)
+
+
+def forma_blocco(n_origini: int, n_destinazioni: int) -> Tuple[int, int]:
+    """Origini e destinazioni per richiesta, entro i limiti dell'API"""
+    k_destinazioni = min(n_destinazioni, MAX_DESTINAZIONI)
+    k_origini = min(n_origini, MAX_ORIGINI, max(1, MAX_ELEMENTI // k_destinazioni))
+    k_destinazioni = min(k_destinazioni, MAX_ELEMENTI // k_origini)
+    return k_origini, k_destinazioni
+
+
+def dividi_rettangolo(origini: Sequence[str], destinazioni: Sequence[str]) -> List[Rettangolo]:
+    """Un rettangolo origini x destinazioni in blocchi da una richiesta"""
+    if not origini or not destinazioni:
+        return []
+    k_o, k_d = forma_blocco(len(origini), len(destinazioni))
+    return [(list(origini[i:i + k_o]), list(destinazioni[j:j + k_d]))
+            for i in range(0, len(origini), k_o)
+            for j in range(0, len(destinazioni), k_d)]
+
+
+class MatriceTempi:
+    """Tempi (s) e distanze (m) tra indirizzi, su disco, con scadenza"""
+
+    def __init__(self, path: str = None, ttl_giorni: float = TTL_GIORNI):
+        """
+        Args:
+            path: File JSON (default: <root bot>/cache/tempi_percorrenza.json)
+            ttl_giorni: Validità di una coppia
+        """
+        self.path = path or os.path.join(cartella_cache(), 'tempi_percorrenza.json')
+        self.ttl = ttl_giorni * 86400
+        self._lock = threading.Lock()
+        self._voci: Optional[Dict[str, Dict[str, list]]] = None
+
+    def _leggi_file(self) -> Dict[str, Dict[str, list]]:
+        return leggi_json(self.path, {}, descrizione="Matrice tempi")
+
+    def _carica(self):
+        if self._voci is None:
+            self._voci = self._leggi_file()
+
+    def _salva(self, nuove: Dict[str, Dict[str, list]]):
+        """Unisce le coppie nuove al file (altri processi possono averlo aggiornato)"""
+        voci = self._leggi_file()
+        for origine, riga in nuove.items():
+            voci.setdefault(origine, {}).update(riga)
+        self._voci = voci
+
+        try:
+            scrivi_json(self.path, voci)
+        except OSError as e:
+            logger.warning(f"⚠️ Matrice tempi non salvata: {e}")
+
+    def _voce(self, origine: str, destinazione: str, adesso: float) -> Optional[list]:
+        voce = self._voci.get(origine, {}).get(destinazione)
+        if voce is None or adesso - voce[2] > self.ttl:
+            return None
+        return voce
+
+    def mancanti(self, indirizzi: Sequence[str]) -> List[Rettangolo]:
+        """Richieste (origini, destinazioni) per le coppie mancanti o scadute"""
+        per_chiave = {}
+        for indirizzo in indirizzi:
+            per_chiave.setdefault(chiave_indirizzo(indirizzo), indirizzo)
+        chiavi = list(per_chiave)
+
+        adesso = time.time()
+        with self._lock:
+            self._carica()
+            mancano = {a: [b for b in chiavi if b != a and self._voce(a, b, adesso) is None] for a in chiavi}
+
+        # Indirizzi senza alcuna coppia valida: rettangoli pieni
+        nuovi = [a for a in chiavi if len(mancano[a]) == len(chiavi) - 1 and len(chiavi) > 1]
+        insieme_nuovi = set(nuovi)
+        noti = [a for a in chiavi if a not in insieme_nuovi]
+        rettangoli = dividi_rettangolo(nuovi, chiavi) + dividi_rettangolo(noti, nuovi)
+
+        # Coppie sparse tra indirizzi noti, per origine
+        for a in noti:
+            destinazioni = [b for b in mancano[a] if b not in insieme_nuovi]
+            rettangoli += dividi_rettangolo([a], destinazioni)
+
+        return [([per_chiave[o] for o in origini], [per_chiave[d] for d in destinazioni])
+                for origini, destinazioni in rettangoli]
+
+    def riempi(self, indirizzi: Sequence[str], distance_matrix: Callable[[list, list], dict],
+               max_elementi: int = MAX_ELEMENTI_RIEMPIMENTO) -> int:
+        """
+        Chiede a Google le coppie mancanti.
+
+        Args:
+            indirizzi: Indirizzi completi (come vanno inviati all'API)
+            distance_matrix: funzione (origini, destinazioni) -> {'results': [...]}
+                con un elemento per coppia, riga per riga (None = non trovato)
+            max_elementi: Elementi massimi richiesti in questa chiamata
+
+        Returns:
+            Numero di elementi richiesti
+        """
+        richieste = self.mancanti(indirizzi)
+        if not richieste:
+            return 0
+
+        nuove: Dict[str, Dict[str, list]] = {}
+        richiesti = 0
+        for origini, destinazioni in richieste:
+            if richiesti + len(origini) * len(destinazioni) > max_elementi:
+                logger.warning(f"⚠️ Matrice tempi: limite di {max_elementi} elementi raggiunto, "
+                               f"le coppie restanti al prossimo giro")
+                break
+
+            risposta = distance_matrix(origini, destinazioni)
+            risultati = risposta.get('results') if risposta else None
+            if not risultati or len(risultati) != len(origini) * len(destinazioni):
+                # Errore API (quota, chiave): inutile continuare
+                break
+            richiesti += len(risultati)
+
+            adesso = time.time()
+            for i, origine in enumerate(origini):
+                riga = nuove.setdefault(chiave_indirizzo(origine), {})
+                for j, destinazione in enumerate(destinazioni):
+                    elemento = risultati[i * len(destinazioni) + j]
+                    if elemento is None:
+                        riga[chiave_indirizzo(destinazione)] = [None, None, adesso]
+                    else:
+                        riga[chiave_indirizzo(destinazione)] = [
+                            elemento['duration_seconds'], elemento['distance_meters'], adesso
+                        ]
+
+        if nuove:
+            with self._lock:
+                self._salva(nuove)
+            logger.info(f"🗺️ Matrice tempi: {richiesti} coppie aggiornate da Distance Matrix")
+        return richiesti
+
+    def matrice(self, indirizzi: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (secondi, metri) tra gli indirizzi, nell'ordine dato.
+        NaN per coppie mancanti, scadute o senza percorso; 0 sulla diagonale.
+        """
+        chiavi = [chiave_indirizzo(a) for a in indirizzi]
+        n = len(chiavi)
+        secondi = np.full((n, n), np.nan)
+        metri = np.full((n, n), np.nan)
+
+        adesso = time.time()
+        with self._lock:
+            self._carica()
+            for i, a in enumerate(chiavi):
+                for j, b in enumerate(chiavi):
+                    if a == b:
+                        secondi[i, j] = metri[i, j] = 0.0
+                        continue
+                    voce = self._voce(a, b, adesso)
+                    if voce is not None and voce[0] is not None:
+                        secondi[i, j], metri[i, j] = voce[0], voce[1]
+        return secondi, metri
@@ -0,0 +1,229 @@
+"""
+Motore regole materiali - Database/Regole/regole_materiali.xlsx compilato in matrice
+
+Le regole (fogli 'Regole per Bagno' e 'Regole Cucina') vengono compilate una
+volta in una matrice di coefficienti:
+
+    righe   = caratteristiche del task [persone, bagni, matrimoniali, singole, 1]
+    colonne = articoli (stesso ordine e stesse chiavi di calcola_materiali_intelligente)
+
+Le quantità di tutti i task della giornata sono un solo prodotto matriciale
+F @ C, con F = matrice caratteristiche (un task per riga). La matrice viene
+ricompilata automaticamente quando il file Excel cambia (mtime/size).
+"""
+
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Colonne della matrice caratteristiche
+CARATTERISTICHE = ['persone', 'bagni', 'camere_matrimoniali', 'camere_singole', 'costante']
+_PERSONE, _BAGNI, _MATRIMONIALI, _SINGOLE, _COSTANTE = range(len(CARATTERISTICHE))
+
+_COLONNA_TIPO = 'se 1=per persona se 2=per numero di bagni se 0= commento in cella di fianco'
+
+
+def leggi_regole_bagno(regole_path: str) -> List[Dict]:
+    """Carica regole materiali per bagno da Excel con tipo_calcolo dinamico"""
+    df = pd.read_excel(regole_path, sheet_name='Regole per Bagno', skiprows=1)
+    regole = []
+
+    for _, row in df.iterrows():
+        articolo = str(row['Articolo']).strip()
+        qty = row['Quantità per Bagno']
+        tipo_calcolo = int(row[_COLONNA_TIPO])
+
+        # Leggi messaggio dalla colonna Note (se presente)
+        messaggio = row.get('Note', row.get(_COLONNA_TIPO, '')) if tipo_calcolo == 0 else ''
+
+        regole.append({
+            'articolo': articolo,
+            'quantita': int(qty) if pd.notna(qty) else 0,
+            'tipo_calcolo': tipo_calcolo,  # 1=persona, 2=bagni, 0=messaggio
+            'messaggio': str(messaggio).strip() if pd.notna(messaggio) and messaggio else ''
+        })
+
+    print(f"[OK] Caricate regole bagno: {len(regole)} articoli")
+    return regole
+
+
+def leggi_regole_cucina(regole_path: str) -> List[Dict]:
+    """Carica regole materiali cucina da Excel con tipo_calcolo dinamico"""
+    df = pd.read_excel(regole_path, sheet_name='Regole Cucina', skiprows=1)
+    regole = []
+
+    for _, row in df.iterrows():
+        articolo = str(row['Articolo']).strip()
+        qty = row['Quantità Base']
+        tipo_calcolo = int(row[_COLONNA_TIPO])
+        note = row.get('Note', '')
+
+        regole.append({
+            'articolo': articolo,
+            'quantita': int(qty) if pd.notna(qty) else 0,
+            'tipo_calcolo': tipo_calcolo,  # 1=persona, 2=bagni, 0=messaggio
+            'messaggio': str(note).strip() if pd.notna(note) and note else ''
+        })
+
+    print(f"[OK] Caricate regole cucina: {len(regole)} articoli")
+    return regole
+
+
+class MotoreRegole:
+    """Regole materiali compilate in matrice coefficienti, con ricarica automatica"""
+
+    def __init__(self, regole_path: str):
+        """
+        Args:
+            regole_path: Percorso regole_materiali.xlsx
+        """
+        if not os.path.exists(regole_path):
+            print("[ERROR] File regole_materiali.xlsx NON trovato!")
+            print(f"[ERROR] Percorso atteso: {regole_path}")
+            raise FileNotFoundError(f"File regole_materiali.xlsx obbligatorio non trovato in {regole_path}")
+
+        self.regole_path = regole_path
+        self._lock = threading.RLock()
+        self._firma = None
+
+        self.regole_bagno: List[Dict] = []
+        self.regole_cucina: List[Dict] = []
+        self.articoli: List[str] = []          # chiavi materiali, in ordine di output
+        self.coefficienti = np.zeros((len(CARATTERISTICHE), 0), dtype=np.int64)
+        self.messaggi_info: List[str] = []
+
+        self._valida()
+
+    def _valida(self):
+        """Ricompila le regole se il file Excel è cambiato"""
+        try:
+            st = os.stat(self.regole_path)
+        except FileNotFoundError:
+            # Si continua con l'ultima versione compilata
+            print(f"[WARN] regole_materiali.xlsx non trovato, uso regole già caricate")
+            return
+
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._firma:
+            return
+
+        regole_bagno = leggi_regole_bagno(self.regole_path)
+        regole_cucina = leggi_regole_cucina(self.regole_path)
+        self._compila(regole_bagno, regole_cucina)
+        self._firma = firma
+
+    def _compila(self, regole_bagno: List[Dict], regole_cucina: List[Dict]):
+        # Colonna per articolo: un articolo ripetuto mantiene la prima posizione
+        # ma prende i coefficienti dell'ultima regola (come l'assegnazione a dict)
+        colonne: Dict[str, np.ndarray] = {}
+        messaggi = []
+
+        def applica(regole, caratteri_sostituiti):
+            for regola in regole:
+                articolo = regola['articolo']
+                tipo_calcolo = regola['tipo_calcolo']
+
+                articolo_key = articolo.lower()
+                for c in caratteri_sostituiti:
+                    articolo_key = articolo_key.replace(c, '_')
+
+                coeff = np.zeros(len(CARATTERISTICHE), dtype=np.int64)
+                if tipo_calcolo == 1:
+                    coeff[_PERSONE] = regola['quantita']
+                elif tipo_calcolo == 2:
+                    coeff[_BAGNI] = regola['quantita']
+                else:
+                    if tipo_calcolo == 0 and regola.get('messaggio'):
+                        messaggi.append(f"ℹ️ {articolo}: {regola['messaggio']}")
+                    continue
+                colonne[articolo_key] = coeff
+
+        # === REGOLE PER BAGNO (dinamiche) ===
+        applica(regole_bagno, (' ', '/'))
+
+        # === REGOLE PER CAMERA (set lenzuola 1:1 con le camere) ===
+        for chiave, caratteristica in (('set_lenzuola_matrimoniali', _MATRIMONIALI),
+                                       ('set_lenzuola_singole', _SINGOLE)):
+            coeff = np.zeros(len(CARATTERISTICHE), dtype=np.int64)
+            coeff[caratteristica] = 1
+            colonne[chiave] = coeff
+
+        # === REGOLE CUCINA (dinamiche) ===
+        applica(regole_cucina, (' ', '/', '+'))
+
+        with self._lock:
+            self.regole_bagno = regole_bagno
+            self.regole_cucina = regole_cucina
+            self.articoli = list(colonne.keys())
+            self.coefficienti = (np.stack(list(colonne.values()), axis=1) if colonne
+                                 else np.zeros((len(CARATTERISTICHE), 0), dtype=np.int64))
+            self.messaggi_info = messaggi
+
+        print(f"[OK] Regole materiali compilate: {len(self.articoli)} articoli, {len(messaggi)} messaggi")
+
+    def versione(self) -> str:
+        """Firma del file regole compilato (cambia quando l'Excel viene modificato)"""
+        with self._lock:
+            self._valida()
+            return f"{self._firma[0]}:{self._firma[1]}" if self._firma else ''
+
+    @staticmethod
+    def caratteristiche(appartamento_info: Dict, num_persone: int) -> List[int]:
+        """Riga della matrice caratteristiche per un appartamento"""
+        return [
+            int(num_persone),
+            int(appartamento_info.get('Bagni', 1)),
+            int(appartamento_info.get('Camere Matrimoniali', 0)),
+            int(appartamento_info.get('Camere Singole', 0)),
+            1
+        ]
+
+    def calcola(self, righe_caratteristiche: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quantità per task e totali in un solo passaggio.
+
+        Args:
+            righe_caratteristiche: una riga [persone, bagni, matrimoniali, singole, 1] per task
+
+        Returns:
+            (matrice task x articoli, vettore totali per articolo); colonne = self.articoli
+        """
+        with self._lock:
+            self._valida()
+            coefficienti = self.coefficienti
+
+        F = np.asarray(righe_caratteristiche, dtype=np.int64).reshape(-1, len(CARATTERISTICHE))
+        quantita = F @ coefficienti
+        return quantita, quantita.sum(axis=0)
+
+    def materiali_tasks(self, appartamenti: List[Tuple[Dict, int]]) -> List[Dict]:
+        """
+        Dict materiali (stesso formato di calcola_materiali_intelligente) per
+        una lista di (appartamento_info, num_persone), con un solo prodotto matriciale.
+        """
+        if not appartamenti:
+            return []
+
+        quantita, _ = self.calcola([self.caratteristiche(info, persone) for info, persone in appartamenti])
+
+        with self._lock:
+            articoli = self.articoli
+            messaggi_info = self.messaggi_info
+
+        risultati = []
+        for (info, _), riga in zip(appartamenti, quantita.tolist()):
+            materiali = dict(zip(articoli, riga))
+
+            # Info macchina caffè
+            materiali['tipo_macchina_caffe'] = info.get('Tipologia Cialde Caffè', 'Non specificata')
+
+            # Aggiungi messaggi informativi
+            if messaggi_info:
+                materiali['_messaggi_info'] = list(messaggi_info)
+
+            risultati.append(materiali)
+
+        return risultati
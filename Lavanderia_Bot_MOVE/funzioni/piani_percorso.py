@@ -0,0 +1,127 @@
+"""
+Cache dei piani di percorso
+
+Il giro ottimizzato per un insieme di indirizzi (più il deposito) viene
+salvato in cache/percorsi/<impronta>.json, con impronta = sha256 degli
+indirizzi normalizzati ordinati alfabeticamente e del deposito: lo stesso PDF
+ricaricato, o un PDF con gli stessi appartamenti in altro ordine, ritrova il
+giro senza ricalcolarlo.
+
+Per PDF quasi uguali (fino a MAX_MODIFICHE indirizzi aggiunti o tolti)
+simile() restituisce il piano più vicino con lo stesso deposito: chi lo usa
+toglie le tappe sparite e inserisce le nuove nel punto più economico invece
+di risolvere il giro da capo.
+
+cache/percorsi/indice.json tiene impronta -> (deposito, indirizzi) per la
+ricerca dei piani simili.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from file_cache import cartella_cache, leggi_json, scrivi_json
+
+logger = logging.getLogger(__name__)
+
+TTL_GIORNI = 30
+
+# Indirizzi aggiunti + tolti oltre i quali si ricalcola il giro
+MAX_MODIFICHE = 2
+
+# Piani più recenti tenuti nell'indice
+MAX_PIANI = 200
+
+
+def impronta_piano(chiavi: Sequence[str], deposito: str) -> str:
+    return hashlib.sha256(json.dumps([deposito, sorted(chiavi)], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def differenza(chiavi_a: Sequence[str], chiavi_b: Sequence[str]) -> int:
+    """Indirizzi da aggiungere + togliere per passare da a a b (con ripetizioni)"""
+    a, b = Counter(chiavi_a), Counter(chiavi_b)
+    return sum(((a - b) + (b - a)).values())
+
+
+class CachePiani:
+    """Piani di percorso su disco per impronta, con ricerca dei piani simili"""
+
+    def __init__(self, cache_dir: str = None, ttl_giorni: float = TTL_GIORNI):
+        """
+        Args:
+            cache_dir: Cartella della cache (default: <root bot>/cache/percorsi)
+            ttl_giorni: Validità di un piano
+        """
+        self.cache_dir = cache_dir or cartella_cache('percorsi')
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.ttl = ttl_giorni * 86400
+        self.indice_path = os.path.join(self.cache_dir, 'indice.json')
+        self._lock = threading.Lock()
+
+    def _path(self, impronta: str) -> str:
+        return os.path.join(self.cache_dir, f"{impronta}.json")
+
+    def _valido(self, piano: Optional[Dict]) -> bool:
+        return piano is not None and time.time() - piano.get('ts', 0) <= self.ttl
+
+    def get(self, chiavi: Sequence[str], deposito: str) -> Optional[Dict]:
+        """Piano per esattamente questi indirizzi e deposito, o None"""
+        piano = leggi_json(self._path(impronta_piano(chiavi, deposito)))
+        return piano if self._valido(piano) else None
+
+    def simile(self, chiavi: Sequence[str], deposito: str, max_modifiche: int = MAX_MODIFICHE) -> Optional[Dict]:
+        """Piano con lo stesso deposito e al più max_modifiche indirizzi diversi"""
+        indice = leggi_json(self.indice_path, descrizione="Indice piani percorso") or {}
+        adesso = time.time()
+
+        migliore, modifiche_migliore = None, max_modifiche + 1
+        for impronta, voce in indice.items():
+            if voce['deposito'] != deposito or adesso - voce.get('ts', 0) > self.ttl:
+                continue
+            if abs(len(voce['chiavi']) - len(chiavi)) > max_modifiche:
+                continue
+            modifiche = differenza(voce['chiavi'], chiavi)
+            if 0 < modifiche < modifiche_migliore:
+                migliore, modifiche_migliore = impronta, modifiche
+
+        if migliore is None:
+            return None
+        piano = leggi_json(self._path(migliore))
+        return piano if self._valido(piano) else None
+
+    def set(self, giro: List[str], deposito: str, info: Dict):
+        """
+        Salva un piano.
+
+        Args:
+            giro: Indirizzi normalizzati in ordine di visita
+            deposito: Deposito normalizzato (partenza e arrivo)
+            info: total_distance_km, total_duration_minutes, solver
+        """
+        impronta = impronta_piano(giro, deposito)
+        adesso = time.time()
+        piano = {'deposito': deposito, 'giro': list(giro), 'ts': adesso, **info}
+
+        with self._lock:
+            try:
+                scrivi_json(self._path(impronta), piano)
+
+                indice = leggi_json(self.indice_path, descrizione="Indice piani percorso") or {}
+                indice[impronta] = {'deposito': deposito, 'chiavi': sorted(giro), 'ts': adesso}
+                if len(indice) > MAX_PIANI:
+                    recenti = sorted(indice.items(), key=lambda kv: kv[1].get('ts', 0), reverse=True)
+                    indice = dict(recenti[:MAX_PIANI])
+                    for vecchia, _ in recenti[MAX_PIANI:]:
+                        try:
+                            os.remove(self._path(vecchia))
+                        except OSError:
+                            pass
+                scrivi_json(self.indice_path, indice)
+            except OSError as e:
+                logger.warning(f"⚠️ Piano percorso non salvato: {e}")
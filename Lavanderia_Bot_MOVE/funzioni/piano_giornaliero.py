@@ -0,0 +1,264 @@
+"""
+Piano giornaliero salvato e confronto con un PDF corretto
+
+Capita che il coordinatore rimandi il PDF booking della stessa giornata dopo
+un check-in modificato all'ultimo. Ogni elaborazione salva il piano in
+cache/giornate/piano_<YYYY-MM-DD>.json, con la data del giro letta
+dall'intestazione del PDF (data_giro). Se il PDF non riporta la data si usa
+quella di elaborazione, ma il confronto vale solo tra PDF della stessa
+famiglia (stesso nome file, senza il prefisso timestamp del bot), così il
+PDF di domani mandato oggi non viene confrontato con quello di oggi.
+
+Quando arriva un nuovo PDF per la stessa giornata:
+- i task sono abbinati per chiave (appartamento, o note per i generici)
+- i materiali dei task invariati vengono riusati, si ricalcolano solo i
+  task nuovi o cambiati
+- il riepilogo riporta solo le differenze ("+2 appartamenti, −1, +6 asciugamani")
+
+Il giro non va ricalcolato da capo: con pochi indirizzi diversi
+RouteOptimizer ripara il piano in cache (vedi piani_percorso), e il report PDF
+ridisegna solo le sezioni degli operatori cambiati (vedi report_pdf).
+
+Formato file:
+    {"data": "2025-01-31", "data_da_pdf": true, "ts": ..., "pdf_source": "...",
+     "tasks": [...], "materiali_totali": {...}}
+"""
+
+import os
+import re
+import json
+import time
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from indice_nomi import normalizza_nome
+from estrattore_righe import dividi_blocchi
+from file_cache import cartella_cache, leggi_json, scrivi_json
+
+logger = logging.getLogger(__name__)
+
+# Piani giornalieri tenuti su disco
+GIORNI_CONSERVATI = 14
+
+# Campi del task che, se cambiano, lo rendono "modificato" (letti dal PDF)
+CAMPI_PIANO = (
+    'nome_proprieta', 'indirizzo', 'tipo_evento', 'tipo_pulizia', 'tipo_task',
+    'num_persone', 'note_raw', 'operatore', 'orario_vincolo',
+)
+
+
+# Date nell'intestazione del PDF: 31/01/2025, 31-01-25, 2025-01-31, 31 gennaio 2025
+_DATA_NUMERICA = re.compile(r'\b(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{4}|\d{2})\b')
+_DATA_ISO = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+MESI = ('gennaio', 'febbraio', 'marzo', 'aprile', 'maggio', 'giugno', 'luglio',
+        'agosto', 'settembre', 'ottobre', 'novembre', 'dicembre')
+_DATA_TESTUALE = re.compile(r'\b(\d{1,2})\s+(' + '|'.join(MESI) + r')\s+(\d{4})\b', re.IGNORECASE)
+
+# Prefisso aggiunto dal bot al nome del PDF ricevuto ({timestamp}_{file_name})
+_PREFISSO_TIMESTAMP = re.compile(r'^\d{8}_\d{6}_')
+
+
+def _json_default(valore):
+    """Tipi numpy -> python, il resto come stringa"""
+    if hasattr(valore, 'item'):
+        return valore.item()
+    if isinstance(valore, (set, tuple)):
+        return sorted(valore)
+    return str(valore)
+
+
+def _data_valida(anno: int, mese: int, giorno: int) -> Optional[str]:
+    if anno < 100:
+        anno += 2000
+    try:
+        return datetime(anno, mese, giorno).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def data_giro(pdf_text: str) -> Optional[str]:
+    """
+    Data del giro (YYYY-MM-DD) dall'intestazione del PDF, cioè le righe prima
+    del primo appartamento (le note possono contenere altre date). None se
+    l'intestazione non riporta una data.
+    """
+    intestazione, _ = dividi_blocchi([line.strip() for line in pdf_text.split('\n') if line.strip()])
+    for line in intestazione:
+        for m in _DATA_ISO.finditer(line):
+            data = _data_valida(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            if data:
+                return data
+        for m in _DATA_NUMERICA.finditer(line):
+            data = _data_valida(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+            if data:
+                return data
+        for m in _DATA_TESTUALE.finditer(line):
+            data = _data_valida(int(m.group(3)), MESI.index(m.group(2).lower()) + 1, int(m.group(1)))
+            if data:
+                return data
+    return None
+
+
+def famiglia_pdf(pdf_source: Optional[str]) -> str:
+    """Nome del PDF senza prefisso timestamp del bot, per confrontare PDF senza data"""
+    nome = os.path.basename(pdf_source or '')
+    return _PREFISSO_TIMESTAMP.sub('', nome).strip().lower()
+
+
+def assegna_chiavi(tasks: List[Dict]):
+    """
+    Imposta task['chiave_piano']: appartamento (o note per i generici), con
+    #2, #3... per più task dello stesso appartamento nella giornata.
+    """
+    visti = Counter()
+    for task in tasks:
+        if task.get('appartamento_generico', False):
+            base = 'GENERICO|' + normalizza_nome(task.get('note_raw') or '')
+        else:
+            base = normalizza_nome(task.get('nome_proprieta') or '')
+        visti[base] += 1
+        task['chiave_piano'] = base if visti[base] == 1 else f"{base}#{visti[base]}"
+
+
+def firma_task(task: Dict) -> str:
+    """Firma dei dati del PDF per il task (prima dell'ottimizzazione percorso)"""
+    return json.dumps([task.get(campo) for campo in CAMPI_PIANO], ensure_ascii=False, default=_json_default)
+
+
+def firma_materiali(caratteristiche: List[int], tipo_cialde, versione_regole: str) -> str:
+    """Firma di tutto ciò da cui dipendono i materiali di un task"""
+    return json.dumps([caratteristiche, tipo_cialde, versione_regole], ensure_ascii=False, default=_json_default)
+
+
+def confronta(tasks_prima: List[Dict], tasks_dopo: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Abbina i task per chiave_piano.
+
+    Returns:
+        {'aggiunti': [...], 'rimossi': [...], 'modificati': [...], 'invariati': [...]}
+        (aggiunti/modificati/invariati = task nuovi, rimossi = task del piano precedente)
+    """
+    prima = {t.get('chiave_piano'): t for t in tasks_prima}
+    chiavi_dopo = {t.get('chiave_piano') for t in tasks_dopo}
+
+    esito = {'aggiunti': [], 'rimossi': [], 'modificati': [], 'invariati': []}
+    for task in tasks_dopo:
+        precedente = prima.get(task.get('chiave_piano'))
+        if precedente is None:
+            esito['aggiunti'].append(task)
+        elif (precedente.get('firma_piano') != task.get('firma_piano')
+              or precedente.get('firma_materiali') != task.get('firma_materiali')):
+            esito['modificati'].append(task)
+        else:
+            esito['invariati'].append(task)
+    esito['rimossi'] = [t for t in tasks_prima if t.get('chiave_piano') not in chiavi_dopo]
+    return esito
+
+
+def delta_materiali(prima: Dict, dopo: Dict) -> Dict[str, int]:
+    """Differenza dei materiali totali (solo articoli numerici cambiati)"""
+    delta = {}
+    for articolo in list(dopo) + [a for a in prima if a not in dopo]:
+        q_prima, q_dopo = prima.get(articolo, 0), dopo.get(articolo, 0)
+        if not isinstance(q_prima, (int, float)) or not isinstance(q_dopo, (int, float)):
+            continue
+        if q_dopo != q_prima:
+            delta[articolo] = int(q_dopo - q_prima)
+    return delta
+
+
+def _con_segno(n: int) -> str:
+    return f"+{n}" if n > 0 else f"−{-n}"
+
+
+def testo_delta(delta: Dict) -> str:
+    """'+2 appartamenti, −1, 1 modificato; +6 asciugamani grandi, −2 carta igienica'"""
+    parti = []
+    if delta['aggiunti']:
+        n = len(delta['aggiunti'])
+        parti.append(f"+{n} {'appartamento' if n == 1 else 'appartamenti'}")
+    if delta['rimossi']:
+        parti.append(f"−{len(delta['rimossi'])}")
+    if delta['modificati']:
+        n = len(delta['modificati'])
+        parti.append(f"{n} {'modificato' if n == 1 else 'modificati'}")
+    testo = ', '.join(parti) or 'nessun appartamento cambiato'
+
+    materiali = [f"{_con_segno(qty)} {articolo.replace('_', ' ')}"
+                 for articolo, qty in delta['materiali'].items()]
+    if materiali:
+        testo += '; ' + ', '.join(materiali)
+    return testo
+
+
+class ArchivioPiani:
+    """Ultimo piano elaborato per ogni giornata del giro, su disco"""
+
+    def __init__(self, cache_dir: str = None, giorni_conservati: int = GIORNI_CONSERVATI):
+        """
+        Args:
+            cache_dir: Cartella dei piani (default: <root bot>/cache/giornate)
+            giorni_conservati: I piani più vecchi vengono cancellati
+        """
+        self.cache_dir = cache_dir or cartella_cache('giornate')
+        self.giorni_conservati = giorni_conservati
+
+    def _path(self, data: str) -> str:
+        return os.path.join(self.cache_dir, f"piano_{data}.json")
+
+    @staticmethod
+    def oggi() -> str:
+        return datetime.now().strftime('%Y-%m-%d')
+
+    def data_report(self, report: Dict) -> str:
+        """Giornata del report: data del giro dal PDF, altrimenti data di elaborazione"""
+        return report.get('data_giro') or self.oggi()
+
+    def carica(self, data: str = None) -> Optional[Dict]:
+        """Piano salvato per la giornata (default oggi), o None"""
+        return leggi_json(self._path(data or self.oggi()), descrizione="Piano giornaliero")
+
+    def precedente(self, report: Dict) -> Optional[Dict]:
+        """
+        Piano da confrontare con il report: quello salvato per la data del
+        giro; senza data nel PDF solo se viene dalla stessa famiglia di PDF
+        (e nemmeno il piano salvato aveva la data).
+        """
+        piano = self.carica(self.data_report(report))
+        if piano is None or report.get('data_giro'):
+            return piano
+        if piano.get('data_da_pdf') or famiglia_pdf(piano.get('pdf_source')) != famiglia_pdf(report.get('pdf_source')):
+            logger.info("ℹ️ PDF senza data e piano salvato da un altro PDF: nessun confronto")
+            return None
+        return piano
+
+    def salva(self, report: Dict, data: str = None):
+        """Salva tasks e materiali totali del report come piano della giornata"""
+        data = data or self.data_report(report)
+        piano = {
+            'data': data,
+            'data_da_pdf': bool(report.get('data_giro')),
+            'ts': time.time(),
+            'pdf_source': report.get('pdf_source'),
+            'tasks': report['tasks'],
+            'materiali_totali': report.get('materiali_totali', {}),
+        }
+
+        try:
+            scrivi_json(self._path(data), piano, default=_json_default)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Piano giornaliero non salvato: {e}")
+            return
+        self._pulisci()
+
+    def _pulisci(self):
+        limite = time.time() - self.giorni_conservati * 86400
+        try:
+            for nome in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, nome)
+                if nome.startswith('piano_') and os.path.getmtime(path) < limite:
+                    os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,697 @@
+"""
+Generazione output del report giornaliero
+- PDF professionale (reportlab)
+- File LOG di controllo con tutti i match e calcoli
+
+Separato da bot.py per poter essere eseguito anche nei processi worker
+della coda elaborazioni, fuori dall'event loop del bot.
+
+Il PDF è composto da sezioni unite con PyPDF2: il riepilogo (ridisegnato ogni
+volta) e il dettaglio appartamenti di ogni operatore, su pagine proprie. Il
+dettaglio di un operatore è salvato in cache/pdf_sezioni con nome = sha256 dei
+dati che mostra: con un PDF corretto rimandato in giornata si ridisegnano solo
+gli operatori con task cambiati.
+
+report_operatore() ritaglia dal report i soli task, giro e materiali di un
+operatore: passato a generate_pdf_report produce il PDF da mandare a
+quell'operatore, con la stessa sezione di dettaglio (e la stessa voce di
+cache) del PDF completo.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from PyPDF2 import PdfWriter
+
+from file_cache import cartella_cache, scrivi_atomico
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+
+logger = logging.getLogger(__name__)
+
+# Da incrementare quando cambia il layout del dettaglio (invalida la cache sezioni)
+VERSIONE_SEZIONI = 1
+
+# Campi del task mostrati nel dettaglio operatore (chiave della cache sezioni)
+CAMPI_DETTAGLIO = (
+    'nome_proprieta', 'operatore', 'destinazione_riferimento', 'ha_cantina', 'note', 'titolo_note',
+    'pulizie_interne', 'tipo_evento', 'tipo_pulizia', 'indirizzo', 'num_persone',
+    'camere_matrimoniali', 'camere_singole', 'bagni', 'materiali_necessari', 'note_raw',
+)
+
+# Sezioni non più usate da questi giorni vengono cancellate
+GIORNI_CACHE_SEZIONI = 7
+
+# ==================== STILI ====================
+# Creati una volta per processo e condivisi da tutti i report
+
+STILI = getSampleStyleSheet()
+
+STILE_TITOLO = ParagraphStyle(
+    'CustomTitle',
+    parent=STILI['Heading1'],
+    fontSize=18,
+    textColor=colors.HexColor('#1f4788'),
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+
+STILE_INTESTAZIONE = ParagraphStyle(
+    'CustomHeading',
+    parent=STILI['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#2c5aa0'),
+    spaceAfter=12,
+    spaceBefore=16
+)
+
+STILE_RIEPILOGO = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+])
+
+STILE_PERCORSO = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+])
+
+STILE_MATERIALI = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+])
+
+STILE_NOTE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFFDE7')),
+    ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#FBC02D')),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+])
+
+
+def _stile_operatore(righe_intestazione: int) -> TableStyle:
+    """
+    Sommario operatore in un'unica tabella: righe di intestazione (nome,
+    giro) in viola, poi una riga per immobile.
+    """
+    ultima = righe_intestazione - 1
+    return TableStyle([
+        # Immobili
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#EDE7F6')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        # Intestazione operatore con colore distintivo
+        ('BACKGROUND', (0, 0), (-1, ultima), colors.HexColor('#673AB7')),
+        ('TEXTCOLOR', (0, 0), (-1, ultima), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, ultima), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, ultima), 8),
+        ('TOPPADDING', (0, 0), (-1, ultima), 8),
+    ])
+
+
+def _stile_task(colore_intestazione, colore_corpo) -> TableStyle:
+    """Box appartamento del dettaglio: riga titolo colorata + righe dati"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, 0), colore_intestazione),
+        ('TEXTCOLOR', (0, 0), (0, 0), colors.whitesmoke),
+        ('BACKGROUND', (0, 1), (0, -1), colore_corpo),
+        ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+    ])
+
+
+# Intestazione operatore di una riga (nome) o due (nome + giro)
+STILI_OPERATORE = {1: _stile_operatore(1), 2: _stile_operatore(2)}
+
+STILE_TASK_INTERNO = _stile_task(colors.HexColor('#2196F3'), colors.HexColor('#E3F2FD'))  # Blu
+STILE_TASK_ESTERNO = _stile_task(colors.HexColor('#FF6F00'), colors.HexColor('#FFE0B2'))  # Arancione
+
+
+# ==================== REPORT PER OPERATORE ====================
+
+def raggruppa_operatori(tasks: List[Dict]) -> Tuple[Dict[str, List[Dict]], List[str]]:
+    """
+    Task per operatore (ordine percorso) e operatori in ordine alfabetico,
+    con "Non assegnato" alla fine.
+    """
+    operatori_tasks = {}
+    for task in tasks:
+        operatore = task.get('operatore', 'Non assegnato')
+        if operatore not in operatori_tasks:
+            operatori_tasks[operatore] = []
+        operatori_tasks[operatore].append(task)
+    
+    operatori_ordinati = sorted([op for op in operatori_tasks.keys() if op != 'Non assegnato'])
+    if 'Non assegnato' in operatori_tasks:
+        operatori_ordinati.append('Non assegnato')
+    return operatori_tasks, operatori_ordinati
+
+
+def report_operatore(report: dict, operatore: str) -> dict:
+    """Report ridotto ai task, al giro e ai materiali totali di un operatore"""
+    tasks = [t for t in report['tasks'] if t.get('operatore', 'Non assegnato') == operatore]
+    
+    materiali_totali = {}
+    macchine = set()
+    for task in tasks:
+        for item, qty in task.get('materiali_necessari', {}).items():
+            if item == 'tipo_macchina_caffe':
+                macchine.add(qty)
+            elif item != '_messaggi_info' and isinstance(qty, (int, float)):
+                materiali_totali[item] = materiali_totali.get(item, 0) + qty
+    if macchine:
+        materiali_totali['tipo_macchina_caffe'] = ', '.join(sorted(macchine))
+    
+    ridotto = {
+        'operatore': operatore,
+        'tasks': tasks,
+        'totale_task': len(tasks),
+        'materiali_totali': materiali_totali,
+        'pdf_source': report.get('pdf_source'),
+    }
+    
+    giro = next((g for g in report.get('route_info', {}).get('giri', []) if g['operatore'] == operatore), None)
+    if giro:
+        ridotto['route_info'] = {
+            'success': giro['success'],
+            'route_url': giro['route_url'],
+            'total_distance_km': giro['total_distance_km'],
+            'total_duration_minutes': giro['total_duration_minutes'],
+            'giri': [giro],
+        }
+    return ridotto
+
+
+def nome_file_operatore(operatore: str) -> str:
+    """'NOHA SALEM ATRIS' -> 'noha_salem_atris' (per i nomi dei file PDF)"""
+    return re.sub(r'[^a-z0-9]+', '_', operatore.lower()).strip('_') or 'operatore'
+
+
+class ReportPDF:
+    """Genera PDF e LOG di controllo a partire dal report del MasterProcessor"""
+    
+    def __init__(self, logs_dir: str, cache_dir: str = None):
+        """
+        Args:
+            logs_dir: Cartella dove salvare i file LOG di controllo
+            cache_dir: Cartella sezioni PDF (default: <root bot>/cache/pdf_sezioni)
+        """
+        self.logs_dir = logs_dir
+        self.cache_dir = cache_dir or cartella_cache('pdf_sezioni')
+    
+    def generate_control_log(self, report: dict, timestamp: str) -> str:
+        """
+        Genera file LOG di controllo con tutti i match e calcoli
+        Salvato solo localmente in logs/, non inviato in chat
+        
+        Args:
+            report: Report generato dal processor
+            timestamp: Timestamp unico per il file
+            
+        Returns:
+            Path del file LOG
+        """
+        log_path = os.path.join(self.logs_dir, f'log_{timestamp}.txt')
+        
+        with open(log_path, 'w', encoding='utf-8') as f:
+            f.write("═" * 79 + "\n")
+            f.write(f"{'FILE LOG DI CONTROLLO - ' + datetime.now().strftime('%d/%m/%Y %H:%M'):^79}\n")
+            f.write("═" * 79 + "\n\n")
+            
+            f.write("📋 RIEPILOGO ELABORAZIONE\n")
+            f.write("─" * 79 + "\n")
+            f.write(f"PDF Fonte: {report.get('pdf_source', 'N/A')}\n")
+            f.write(f"Data Elaborazione: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
+            f.write(f"Totale Appartamenti Trovati: {report.get('totale_task', len(report.get('tasks', [])))}\n")
+            f.write(f"Check-in: {report.get('summary', {}).get('check_in', 0)}\n")
+            f.write(f"Check-out: {report.get('summary', {}).get('check_out', 0)}\n\n\n")
+            
+            if report.get('chunk_falliti'):
+                f.write("⚠️ PARTI DEL PDF NON INTERPRETATE (elenco appartamenti INCOMPLETO)\n")
+                f.write("─" * 79 + "\n")
+                for fallito in report['chunk_falliti']:
+                    f.write(f"Parte {fallito['chunk']}/{fallito['totale']} da \"{fallito['prima_riga']}\": "
+                            f"{fallito['errore']}\n")
+                f.write("\n\n")
+            
+            if report.get('delta'):
+                delta = report['delta']
+                f.write("🔄 MODIFICHE RISPETTO AL PIANO PRECEDENTE\n")
+                f.write("─" * 79 + "\n")
+                f.write(f"PDF Precedente: {delta.get('pdf_precedente') or 'N/A'}\n")
+                f.write(f"Riepilogo: {delta['testo']}\n")
+                for etichetta, chiave in (('Aggiunti', 'aggiunti'), ('Rimossi', 'rimossi'), ('Modificati', 'modificati')):
+                    if delta[chiave]:
+                        f.write(f"{etichetta}: {', '.join(delta[chiave])}\n")
+                f.write("\n\n")
+            
+            f.write("🏠 APPARTAMENTI RICONOSCIUTI E ANALIZZATI\n")
+            f.write("═" * 79 + "\n\n")
+            
+            for i, task in enumerate(report['tasks'], 1):
+                f.write(f"┌─ APPARTAMENTO {i:02d} " + "─" * 60 + "┐\n")
+                f.write(f"│ Nome Proprietà: {task['nome_proprieta']:<64}│\n")
+                f.write(f"│ Nome OTA: {task['nome_ota']:<70}│\n")
+                f.write(f"│ Indirizzo: {task['indirizzo']:<67}│\n")
+                f.write("├" + "─" * 77 + "┤\n")
+                f.write(f"│ N. Persone: {task['num_persone']:<66}│\n")
+                f.write(f"│ Magazzino: {task.get('magazzino', 'N/A'):<67}│\n")
+                f.write("├" + "─" * 77 + "┤\n")
+                f.write(f"│ 🛏️  STRUTTURA:                                                          │\n")
+                f.write(f"│   • Camere Matrimoniali: {int(task.get('camere_matrimoniali', 0)):<47}│\n")
+                f.write(f"│   • Camere Singole: {int(task.get('camere_singole', 0)):<52}│\n")
+                f.write(f"│   • Bagni: {int(task.get('bagni', 0)):<63}│\n")
+                f.write("├" + "─" * 77 + "┤\n")
+                f.write(f"│ 📦 MATERIALI CALCOLATI:                                                 │\n")
+                
+                materiali = task.get('materiali_necessari', {})
+                for mat_key, qty in materiali.items():
+                    # Converti qty a intero (può essere stringa dall'Excel)
+                    try:
+                        qty_int = int(qty) if qty != '' else 0
+                    except (ValueError, TypeError):
+                        continue
+                    
+                    if qty_int > 0:
+                        nome_mat = mat_key.replace('_', ' ').title()
+                        f.write(f"│   • {nome_mat}: {qty_int} {('set' if 'lenzuola' in mat_key else 'pz'):<50}│\n")
+                
+                f.write("├" + "─" * 77 + "┤\n")
+                if task.get('note'):
+                    # Spezza note lunghe
+                    note_lines = [task['note'][i:i+70] for i in range(0, len(task['note']), 70)]
+                    f.write(f"│ 📝 NOTE:                                                                │\n")
+                    for line in note_lines:
+                        f.write(f"│   {line:<73}│\n")
+                    f.write("├" + "─" * 77 + "┤\n")
+                
+                f.write(f"│ 🔍 CONTESTO RAW (per verifica):                                         │\n")
+                context_lines = [task.get('raw_context', 'N/A')[i:i+70] for i in range(0, min(len(task.get('raw_context', '')), 140), 70)]
+                for line in context_lines:
+                    f.write(f"│   {line:<73}│\n")
+                
+                f.write("└" + "─" * 77 + "┘\n\n")
+            
+            # Sezione materiali totali
+            f.write("\n" + "═" * 79 + "\n")
+            f.write("📊 RIEPILOGO MATERIALI TOTALI\n")
+            f.write("═" * 79 + "\n\n")
+            
+            for mat, qty in report['materiali_totali'].items():
+                # Salta campi non-materiali
+                if mat in ['flag_preparare_lenzuola', 'tipo_macchina_caffe']:
+                    continue
+                
+                # Converti qty a intero (può essere stringa dall'Excel)
+                try:
+                    qty_int = int(qty) if qty != '' else 0
+                except (ValueError, TypeError):
+                    continue
+                
+                nome_mat = mat.replace('_', ' ').title()
+                unita = 'set' if 'lenzuola' in mat else 'pz'
+                f.write(f"{nome_mat:<50} {qty_int:>5} {unita}\n")
+            
+            # Sezione route
+            if report.get('route_info'):
+                f.write("\n\n" + "═" * 79 + "\n")
+                f.write("🗺️  INFORMAZIONI PERCORSO\n")
+                f.write("═" * 79 + "\n\n")
+                route = report['route_info']
+                f.write(f"Distanza Totale: {route['total_distance_km']:.2f} km\n")
+                f.write(f"Durata Stimata: {route['total_duration_minutes']} minuti\n")
+                f.write(f"Ordine Ottimizzato: {route.get('optimized_order', [])}\n\n")
+                f.write(f"Link Google Maps:\n{route.get('route_url', 'N/A')}\n")
+                
+                for giro in route.get('giri', []):
+                    f.write(f"\n👤 {giro['operatore']}: {giro['tappe']} tappe, {giro['viaggi']} viaggi, "
+                            f"{giro['set_lenzuola']} set lenzuola, {giro['total_distance_km']:.2f} km, "
+                            f"{giro['total_duration_minutes']} minuti\n")
+                    f.write(f"Partenza: {giro['deposito']} (risolutore: {giro.get('solver') or 'nessuno'})\n")
+                    if giro['ritardi']:
+                        f.write(f"⚠️ Orario non rispettabile: {', '.join(giro['ritardi'])}\n")
+                    f.write(f"{giro['route_url'] or 'N/A'}\n")
+            
+            # Footer
+            f.write("\n\n" + "═" * 79 + "\n")
+            f.write(f"{'FINE LOG DI CONTROLLO':^79}\n")
+            f.write("═" * 79 + "\n")
+            f.write(f"Generato automaticamente da Bot Telegram Pulizie\n")
+            f.write(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
+        
+        logger.info(f"Log di controllo generato: {log_path}")
+        return log_path
+    
+    def generate_pdf_report(self, report: dict, output_path: str):
+        """
+        Genera report PDF professionale
+        
+        Args:
+            report: Report generato dal processor, o report_operatore() per
+                il PDF di un solo operatore
+            output_path: Path dove salvare il PDF
+        """
+        operatori_tasks, operatori_ordinati = raggruppa_operatori(report['tasks'])
+        
+        # Riepilogo: sempre ridisegnato (totali, percorso, data)
+        riepilogo = self._story_riepilogo(report, operatori_tasks, operatori_ordinati)
+        writer = PdfWriter()
+        writer.append(self._disegna(riepilogo), excluded_fields=())
+        
+        # Dettaglio per operatore: dalla cache se i suoi task non sono cambiati
+        ridisegnate = 0
+        for operatore in operatori_ordinati:
+            sezione, nuova = self._sezione_operatore(operatore, operatori_tasks[operatore])
+            writer.append(sezione, excluded_fields=())
+            ridisegnate += nuova
+        
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+        writer.close()
+        self._pulisci_sezioni()
+        logger.info(f"Report PDF generato: {output_path} "
+                    f"({ridisegnate}/{len(operatori_ordinati)} sezioni operatore ridisegnate)")
+    
+    @staticmethod
+    def _disegna(story) -> io.BytesIO:
+        """Impagina una story in un PDF in memoria"""
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4,
+                                rightMargin=2*cm, leftMargin=2*cm,
+                                topMargin=2*cm, bottomMargin=2*cm)
+        doc.build(story)
+        buffer.seek(0)
+        return buffer
+    
+    def _story_riepilogo(self, report, operatori_tasks, operatori_ordinati):
+        """Prima sezione: riepilogo, sommario operatori, percorso e materiali totali"""
+        story = []
+        
+        # Header
+        titolo = f"REPORT PULIZIE - {report['operatore']}" if report.get('operatore') else "REPORT PULIZIE GIORNALIERO"
+        story.append(Paragraph(titolo, STILE_TITOLO))
+        story.append(Paragraph(f"Data: {datetime.now().strftime('%d/%m/%Y')}", STILI['Normal']))
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Riepilogo generale
+        story.append(Paragraph("📊 RIEPILOGO GENERALE", STILE_INTESTAZIONE))
+        
+        summary_data = [
+            ['Totale Appartamenti:', str(report.get('totale_task', len(report.get('tasks', []))))]
+        ]
+        
+        summary_table = Table(summary_data, colWidths=[8*cm, 8*cm], style=STILE_RIEPILOGO)
+        story.append(summary_table)
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Modifiche rispetto al PDF precedente della stessa giornata
+        if report.get('delta'):
+            story.append(Paragraph("🔄 MODIFICHE RISPETTO AL PIANO PRECEDENTE", STILE_INTESTAZIONE))
+            story.append(Paragraph(report['delta']['testo'], STILI['Normal']))
+            story.append(Spacer(1, 0.5*cm))
+        
+        # === SOMMARIO PER OPERATORE ===
+        story.append(Paragraph("👤 SOMMARIO PER OPERATORE", STILE_INTESTAZIONE))
+        
+        giri = {giro['operatore']: giro for giro in report.get('route_info', {}).get('giri', [])}
+        
+        # Una tabella per operatore: intestazione + una riga per immobile
+        for operatore in operatori_ordinati:
+            tasks_operatore = operatori_tasks[operatore]
+            num_immobili = len(tasks_operatore)
+            
+            righe = [[f"👤 {operatore} ({num_immobili} immobili)"]]
+            
+            # Giro dell'operatore (solo con giri per operatore)
+            giro = giri.get(operatore)
+            if giro:
+                righe.append([
+                    f"🚐 {giro['total_distance_km']:.1f} km · {giro['total_duration_minutes']} min · "
+                    f"{giro['viaggi']} viaggi · partenza: {giro['deposito']}"
+                ])
+            righe_intestazione = len(righe)
+            
+            # Lista immobili per questo operatore
+            for idx, task in enumerate(tasks_operatore, 1):
+                nome_prop = task.get('nome_proprieta', 'N/A')
+                indirizzo = task.get('indirizzo', 'N/A')
+                tipo_evento = task.get('tipo_evento', 'N/A')
+                num_persone = task.get('num_persone', 0)
+                
+                # Verifica se esterno
+                pulizie_interne = task.get('pulizie_interne', True)
+                is_esterno = str(pulizie_interne).lower() in ['falso', 'false', 'no', '0']
+                badge_esterno = " 🔶" if is_esterno else ""
+                
+                # Orario stimato (giri per operatore), con vincolo check-in se presente
+                orario = ""
+                if task.get('ora_arrivo_stimata'):
+                    orario = f" | 🕒 {task['ora_arrivo_stimata']}"
+                    if task.get('orario_vincolo') and task.get('tipo_task') == 'check-in':
+                        orario += f" (entro {task['orario_vincolo']}{' ⚠️' if task.get('in_ritardo') else ''})"
+                
+                righe.append([f"  {idx}. {nome_prop}{badge_esterno} | {tipo_evento} | 👥 {num_persone} pers. | 📍 {indirizzo[:40]}...{orario}"])
+            
+            # Se la tabella va a capo pagina l'intestazione viene ripetuta
+            story.append(Table(righe, colWidths=[16*cm], repeatRows=righe_intestazione,
+                               style=STILI_OPERATORE[righe_intestazione]))
+            story.append(Spacer(1, 0.3*cm))
+        
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Percorso ottimizzato
+        if report.get('route_info'):
+            route = report['route_info']
+            story.append(Paragraph("🗺️ PERCORSO OTTIMIZZATO", STILE_INTESTAZIONE))
+            
+            route_data = [
+                ['Distanza Totale:', f"{route.get('total_distance_km', 0):.2f} km"],
+                ['Durata Stimata:', f"{route.get('total_duration_minutes', 0)} minuti"]
+            ]
+            
+            route_table = Table(route_data, colWidths=[8*cm, 8*cm], style=STILE_PERCORSO)
+            story.append(route_table)
+            story.append(Spacer(1, 0.3*cm))
+            
+            # Google Maps link (troncato se troppo lungo)
+            maps_url = route.get('route_url', 'N/A')
+            if len(maps_url) > 100:
+                maps_url = maps_url[:100] + '...'
+            if not route.get('giri'):
+                story.append(Paragraph(f"<i>Link Google Maps: {maps_url}</i>", STILI['Normal']))
+            
+            # Un link per operatore
+            for giro in route.get('giri', []):
+                if not giro['route_url']:
+                    continue
+                url = giro['route_url'].replace('&', '&amp;')
+                story.append(Paragraph(
+                    f"<b>{giro['operatore']}</b> ({giro['tappe']} tappe, {giro['total_distance_km']:.1f} km): "
+                    f"<link href=\"{url}\" color=\"blue\">apri in Google Maps</link>", STILI['Normal']))
+            story.append(Spacer(1, 0.5*cm))
+        
+        # Materiali totali
+        story.append(Paragraph("📦 MATERIALI NECESSARI TOTALI", STILE_INTESTAZIONE))
+        
+        materiali_data = [['Materiale', 'Quantità']]
+        for mat, qty in report['materiali_totali'].items():
+            # Salta campi non-materiali
+            if mat in ['flag_preparare_lenzuola', 'tipo_macchina_caffe']:
+                continue
+            
+            # Converti qty a intero (può essere stringa dall'Excel)
+            try:
+                qty_int = int(qty) if qty != '' else 0
+            except (ValueError, TypeError):
+                continue
+            
+            nome = mat.replace('_', ' ').title()
+            unita = 'set' if 'lenzuola' in mat else 'pz'
+            materiali_data.append([nome, f"{qty_int} {unita}"])
+        
+        materiali_table = Table(materiali_data, colWidths=[12*cm, 4*cm], style=STILE_MATERIALI)
+        story.append(materiali_table)
+        
+        # Info lenzuola esterne
+        if report.get('lenzuola_esterne'):
+            lenz = report['lenzuola_esterne']
+            story.append(Paragraph("ℹ️ INFO LENZUOLA TOTALI", STILE_INTESTAZIONE))
+            lenz_text = f"Set lenzuola TOTALI (tutte incluse, interne ed esterne): {lenz['set_lenzuola_matrimoniali']} matrimoniali, {lenz['set_lenzuola_singole']} singole"
+            story.append(Paragraph(lenz_text, STILI['Normal']))
+            story.append(Spacer(1, 0.5*cm))
+        
+        # Footer
+        story.append(Spacer(1, 1*cm))
+        story.append(Paragraph(f"<i>Report generato automaticamente - {datetime.now().strftime('%d/%m/%Y %H:%M')}</i>", 
+                               STILI['Normal']))
+        
+        return story
+    
+    def _sezione_operatore(self, operatore, tasks_operatore):
+        """
+        Dettaglio appartamenti di un operatore, dalla cache se già disegnato.
+        
+        Returns:
+            (path o buffer del PDF della sezione, True se ridisegnata)
+        """
+        dati = [VERSIONE_SEZIONI, operatore, [[task.get(campo) for campo in CAMPI_DETTAGLIO] for task in tasks_operatore]]
+        impronta = hashlib.sha256(json.dumps(dati, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+        path = os.path.join(self.cache_dir, f"{impronta}.pdf")
+        
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # ancora in uso, non va pulita
+            except OSError:
+                pass
+            return path, False
+        
+        story = [Paragraph(f"📋 {operatore} - LISTA APPARTAMENTI (ORDINE PERCORSO)", STILE_INTESTAZIONE),
+                 Spacer(1, 0.3*cm)]
+        for numero, task in enumerate(tasks_operatore, 1):
+            self._add_task_to_story(story, task, numero)
+        buffer = self._disegna(story)
+        
+        try:
+            scrivi_atomico(path, buffer.getvalue())
+        except OSError as e:
+            logger.warning(f"⚠️ Sezione PDF non salvata in cache: {e}")
+        return buffer, True
+    
+    def _pulisci_sezioni(self):
+        """Cancella le sezioni non usate da GIORNI_CACHE_SEZIONI giorni"""
+        limite = time.time() - GIORNI_CACHE_SEZIONI * 86400
+        try:
+            for nome in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, nome)
+                if os.path.getmtime(path) < limite:
+                    os.remove(path)
+        except OSError:
+            pass
+    
+    def _add_task_to_story(self, story, task, numero):
+        """Box di un appartamento nel dettaglio: dati, materiali e note"""
+        # Box per ogni appartamento
+        operatore = task.get('operatore', 'Non assegnato')
+        destinazione = task.get('destinazione_riferimento', 'Abitazione/cantina')
+        ha_cantina = task.get('ha_cantina', False)
+        
+        # Determina dove portare i materiali
+        if destinazione == 'Abitazione/cantina':
+            luogo_materiali = "🔑 MATERIALI IN CANTINA" if ha_cantina else "⬆️ SALIRE IN APPARTAMENTO"
+        else:
+            luogo_materiali = f"📦 PORTARE IN MAGAZZINO: {destinazione}"
+        
+        # Usa note come titolo SOLO se flag titolo_note=True
+        note_task = task.get('note', '').strip()
+        usa_note = task.get('titolo_note', False)
+        titolo_task = note_task if (usa_note and note_task) else task['nome_proprieta']
+        
+        # Verifica se appartamento ha pulizie esterne (Pulizie Interne = Falso)
+        pulizie_interne = task.get('pulizie_interne', True)  # Default True
+        is_esterno = str(pulizie_interne).lower() in ['falso', 'false', 'no', '0']
+        
+        # Aggiungi badge ESTERNO se necessario
+        if is_esterno:
+            titolo_task = f"{titolo_task} 🔶 ESTERNO"
+        
+        task_data = [
+            [f"#{numero} - {titolo_task}"],
+            [f"👤 Operatore: {operatore}"],
+            [f"{luogo_materiali}"],
+            [f"🏠 {task['tipo_evento']} - {task['tipo_pulizia']}"],
+            [f"📍 {task['indirizzo']}"],
+            [f"👥 {task['num_persone']} persone | 🛏️ {int(task.get('camere_matrimoniali', 0))}M + {int(task.get('camere_singole', 0))}S | 🚿 {int(task.get('bagni', 0))} bagni"],
+        ]
+        
+        # Colori diversi per appartamenti esterni
+        stile = STILE_TASK_ESTERNO if is_esterno else STILE_TASK_INTERNO
+        story.append(Table(task_data, colWidths=[16*cm], style=stile))
+        
+        # Materiali per questo task
+        self._add_materiali_to_story(story, task)
+        
+        # Note (se presenti) subito dopo i materiali
+        note_complete = task.get('note_raw', '').strip() or task.get('note', '').strip()
+        if note_complete:
+            note_box_data = [[Paragraph(f'<font size=8><b>📝 NOTE:</b> <i>{note_complete}</i></font>', STILI['Normal'])]]
+            story.append(Table(note_box_data, colWidths=[16*cm], style=STILE_NOTE))
+        
+        story.append(Spacer(1, 0.4*cm))
+    
+    def _add_materiali_to_story(self, story, task):
+        """Helper per aggiungere materiali nel PDF + messaggi informativi"""
+        materiali = task.get('materiali_necessari', {})
+        
+        mat_list = []
+        tipo_macchina = None
+        messaggi_info = materiali.get('_messaggi_info', [])
+        
+        for mat, qty in materiali.items():
+            # Salta campi speciali
+            if mat in ['tipo_macchina_caffe', '_messaggi_info']:
+                if mat == 'tipo_macchina_caffe':
+                    tipo_macchina = qty
+                continue
+            
+            try:
+                qty_int = int(qty) if qty != '' else 0
+            except (ValueError, TypeError):
+                continue
+            
+            if qty_int > 0:
+                nome = mat.replace('_', ' ').title()
+                unita = 'set' if 'lenzuola' in mat else 'pz'
+                mat_list.append(f"• {nome}: {qty_int} {unita}")
+        
+        if mat_list:
+            mat_text = "<br/>".join(mat_list)
+            
+            # Aggiungi info macchina caffè
+            if tipo_macchina and tipo_macchina != 'Non specificata':
+                mat_text += f"<br/><b>☕ Macchina caffè: {tipo_macchina}</b>"
+            
+            story.append(Paragraph(f'<font size=8>📦 <b>Materiali:</b><br/>{mat_text}</font>', STILI['Normal']))
+        
+        # MESSAGGI INFORMATIVI (se presenti)
+        if messaggi_info:
+            story.append(Spacer(1, 0.2*cm))
+            msg_text = "<br/>".join(messaggi_info)
+            story.append(Paragraph(f'<font size=8 color="#0066CC"><i>{msg_text}</i></font>', STILI['Normal']))
@@ -1,35 +1,87 @@
 """
-Route Optimizer - Genera percorso ottimizzato con Google Maps Directions API
+Route Optimizer - Genera percorso ottimizzato
 Crea URL navigabile e calcola ordine ottimale visite giornaliere
+
+Due risolutori:
+- 'locale' (default): TSP in-process (tsp_locale), in millisecondi e senza
+  limite di tappe, sui tempi di percorrenza della matrice persistente
+  (matrice_tempi, riempita con Distance Matrix API solo per le coppie di
+  indirizzi mai viste o scadute); senza API key o per le coppie mancanti
+  usa la stima dalle coordinate degli appartamenti
+- 'google': Google Maps Directions API con optimize:true (max ~25 tappe)
+Se uno non è applicabile (coordinate mancanti, API non disponibile) si usa
+l'altro; solo se falliscono entrambi si tiene l'ordine originale.
+
+I giri calcolati restano in cache (piani_percorso) per insieme di indirizzi
+e deposito: stesso PDF = stesso giro senza ricalcolo; con uno o due
+appartamenti in più o in meno il giro in cache viene riparato.
+
+Con optimize_tasks_per_operatore i task sono divisi tra gli operatori (un
+giro, con deposito e URL Maps, per ciascuno): vedi giri_operatori.
 """
 
 import os
 import json
+import math
+import asyncio
+import threading
+import httpx
 import requests
+import numpy as np
 from datetime import datetime
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+from http_client import client_http
+from anagrafica_appartamenti import AnagraficaAppartamenti, get_anagrafica
+from tsp_locale import (MatriceDistanze, risolvi_tsp, lunghezza_percorso, matrice_haversine,
+                        inserimento_economico, FATTORE_STRADALE, VELOCITA_MEDIA_KMH)
+from matrice_tempi import MatriceTempi, DISTANCE_MATRIX_URL, chiave_indirizzo
+from piani_percorso import CachePiani
+from file_cache import cartella_cache, leggi_json, scrivi_json
+from giri_operatori import (OPERATORE_NON_ASSEGNATO, CAPACITA_SET_VIAGGIO, MINUTI_TRATTA_DEFAULT,
+                            carica_depositi, nome_operatore, ordina_operatori, deposito_operatore,
+                            set_lenzuola, scadenza_task, costo_assegnazione, dividi_viaggi,
+                            simula_orari, anticipa_vincolati, orario_da_minuti)
+
+# MAGAZZINO CENTRALE: punto partenza e arrivo del giro
+MAGAZZINO_CENTRALE = "Via Buon Pastore 52, 41125 Modena (MO)"
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Risolutore locale: tappe più lontane di così dal magazzino (o dal centro
+# delle tappe) hanno coordinate sospette e non entrano nel calcolo
+RAGGIO_MAX_KM = 50
+
 
 class RouteOptimizer:
     """
-    Ottimizza percorso giornaliero usando Google Maps Directions API
-    Free tier: 40,000 richieste/mese (~1,300/giorno)
+    Ottimizza percorso giornaliero con il risolutore TSP locale o con
+    Google Maps Directions API
+    Free tier Google: 40,000 richieste/mese (~1,300/giorno)
     """
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, anagrafica: Optional[AnagraficaAppartamenti] = None,
+                 solver: str = 'locale', budget_ms: float = 100, capacita_set: int = CAPACITA_SET_VIAGGIO):
         """
         Inizializza optimizer con Google Maps API key
         
         Args:
             api_key: Chiave API Google Maps (opzionale, cerca in Config/google_maps_api_key.txt)
+            anagrafica: Anagrafica appartamenti (coordinate per il risolutore locale)
+            solver: 'locale' (TSP in-process) o 'google' (Directions API)
+            budget_ms: Tempo massimo per i miglioramenti 2-opt/Or-opt del risolutore locale
+            capacita_set: Set lenzuola trasportabili in un viaggio (giri per operatore)
         """
+        # Config/ (parent di funzioni/)
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        root_dir = os.path.dirname(script_dir)
+        self.config_dir = os.path.join(root_dir, 'Config')
+        
         if api_key:
             self.api_key = api_key
         else:
-            # Cerca API key in Config/ (parent di funzioni/)
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            root_dir = os.path.dirname(script_dir)
-            config_dir = os.path.join(root_dir, 'Config')
-            api_key_file = os.path.join(config_dir, 'google_maps_api_key.txt')
+            # Cerca API key in Config/
+            api_key_file = os.path.join(self.config_dir, 'google_maps_api_key.txt')
             
             if os.path.exists(api_key_file):
                 with open(api_key_file, 'r', encoding='utf-8') as f:
@@ -41,6 +93,25 @@ class RouteOptimizer:
                 self.api_key = None
         
         self.base_url = "https://maps.googleapis.com/maps/api/directions/json"
+        
+        self.anagrafica = anagrafica or get_anagrafica()
+        self.solver = solver
+        self.budget_ms = budget_ms
+        self.matrice = MatriceDistanze()
+        self.tempi = MatriceTempi()
+        self.piani = CachePiani()
+        self.capacita_set = capacita_set
+        self._depositi = None
+        
+        # Coordinate di indirizzi fuori anagrafica (es. magazzino), geocodificati una volta
+        self._coordinate_path = os.path.join(cartella_cache(), 'coordinate_indirizzi.json')
+        self._coordinate_lock = threading.Lock()
+        self._coordinate_extra = None
+    
+    @property
+    def disponibile(self) -> bool:
+        """True se almeno un risolutore può funzionare"""
+        return bool(self.api_key) or self.solver == 'locale'
     
     def _normalize_address(self, address: str) -> str:
         """
@@ -52,39 +123,31 @@ class RouteOptimizer:
         Returns:
             Indirizzo completo con città
         """
+        completo = self._indirizzo_completo(address)
+        if completo != address.strip():
+            print(f"[INFO] Indirizzo normalizzato: {completo}")
+        return completo
+    
+    @staticmethod
+    def _indirizzo_completo(address: str) -> str:
+        """Come _normalize_address, senza log"""
         address = address.strip()
         
         # Se l'indirizzo non contiene già "Modena" o un CAP di Modena (411xx), aggiungilo
         if 'modena' not in address.lower() and not any(cap in address for cap in ['41121', '41122', '41123', '41124', '41125', '41126']):
             # Aggiungi ", Modena (MO)" alla fine
             address = f"{address}, Modena (MO)"
-            print(f"[INFO] Indirizzo normalizzato: {address}")
         
         return address
     
-    def optimize_route(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
+    def _prepara_route(self, addresses: List[str], start_location: str = None, end_location: str = None):
         """
-        Ottimizza percorso visitando tutti gli indirizzi
-        
-        Args:
-            addresses: Lista indirizzi da visitare
-            start_location: Punto partenza (default: Magazzino Buon Pastore)
-            end_location: Punto arrivo (default: stesso di partenza)
+        Validazione e parametri della chiamata Directions API.
         
         Returns:
-            {
-                'optimized_order': [indici ordinati],
-                'route_url': 'URL Google Maps navigabile',
-                'total_distance': distanza_km,
-                'total_duration': durata_minuti,
-                'waypoints': [indirizzi ordinati],
-                'success': bool
-            }
+            (risultato_immediato, None, None) se non serve chiamare l'API,
+            altrimenti (None, params, addresses_normalizzati)
         """
-        if not self.api_key:
-            print("[ERROR] API key non disponibile - impossibile ottimizzare route")
-            return self._fallback_order(addresses)
-        
         if not addresses or len(addresses) == 0:
             return {
                 'success': False,
@@ -92,21 +155,38 @@ class RouteOptimizer:
                 'optimized_order': [],
                 'route_url': '',
                 'waypoints': []
-            }
+            }, None, None
         
         # Normalizza tutti gli indirizzi
         addresses = [self._normalize_address(addr) for addr in addresses]
         
         # MAGAZZINO CENTRALE: punto partenza e arrivo
         if not start_location:
-            start_location = "Via Buon Pastore 52, 41125 Modena (MO)"
+            start_location = MAGAZZINO_CENTRALE
         
         if not end_location:
             end_location = start_location  # Ritorno al magazzino
         
         # Se solo 1-2 indirizzi, non serve ottimizzazione
         if len(addresses) <= 2:
-            return self._simple_route(addresses, start_location, end_location)
+            return self._simple_route(addresses, start_location, end_location), None, None
+        
+        # Stessi indirizzi (o quasi) di un giro già calcolato
+        if start_location == end_location:
+            risultato = self._piano_in_cache(addresses, start_location)
+            if risultato is not None:
+                return risultato, None, None
+        
+        # Risolutore locale (default): nessuna chiamata di rete
+        if self.solver == 'locale':
+            risultato = self._route_locale(addresses, start_location, end_location)
+            if risultato is not None:
+                self._memorizza_piano(addresses, start_location, end_location, risultato)
+                return risultato, None, None
+        
+        if not self.api_key:
+            print("[ERROR] API key non disponibile - impossibile ottimizzare route con Google")
+            return self._fallback(addresses, start_location, end_location), None, None
         
         # Tutti gli indirizzi sono waypoints (partenza e arrivo fissi al magazzino)
         waypoints = addresses
@@ -115,81 +195,132 @@ class RouteOptimizer:
         print(f"[ROUTE] Partenza: {start_location}")
         print(f"[ROUTE] Arrivo: {end_location}")
         
+        # Partenza = Magazzino, Destinazione = Magazzino, Waypoints = appartamenti
+        params = {
+            'origin': start_location,
+            'destination': end_location,
+            'waypoints': 'optimize:true|' + '|'.join(waypoints),
+            'mode': 'driving',
+            'language': 'it',
+            'key': self.api_key
+        }
+        return None, params, addresses
+    
+    def _risultato_route(self, data: Dict, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
+        """Interpreta la risposta Directions API (waypoint optimization); deposito di partenza/arrivo per il fallback"""
+        if data['status'] != 'OK':
+            print(f"[ERROR] Google Maps API error: {data['status']}")
+            if 'error_message' in data:
+                print(f"[ERROR] Messaggio: {data['error_message']}")
+            return self._fallback(addresses, start_location, end_location)
+        
+        # Estrai ordine ottimizzato waypoints
+        waypoint_order = data['routes'][0].get('waypoint_order', [])
+        
+        # Ordine ottimizzato: gli indici si riferiscono ai waypoints originali
+        optimized_indices = waypoint_order
+        optimized_addresses = [addresses[i] for i in waypoint_order]
+        
+        # Calcola distanza e durata totali
+        total_distance = 0  # metri
+        total_duration = 0  # secondi
+        
+        for leg in data['routes'][0]['legs']:
+            total_distance += leg['distance']['value']
+            total_duration += leg['duration']['value']
+        
+        # Genera URL navigabile (Google Maps app): deposito -> tappe ottimizzate -> deposito
+        route_url = self._url_giro(optimized_addresses, start_location, end_location)
+        
+        print(f"[ROUTE] Ottimizzazione completata:")
+        print(f"  - Distanza totale: {total_distance / 1000:.2f} km")
+        print(f"  - Durata stimata: {total_duration / 60:.0f} minuti")
+        print(f"  - Ordine ottimizzato: {optimized_indices}")
+        
+        return {
+            'success': True,
+            'optimized_order': optimized_indices,
+            'route_url': route_url,
+            'total_distance_km': round(total_distance / 1000, 2),
+            'total_duration_minutes': round(total_duration / 60),
+            'waypoints': optimized_addresses,
+            'original_addresses': addresses,
+            'solver': 'google'
+        }
+    
+    def optimize_route(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
+        """
+        Ottimizza percorso visitando tutti gli indirizzi (versione bloccante,
+        per script; negli handler del bot usare optimize_route_async)
+        
+        Args:
+            addresses: Lista indirizzi da visitare
+            start_location: Punto partenza (default: Magazzino Buon Pastore)
+            end_location: Punto arrivo (default: stesso di partenza)
+        
+        Returns:
+            {
+                'optimized_order': [indici ordinati],
+                'route_url': 'URL Google Maps navigabile',
+                'total_distance': distanza_km,
+                'total_duration': durata_minuti,
+                'waypoints': [indirizzi ordinati],
+                'success': bool
+            }
+        """
+        risultato, params, addresses_norm = self._prepara_route(addresses, start_location, end_location)
+        if risultato is not None:
+            return risultato
+        
         try:
             # Chiamata API Google Maps Directions con waypoint optimization
-            # Partenza = Magazzino, Destinazione = Magazzino, Waypoints = appartamenti
-            params = {
-                'origin': start_location,
-                'destination': end_location,
-                'waypoints': 'optimize:true|' + '|'.join(waypoints),
-                'mode': 'driving',
-                'language': 'it',
-                'key': self.api_key
-            }
-            
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data['status'] != 'OK':
-                print(f"[ERROR] Google Maps API error: {data['status']}")
-                if 'error_message' in data:
-                    print(f"[ERROR] Messaggio: {data['error_message']}")
-                return self._fallback_order(addresses)
-            
-            # Estrai ordine ottimizzato waypoints
-            waypoint_order = data['routes'][0].get('waypoint_order', [])
-            
-            # Ordine ottimizzato: gli indici si riferiscono ai waypoints originali
-            optimized_indices = waypoint_order
-            optimized_addresses = [addresses[i] for i in waypoint_order]
-            
-            # Calcola distanza e durata totali
-            total_distance = 0  # metri
-            total_duration = 0  # secondi
-            
-            for leg in data['routes'][0]['legs']:
-                total_distance += leg['distance']['value']
-                total_duration += leg['duration']['value']
-            
-            # Genera URL navigabile (Google Maps app) - usa gli indirizzi ottimizzati
-            # NON includere ritorno perché già gestito da start_location = end_location
-            route_url = self._generate_maps_url(optimized_addresses, include_return=False)
-            
-            print(f"[ROUTE] Ottimizzazione completata:")
-            print(f"  - Distanza totale: {total_distance / 1000:.2f} km")
-            print(f"  - Durata stimata: {total_duration / 60:.0f} minuti")
-            print(f"  - Ordine ottimizzato: {optimized_indices}")
-            
-            return {
-                'success': True,
-                'optimized_order': optimized_indices,
-                'route_url': route_url,
-                'total_distance_km': round(total_distance / 1000, 2),
-                'total_duration_minutes': round(total_duration / 60),
-                'waypoints': optimized_addresses,
-                'original_addresses': addresses
-            }
+            data = client_http.get_json_sync(self.base_url, params=params, timeout=10)
+            risultato = self._risultato_route(data, addresses_norm, params['origin'], params['destination'])
+            self._memorizza_piano(addresses_norm, params['origin'], params['destination'], risultato)
+            return risultato
         
         except requests.exceptions.RequestException as e:
             print(f"[ERROR] Errore chiamata Google Maps API: {e}")
-            return self._fallback_order(addresses)
+            return self._fallback(addresses_norm, params['origin'], params['destination'])
+        
+        except Exception as e:
+            print(f"[ERROR] Errore ottimizzazione route: {e}")
+            return self._fallback(addresses_norm, params['origin'], params['destination'])
+    
+    async def optimize_route_async(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
+        """Come optimize_route, senza bloccare l'event loop del bot"""
+        # Risolutore locale ed eventuale geocoding del magazzino in un thread
+        risultato, params, addresses_norm = await asyncio.to_thread(
+            self._prepara_route, addresses, start_location, end_location
+        )
+        if risultato is not None:
+            return risultato
+        
+        try:
+            data = await client_http.get_json(self.base_url, params=params, timeout=10)
+            risultato = self._risultato_route(data, addresses_norm, params['origin'], params['destination'])
+            await asyncio.to_thread(self._memorizza_piano, addresses_norm, params['origin'],
+                                    params['destination'], risultato)
+            return risultato
+        
+        except httpx.HTTPError as e:
+            print(f"[ERROR] Errore chiamata Google Maps API: {e}")
+            return self._fallback(addresses_norm, params['origin'], params['destination'])
         
         except Exception as e:
             print(f"[ERROR] Errore ottimizzazione route: {e}")
-            return self._fallback_order(addresses)
+            return self._fallback(addresses_norm, params['origin'], params['destination'])
     
     def _simple_route(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
         """Route semplice per 1-2 indirizzi (no ottimizzazione necessaria)"""
         if not start_location:
-            start_location = "Via Buon Pastore 52, 41125 Modena (MO)"
+            start_location = MAGAZZINO_CENTRALE
         
         if not end_location:
             end_location = start_location
         
         # Crea route: magazzino -> appartamenti -> magazzino
-        full_route = [start_location] + addresses + [end_location]
-        route_url = self._generate_maps_url(full_route)
+        route_url = self._url_giro(addresses, start_location, end_location)
         
         return {
             'success': True,
@@ -203,11 +334,332 @@ class RouteOptimizer:
             'end_location': end_location
         }
     
-    def _fallback_order(self, addresses: List[str]) -> Dict:
+    # ==================== RISOLUTORE LOCALE ====================
+    
+    def _carica_coordinate_extra(self) -> Dict:
+        if self._coordinate_extra is None:
+            self._coordinate_extra = leggi_json(self._coordinate_path) or {}
+        return self._coordinate_extra
+    
+    def _geocodifica(self, address: str) -> Optional[Tuple[float, float]]:
+        """Coordinate da Google Geocoding API (solo per indirizzi fuori anagrafica)"""
+        if not self.api_key:
+            return None
+        try:
+            data = client_http.get_json_sync(GEOCODE_URL, params={
+                'address': address, 'language': 'it', 'key': self.api_key
+            }, timeout=10)
+        except Exception as e:
+            print(f"[WARN] Geocoding non riuscito per {address}: {e}")
+            return None
+        if data.get('status') != 'OK' or not data.get('results'):
+            print(f"[WARN] Geocoding {address}: {data.get('status')}")
+            return None
+        location = data['results'][0]['geometry']['location']
+        return location['lat'], location['lng']
+    
+    def _coordinate(self, address: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) di un indirizzo: anagrafica, poi cache su disco, poi geocoding"""
+        coord = self.anagrafica.coordinate(address)
+        if coord is None and address.endswith(', Modena (MO)'):
+            # Indirizzo completato da _normalize_address
+            coord = self.anagrafica.coordinate(address[:-len(', Modena (MO)')])
+        if coord is not None:
+            return coord
+        
+        with self._coordinate_lock:
+            extra = self._carica_coordinate_extra()
+            if address in extra:
+                return tuple(extra[address])
+            
+            coord = self._geocodifica(address)
+            if coord is not None:
+                extra[address] = list(coord)
+                try:
+                    scrivi_json(self._coordinate_path, extra, indent=2)
+                except OSError as e:
+                    print(f"[WARN] Cache coordinate non salvata: {e}")
+            return coord
+    
+    def _coordinate_valide(self, addresses: List[str], centro: Optional[Tuple[float, float]] = None) -> List[Optional[Tuple[float, float]]]:
+        """
+        Coordinate degli indirizzi; None se mancanti o sospette (geocoding
+        errato o appartamento in altra città: oltre RAGGIO_MAX_KM dal centro,
+        default la mediana delle coordinate)
+        """
+        coordinate = [self._coordinate(addr) for addr in addresses]
+        note = [c for c in coordinate if c is not None]
+        if not note:
+            return coordinate
+        centro = centro or tuple(np.median(np.array(note), axis=0))
+        distanze = matrice_haversine([centro[0]], [centro[1]], [c[0] for c in note], [c[1] for c in note])[0]
+        lontane = {c for c, km in zip(note, distanze) if km > RAGGIO_MAX_KM}
+        if lontane:
+            print(f"[WARN] {sum(c in lontane for c in coordinate)} indirizzi oltre {RAGGIO_MAX_KM} km esclusi dal calcolo")
+            coordinate = [None if c in lontane else c for c in coordinate]
+        return coordinate
+    
+    def _stima_km(self, addresses: List[str]) -> np.ndarray:
+        """
+        Km stradali stimati tra gli indirizzi (linea d'aria x FATTORE_STRADALE).
+        Il primo indirizzo fa da centro per scartare le coordinate sospette;
+        NaN dove mancano le coordinate.
+        """
+        centro = self._coordinate(addresses[0]) if addresses else None
+        coordinate = self._coordinate_valide(addresses, centro)
+        km = np.full((len(addresses), len(addresses)), np.nan)
+        note = [i for i, c in enumerate(coordinate) if c is not None]
+        if note:
+            km[np.ix_(note, note)] = self.matrice.sotto_matrice([coordinate[i] for i in note]) * FATTORE_STRADALE
+        return km
+    
+    def get_distance_matrix(self, origins: List[str], destinations: List[str]) -> Dict:
+        """
+        Tempi e distanze stradali origini x destinazioni (Distance Matrix API)
+        Limiti per chiamata: 25 origini, 25 destinazioni, 100 elementi
+        
+        Returns:
+            {'results': [un elemento per coppia, riga per riga: dict con
+             distance_meters e duration_seconds, None se non trovato]}
+            oppure {} in caso di errore
+        """
+        if not self.api_key:
+            return {}
+        
+        try:
+            data = client_http.get_json_sync(DISTANCE_MATRIX_URL, params={
+                'origins': '|'.join(origins),
+                'destinations': '|'.join(destinations),
+                'mode': 'driving',
+                'language': 'it',
+                'key': self.api_key
+            }, timeout=10)
+        except Exception as e:
+            print(f"[ERROR] Errore Distance Matrix: {e}")
+            return {}
+        
+        if data.get('status') != 'OK':
+            print(f"[ERROR] Distance Matrix fallito: {data.get('status')}")
+            return {}
+        
+        results = []
+        for row in data['rows']:
+            for element in row['elements']:
+                if element.get('status') == 'OK':
+                    results.append({
+                        'distance_meters': element['distance']['value'],
+                        'duration_seconds': element['duration']['value']
+                    })
+                else:
+                    results.append(None)
+        return {'results': results}
+    
+    def _percorrenza(self, addresses: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (km, minuti, da_api): matrice persistente dei tempi (riempita con
+        Distance Matrix per le sole coppie mancanti), stima dalle coordinate
+        per le coppie che restano senza dato; NaN se mancano entrambi.
+        """
+        km = self._stima_km(addresses)
+        minuti = km / VELOCITA_MEDIA_KMH * 60
+        da_api = np.zeros(km.shape, dtype=bool)
+        
+        if self.api_key and len(addresses) > 1:
+            completi = [self._indirizzo_completo(addr) for addr in addresses]
+            self.tempi.riempi(completi, self.get_distance_matrix)
+            secondi, metri = self.tempi.matrice(completi)
+            da_api = ~np.isnan(secondi)
+            km[da_api] = metri[da_api] / 1000
+            minuti[da_api] = secondi[da_api] / 60
+        
+        np.fill_diagonal(km, 0.0)
+        np.fill_diagonal(minuti, 0.0)
+        return km, minuti, da_api
+    
+    def matrice_percorrenza(self, addresses: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(km, minuti) tra gli indirizzi, NaN dove non noti né stimabili"""
+        km, minuti, _ = self._percorrenza(addresses)
+        return km, minuti
+    
+    @staticmethod
+    def _nodi_completi(minuti: np.ndarray) -> List[int]:
+        """Nodi con tempi noti verso tutti gli altri (scarta prima i più incompleti)"""
+        nodi = list(range(len(minuti)))
+        while nodi:
+            mancanti = np.isnan(minuti[np.ix_(nodi, nodi)])
+            per_nodo = mancanti.sum(axis=0) + mancanti.sum(axis=1)
+            if not per_nodo.any():
+                break
+            nodi.pop(int(np.argmax(per_nodo)))
+        return nodi
+    
+    def _route_locale(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Optional[Dict]:
+        """
+        Percorso con il risolutore TSP locale sui tempi di percorrenza.
+        Le tappe senza tempi (né dalla matrice né dalle coordinate, o con
+        coordinate oltre RAGGIO_MAX_KM) vengono messe in fondo, nell'ordine
+        originale.
+        
+        Returns:
+            Stesso formato di optimize_route, o None se non applicabile
+        """
+        start_location = start_location or MAGAZZINO_CENTRALE
+        end_location = end_location or start_location
+        if start_location != end_location:
+            # Il risolutore locale calcola solo giri chiusi
+            return None
+        
+        # Nodo 0 = magazzino, nodo i+1 = addresses[i]
+        km, minuti, da_api = self._percorrenza([start_location] + addresses)
+        nodi = self._nodi_completi(minuti)
+        
+        in_giro = set(nodi)
+        con_tempi = [n - 1 for n in nodi if n > 0]
+        senza_tempi = [i for i in range(len(addresses)) if i + 1 not in in_giro]
+        if len(con_tempi) < 2:
+            return None
+        
+        chiuso = 0 in nodi
+        if not chiuso:
+            print(f"[WARN] Posizione magazzino non disponibile - giro calcolato solo tra le tappe")
+        
+        sotto = np.ix_(nodi, nodi)
+        m, k = minuti[sotto], km[sotto]
+        # 2-opt su tempi simmetrizzati, poi il verso di percorrenza più breve
+        giro = risolvi_tsp((m + m.T) / 2, self.budget_ms)
+        inverso = giro[:1] + giro[1:][::-1]
+        if lunghezza_percorso(m, inverso, chiuso) < lunghezza_percorso(m, giro, chiuso):
+            giro = inverso
+        
+        optimized_indices = [nodi[n] - 1 for n in giro if nodi[n] > 0] + senza_tempi
+        optimized_addresses = [addresses[i] for i in optimized_indices]
+        
+        distanza_km = lunghezza_percorso(k, giro, chiuso)
+        durata_minuti = lunghezza_percorso(m, giro, chiuso)
+        tempi_api = bool(da_api[sotto].all())
+        
+        route_url = self._url_giro(optimized_addresses, start_location, end_location)
+        
+        print(f"[ROUTE] Ottimizzazione locale completata ({len(con_tempi)} tappe, "
+              f"tempi {'Distance Matrix' if tempi_api else 'stimati'}):")
+        print(f"  - Distanza: {distanza_km:.2f} km")
+        print(f"  - Durata: {durata_minuti:.0f} minuti")
+        print(f"  - Ordine ottimizzato: {optimized_indices}")
+        if senza_tempi:
+            print(f"[WARN] {len(senza_tempi)} indirizzi senza tempi di percorrenza messi in fondo al giro")
+        
+        return {
+            'success': True,
+            'optimized_order': optimized_indices,
+            'route_url': route_url,
+            'total_distance_km': round(distanza_km, 2),
+            'total_duration_minutes': round(durata_minuti),
+            'waypoints': optimized_addresses,
+            'original_addresses': addresses,
+            'solver': 'locale',
+            'tempi': 'distance_matrix' if tempi_api else 'stima'
+        }
+    
+    # ==================== PIANI IN CACHE ====================
+    
+    def _memorizza_piano(self, addresses: List[str], start_location: str, end_location: str, risultato: Dict):
+        """Salva un giro chiuso ottimizzato (locale, Google o riparato)"""
+        if start_location != end_location or not risultato.get('success') or not risultato.get('solver'):
+            return
+        if risultato.get('piano') == 'cache':
+            return
+        giro = [chiave_indirizzo(addresses[i]) for i in risultato['optimized_order']]
+        self.piani.set(giro, chiave_indirizzo(start_location), {
+            'total_distance_km': risultato['total_distance_km'],
+            'total_duration_minutes': risultato['total_duration_minutes'],
+            'solver': risultato['solver'],
+        })
+    
+    @staticmethod
+    def _ordine_da_piano(giro: List[str], chiavi: List[str]) -> Tuple[List[int], List[int]]:
+        """
+        (indici degli indirizzi nell'ordine del giro in cache, indici degli
+        indirizzi assenti dal giro). Le tappe del giro non più presenti
+        vengono saltate.
+        """
+        posizioni = {}
+        for i, chiave in enumerate(chiavi):
+            posizioni.setdefault(chiave, []).append(i)
+        ordine = []
+        for chiave in giro:
+            if posizioni.get(chiave):
+                ordine.append(posizioni[chiave].pop(0))
+        nuovi = sorted(i for restanti in posizioni.values() for i in restanti)
+        return ordine, nuovi
+    
+    def _risultato_piano(self, addresses: List[str], ordine: List[int], distanza_km: float,
+                         durata_minuti: float, solver: str, piano: str, deposito: str) -> Dict:
+        optimized_addresses = [addresses[i] for i in ordine]
+        return {
+            'success': True,
+            'optimized_order': ordine,
+            'route_url': self._url_giro(optimized_addresses, deposito, deposito),
+            'total_distance_km': round(distanza_km, 2),
+            'total_duration_minutes': round(durata_minuti),
+            'waypoints': optimized_addresses,
+            'original_addresses': addresses,
+            'solver': solver,
+            'piano': piano
+        }
+    
+    def _piano_in_cache(self, addresses: List[str], start_location: str) -> Optional[Dict]:
+        """
+        Giro in cache per questi indirizzi; altrimenti un giro in cache con
+        pochi indirizzi diversi, riparato togliendo le tappe sparite e
+        inserendo le nuove nel punto più economico. None = da calcolare.
+        """
+        chiavi = [chiave_indirizzo(addr) for addr in addresses]
+        deposito = chiave_indirizzo(start_location)
+        
+        piano = self.piani.get(chiavi, deposito)
+        if piano is not None:
+            ordine, _ = self._ordine_da_piano(piano['giro'], chiavi)
+            print(f"[ROUTE] Percorso dalla cache ({len(ordine)} tappe, stessi indirizzi)")
+            return self._risultato_piano(addresses, ordine, piano['total_distance_km'],
+                                         piano['total_duration_minutes'], piano['solver'], 'cache', start_location)
+        
+        piano = self.piani.simile(chiavi, deposito)
+        if piano is None:
+            return None
+        
+        ordine, nuovi = self._ordine_da_piano(piano['giro'], chiavi)
+        tolti = len(piano['giro']) - len(ordine)
+        
+        # Nodo 0 = deposito, nodo i+1 = addresses[i]
+        km, minuti, _ = self._percorrenza([start_location] + addresses)
+        nodi = set(self._nodi_completi(minuti))
+        if any(i + 1 not in nodi for i in range(len(addresses))):
+            return None
+        chiuso = 0 in nodi
+        
+        percorso = ([0] if chiuso else []) + [i + 1 for i in ordine]
+        percorso = inserimento_economico(minuti, percorso, [i + 1 for i in nuovi])
+        ordine = [n - 1 for n in percorso if n > 0]
+        
+        print(f"[ROUTE] Percorso dalla cache riparato: {len(nuovi)} tappe inserite, {tolti} tolte")
+        risultato = self._risultato_piano(addresses, ordine, lunghezza_percorso(km, percorso, chiuso),
+                                          lunghezza_percorso(minuti, percorso, chiuso), piano['solver'], 'riparato',
+                                          start_location)
+        self._memorizza_piano(addresses, start_location, start_location, risultato)
+        return risultato
+    
+    def _fallback(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
+        """Se Google non risponde: risolutore locale, altrimenti ordine originale"""
+        risultato = None
+        if self.solver != 'locale':
+            risultato = self._route_locale(addresses, start_location, end_location)
+        return risultato or self._fallback_order(addresses, start_location, end_location)
+    
+    def _fallback_order(self, addresses: List[str], start_location: str = None, end_location: str = None) -> Dict:
         """Fallback: ordine originale se API fallisce"""
         print("[WARN] Usando ordine originale (API non disponibile)")
         
-        route_url = self._generate_maps_url(addresses)
+        route_url = self._url_giro(addresses, start_location, end_location)
         
         return {
             'success': False,
@@ -220,6 +672,14 @@ class RouteOptimizer:
             'error': 'API non disponibile - ordine non ottimizzato'
         }
     
+    def _url_giro(self, addresses: List[str], start_location: str = None, end_location: str = None) -> str:
+        """URL Google Maps del giro: partenza dal deposito, tappe, ritorno al deposito"""
+        if not addresses:
+            return ''
+        if not start_location:
+            return self._generate_maps_url(addresses)
+        return self._generate_maps_url([start_location] + addresses + [end_location or start_location])
+    
     def _generate_maps_url(self, addresses: List[str], include_return: bool = False) -> str:
         """
         Genera URL Google Maps navigabile
@@ -257,6 +717,37 @@ class RouteOptimizer:
         
         return url
     
+    @staticmethod
+    def _indirizzo_task(task: Dict) -> str:
+        """Indirizzo del task (campo 'indirizzo' o 'address'), '' se da definire"""
+        if task.get('appartamento_generico'):
+            return ''
+        addr = (task.get('indirizzo') or task.get('address') or '').strip()
+        return '' if addr.lower() == 'da definire' else addr
+    
+    def _indirizzi_tasks(self, tasks: List[Dict]) -> Tuple[List[int], List[str]]:
+        """(posizioni dei task con indirizzo, indirizzi)"""
+        posizioni = []
+        addresses = []
+        for i, task in enumerate(tasks):
+            addr = self._indirizzo_task(task)
+            if addr:
+                posizioni.append(i)
+                addresses.append(addr)
+        return posizioni, addresses
+    
+    def _riordina_tasks(self, tasks: List[Dict], route_info: Dict, posizioni: List[int]) -> Tuple[List[Dict], Dict]:
+        if not route_info['success']:
+            return tasks, route_info
+        
+        # optimized_order si riferisce agli indirizzi: i task senza indirizzo vanno in fondo
+        optimized_order = route_info['optimized_order']
+        tasks_sorted = [tasks[posizioni[i]] for i in optimized_order if i < len(posizioni)]
+        in_percorso = {posizioni[i] for i in optimized_order if i < len(posizioni)}
+        tasks_sorted += [task for i, task in enumerate(tasks) if i not in in_percorso]
+        
+        return tasks_sorted, route_info
+    
     def optimize_tasks_route(self, tasks: List[Dict]) -> Tuple[List[Dict], Dict]:
         """
         Ottimizza ordine task basandosi su indirizzi
@@ -267,12 +758,7 @@ class RouteOptimizer:
         Returns:
             (tasks_ordinati, route_info)
         """
-        # Estrai indirizzi
-        addresses = []
-        for task in tasks:
-            addr = task.get('indirizzo') or task.get('address', '')
-            if addr and addr.strip():
-                addresses.append(addr.strip())
+        posizioni, addresses = self._indirizzi_tasks(tasks)
         
         if not addresses:
             print("[WARN] Nessun indirizzo valido nei task")
@@ -280,15 +766,273 @@ class RouteOptimizer:
         
         # Ottimizza route
         route_info = self.optimize_route(addresses)
+        return self._riordina_tasks(tasks, route_info, posizioni)
+    
+    async def optimize_tasks_route_async(self, tasks: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """Come optimize_tasks_route, senza bloccare l'event loop del bot"""
+        posizioni, addresses = self._indirizzi_tasks(tasks)
         
-        if not route_info['success']:
-            return tasks, route_info
+        if not addresses:
+            print("[WARN] Nessun indirizzo valido nei task")
+            return tasks, {'success': False, 'error': 'Nessun indirizzo'}
         
-        # Riordina tasks secondo ordine ottimizzato
-        optimized_order = route_info['optimized_order']
-        tasks_sorted = [tasks[i] for i in optimized_order if i < len(tasks)]
+        route_info = await self.optimize_route_async(addresses)
+        return self._riordina_tasks(tasks, route_info, posizioni)
+    
+    # ==================== GIRI PER OPERATORE ====================
+    
+    def _depositi_config(self) -> Dict:
+        if self._depositi is None:
+            self._depositi = carica_depositi(self.config_dir)
+        return self._depositi
+    
+    def _assegna_non_assegnati(self, per_operatore: Dict[str, List[Dict]], depositi: Dict[str, str]):
+        """
+        Assegna i task 'Non assegnato' all'operatore con la tappa (o il
+        deposito) più vicina, tenendo conto della capacità dei viaggi.
+        I task senza coordinate restano non assegnati.
+        """
+        liberi = per_operatore.pop(OPERATORE_NON_ASSEGNATO)
+        operatori = list(per_operatore)
         
-        return tasks_sorted, route_info
+        # Una sola matrice: depositi, tappe degli operatori, task liberi
+        indirizzi = [depositi[op] for op in operatori]
+        nodi = {op: [i] for i, op in enumerate(operatori)}
+        carico = {}
+        for op in operatori:
+            carico[op] = sum(set_lenzuola(t) for t in per_operatore[op])
+            for task in per_operatore[op]:
+                addr = self._indirizzo_task(task)
+                if addr:
+                    nodi[op].append(len(indirizzi))
+                    indirizzi.append(addr)
+        primo_libero = len(indirizzi)
+        indirizzi += [self._indirizzo_task(t) or MAGAZZINO_CENTRALE for t in liberi]
+        km, _ = self.matrice_percorrenza(indirizzi)
+        
+        rimasti = []
+        for k, task in enumerate(liberi):
+            nodo = primo_libero + k
+            if not self._indirizzo_task(task):
+                rimasti.append(task)
+                continue
+            
+            migliore, costo_migliore = None, math.inf
+            for op in operatori:
+                distanze = [d for d in km[nodo, nodi[op]] if not math.isnan(d)]
+                if not distanze:
+                    continue
+                km_deposito = km[nodo, nodi[op][0]]
+                if math.isnan(km_deposito):
+                    km_deposito = min(distanze)
+                costo = costo_assegnazione(min(distanze), km_deposito, carico[op],
+                                           set_lenzuola(task), self.capacita_set)
+                if costo < costo_migliore:
+                    migliore, costo_migliore = op, costo
+            
+            if migliore is None:
+                rimasti.append(task)
+                continue
+            
+            task['operatore'] = migliore
+            task['operatore_proposto'] = True
+            per_operatore[migliore].append(task)
+            nodi[migliore].append(nodo)
+            carico[migliore] += set_lenzuola(task)
+            print(f"[ROUTE] {task.get('nome_proprieta', 'N/A')} assegnato a {migliore} (+{costo_migliore:.1f} km)")
+        
+        if rimasti:
+            per_operatore[OPERATORE_NON_ASSEGNATO] = rimasti
+    
+    def _gruppi_operatori(self, tasks: List[Dict]) -> List[Dict]:
+        """Task divisi per operatore, con deposito e indirizzi da visitare"""
+        depositi_config = self._depositi_config()
+        
+        per_operatore = {}
+        for task in tasks:
+            per_operatore.setdefault(nome_operatore(task), []).append(task)
+        
+        depositi = {op: deposito_operatore(op, tasks_op, depositi_config, MAGAZZINO_CENTRALE)
+                    for op, tasks_op in per_operatore.items()}
+        
+        if OPERATORE_NON_ASSEGNATO in per_operatore and len(per_operatore) > 1:
+            self._assegna_non_assegnati(per_operatore, depositi)
+        
+        gruppi = []
+        for op in ordina_operatori(per_operatore):
+            posizioni, indirizzi = self._indirizzi_tasks(per_operatore[op])
+            con_indirizzo = set(posizioni)
+            gruppi.append({
+                'operatore': op,
+                'deposito': depositi[op],
+                'tasks': [per_operatore[op][i] for i in posizioni],
+                'indirizzi': indirizzi,
+                'senza_indirizzo': [t for i, t in enumerate(per_operatore[op]) if i not in con_indirizzo],
+            })
+        return gruppi
+    
+    def _completa_giro(self, gruppo: Dict, route: Optional[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Dal percorso ottimizzato di un operatore: viaggi per capacità, orari
+        stimati e, se un check-in vincolato arriva tardi, check-in anticipati.
+        
+        Returns:
+            (task dell'operatore in ordine di giro, info giro)
+        """
+        deposito = gruppo['deposito']
+        successo = bool(route and route.get('success'))
+        ordine = [i for i in route['optimized_order'] if i < len(gruppo['tasks'])] if successo else []
+        in_ordine = set(ordine)
+        ordine += [i for i in range(len(gruppo['tasks'])) if i not in in_ordine]
+        tappe = [gruppo['tasks'][i] for i in ordine]
+        indirizzi = [gruppo['indirizzi'][i] for i in ordine]
+        
+        # Nodo 0 = deposito, nodo p+1 = tappa p
+        km, minuti = self.matrice_percorrenza([deposito] + indirizzi)
+        carichi = [set_lenzuola(t) for t in tappe]
+        scadenze = [scadenza_task(t) for t in tappe]
+        
+        def valuta(sequenza: List[int]):
+            viaggi = dividi_viaggi([carichi[p] for p in sequenza], self.capacita_set)
+            tratte = []
+            km_totali = minuti_totali = 0.0
+            nodo = 0
+            for viaggio in viaggi:
+                for k, pos in enumerate(viaggio):
+                    prossimo = sequenza[pos] + 1
+                    if k == 0 and nodo != 0:
+                        # Ritorno al deposito per caricare il viaggio successivo
+                        gambe = [(nodo, 0), (0, prossimo)]
+                    else:
+                        gambe = [(nodo, prossimo)]
+                    km_totali += sum(km[a][b] for a, b in gambe)
+                    minuti_tratta = sum(minuti[a][b] for a, b in gambe)
+                    minuti_totali += minuti_tratta
+                    tratte.append(MINUTI_TRATTA_DEFAULT if math.isnan(minuti_tratta) else minuti_tratta)
+                    nodo = prossimo
+            if tappe:
+                km_totali += km[nodo][0]
+                minuti_totali += minuti[nodo][0]
+            arrivi, ritardi = simula_orari(tratte, [scadenze[p] for p in sequenza])
+            return viaggi, km_totali, minuti_totali, arrivi, ritardi
+        
+        sequenza = list(range(len(tappe)))
+        viaggi, km_totali, minuti_totali, arrivi, ritardi = valuta(sequenza)
+        anticipati = False
+        if ritardi:
+            alternativa = anticipa_vincolati(scadenze)
+            valutazione = valuta(alternativa)
+            if len(valutazione[4]) < len(ritardi):
+                sequenza = alternativa
+                viaggi, km_totali, minuti_totali, arrivi, ritardi = valutazione
+                anticipati = True
+                print(f"[ROUTE] {gruppo['operatore']}: check-in con orario anticipati in testa al giro")
+        
+        tappe = [tappe[p] for p in sequenza]
+        indirizzi = [indirizzi[p] for p in sequenza]
+        for pos, (task, arrivo) in enumerate(zip(tappe, arrivi)):
+            task['ora_arrivo_stimata'] = orario_da_minuti(arrivo)
+            task['in_ritardo'] = pos in ritardi
+            task['viaggio'] = next(n for n, v in enumerate(viaggi, 1) if pos in v)
+        
+        # Percorso del risolutore invariato: distanze e URL del risolutore
+        if successo and not anticipati and len(viaggi) == 1:
+            distanza_km = route['total_distance_km']
+            durata_minuti = route['total_duration_minutes']
+            route_url = route['route_url']
+        else:
+            if not math.isnan(km_totali) and not math.isnan(minuti_totali):
+                distanza_km = round(km_totali, 2)
+                durata_minuti = round(minuti_totali)
+            else:
+                distanza_km = route.get('total_distance_km', 0) if route else 0
+                durata_minuti = route.get('total_duration_minutes', 0) if route else 0
+            # Fra un viaggio e l'altro si passa dal deposito
+            tappe_url = []
+            for n, viaggio in enumerate(viaggi):
+                if n > 0:
+                    tappe_url.append(deposito)
+                tappe_url += [indirizzi[pos] for pos in viaggio]
+            route_url = self._url_giro(tappe_url, deposito, deposito)
+        
+        giro = {
+            'operatore': gruppo['operatore'],
+            'deposito': deposito,
+            'success': successo,
+            'solver': route.get('solver') if route else None,
+            'tappe': len(tappe),
+            'senza_indirizzo': len(gruppo['senza_indirizzo']),
+            'set_lenzuola': sum(carichi),
+            'viaggi': len(viaggi),
+            'route_url': route_url,
+            'total_distance_km': distanza_km,
+            'total_duration_minutes': durata_minuti,
+            'ritardi': [tappe[pos].get('nome_proprieta', 'N/A') for pos in ritardi],
+        }
+        
+        print(f"[ROUTE] {gruppo['operatore']}: {len(tappe)} tappe, {len(viaggi)} viaggi, "
+              f"{distanza_km:.1f} km, {durata_minuti} min")
+        if ritardi:
+            print(f"[WARN] {gruppo['operatore']}: orario non rispettabile per {', '.join(giro['ritardi'])}")
+        
+        return tappe + gruppo['senza_indirizzo'], giro
+    
+    def _componi_giri(self, tasks: List[Dict], gruppi: List[Dict], percorsi: List[Optional[Dict]]) -> Tuple[List[Dict], Dict]:
+        tasks_ordinati = []
+        giri = []
+        for gruppo, route in zip(gruppi, percorsi):
+            tasks_giro, giro = self._completa_giro(gruppo, route)
+            tasks_ordinati += tasks_giro
+            giri.append(giro)
+        
+        # Indici nella lista originale, come optimized_order del giro unico
+        posizione = {id(task): i for i, task in enumerate(tasks)}
+        
+        route_info = {
+            'success': any(giro['success'] for giro in giri),
+            'modalita': 'operatori',
+            'optimized_order': [posizione[id(task)] for task in tasks_ordinati],
+            'route_url': giri[0]['route_url'] if len(giri) == 1 else '',
+            'total_distance_km': round(sum(giro['total_distance_km'] for giro in giri), 2),
+            'total_duration_minutes': sum(giro['total_duration_minutes'] for giro in giri),
+            'giri': giri,
+        }
+        return tasks_ordinati, route_info
+    
+    def optimize_tasks_per_operatore(self, tasks: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        Un giro ottimizzato per operatore (deposito, capacità, orari check-in)
+        
+        Args:
+            tasks: Lista task con 'indirizzo' e 'operatore'
+        
+        Returns:
+            (tasks_ordinati per operatore e ordine di giro, route_info con
+             totali e 'giri': un dict per operatore con route_url e distanze)
+        """
+        if not tasks:
+            return tasks, {'success': False, 'error': 'Nessun task'}
+        
+        gruppi = self._gruppi_operatori(tasks)
+        percorsi = [self.optimize_route(g['indirizzi'], start_location=g['deposito']) if g['indirizzi'] else None
+                    for g in gruppi]
+        return self._componi_giri(tasks, gruppi, percorsi)
+    
+    async def optimize_tasks_per_operatore_async(self, tasks: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """Come optimize_tasks_per_operatore; i giri degli operatori sono calcolati in parallelo"""
+        if not tasks:
+            return tasks, {'success': False, 'error': 'Nessun task'}
+        
+        # Coordinate ed eventuale geocoding dei depositi in un thread
+        gruppi = await asyncio.to_thread(self._gruppi_operatori, tasks)
+        
+        async def percorso(gruppo):
+            if not gruppo['indirizzi']:
+                return None
+            return await self.optimize_route_async(gruppo['indirizzi'], start_location=gruppo['deposito'])
+        
+        percorsi = await asyncio.gather(*(percorso(g) for g in gruppi))
+        return await asyncio.to_thread(self._componi_giri, tasks, gruppi, list(percorsi))
     
     def save_route_to_file(self, route_info: Dict, output_path: str = None) -> str:
         """
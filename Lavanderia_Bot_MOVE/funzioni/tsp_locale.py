@@ -0,0 +1,193 @@
+"""
+Risolutore TSP locale per il giro giornaliero (senza Directions API)
+
+Percorso chiuso che parte e torna al nodo 0 (magazzino):
+1. costruzione con nearest neighbour
+2. miglioramento con 2-opt e Or-opt (spostamento segmenti di 1-3 tappe)
+   finché migliora o finché non scade il budget di tempo
+
+Le distanze vengono da MatriceDistanze: matrice haversine (km) di tutti i
+punti già visti, estesa solo con i punti nuovi. Per decine di tappe il
+calcolo richiede pochi millisecondi e non ha limiti sul numero di tappe.
+"""
+
+import math
+import time
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+RAGGIO_TERRA_KM = 6371.0088
+
+# Stima distanza/durata stradali da distanza in linea d'aria
+FATTORE_STRADALE = 1.3
+VELOCITA_MEDIA_KMH = 25
+
+
+def matrice_haversine(lats: np.ndarray, lons: np.ndarray, lats2: np.ndarray = None, lons2: np.ndarray = None) -> np.ndarray:
+    """Distanze in km tra (lats, lons) e (lats2, lons2) (default: stessi punti)"""
+    if lats2 is None:
+        lats2, lons2 = lats, lons
+    lat1 = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lons2, dtype=np.float64))[None, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAGGIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class MatriceDistanze:
+    """Matrice distanze (km) tra coordinate, estesa incrementalmente"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indice: Dict[Tuple[float, float], int] = {}
+        self._lats = np.zeros(0)
+        self._lons = np.zeros(0)
+        self._d = np.zeros((0, 0))
+
+    def _aggiungi(self, nuovi: List[Tuple[float, float]]):
+        lats_nuovi = np.array([p[0] for p in nuovi], dtype=np.float64)
+        lons_nuovi = np.array([p[1] for p in nuovi], dtype=np.float64)
+        lats = np.concatenate([self._lats, lats_nuovi])
+        lons = np.concatenate([self._lons, lons_nuovi])
+
+        n_vecchi = len(self._lats)
+        d = np.empty((len(lats), len(lats)))
+        d[:n_vecchi, :n_vecchi] = self._d
+        # Solo le righe/colonne dei punti nuovi
+        nuove_righe = matrice_haversine(lats_nuovi, lons_nuovi, lats, lons)
+        d[n_vecchi:, :] = nuove_righe
+        d[:, n_vecchi:] = nuove_righe.T
+
+        for i, p in enumerate(nuovi):
+            self._indice[p] = n_vecchi + i
+        self._lats, self._lons, self._d = lats, lons, d
+
+    def sotto_matrice(self, punti: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """Distanze tra i punti indicati, nell'ordine dato"""
+        punti = [(float(lat), float(lon)) for lat, lon in punti]
+        with self._lock:
+            nuovi = list(dict.fromkeys(p for p in punti if p not in self._indice))
+            if nuovi:
+                self._aggiungi(nuovi)
+            idx = np.array([self._indice[p] for p in punti], dtype=np.intp)
+            return self._d[np.ix_(idx, idx)]
+
+
+def lunghezza_percorso(d, percorso: Sequence[int], chiuso: bool = True) -> float:
+    """Lunghezza del percorso (con ritorno al primo nodo se chiuso)"""
+    totale = sum(d[percorso[i]][percorso[i + 1]] for i in range(len(percorso) - 1))
+    if chiuso and len(percorso) > 1:
+        totale += d[percorso[-1]][percorso[0]]
+    return float(totale)
+
+
+def vicino_piu_vicino(d, partenza: int = 0) -> List[int]:
+    n = len(d)
+    da_visitare = set(range(n)) - {partenza}
+    percorso = [partenza]
+    while da_visitare:
+        riga = d[percorso[-1]]
+        prossimo = min(da_visitare, key=riga.__getitem__)
+        da_visitare.remove(prossimo)
+        percorso.append(prossimo)
+    return percorso
+
+
+def due_opt(d, percorso: List[int], scadenza: float) -> bool:
+    """Inverte tratti del percorso finché accorcia il giro (nodo 0 fisso)"""
+    n = len(percorso)
+    migliorato_almeno_una_volta = False
+    migliorato = True
+    while migliorato and time.perf_counter() < scadenza:
+        migliorato = False
+        for i in range(1, n - 1):
+            if time.perf_counter() >= scadenza:
+                break
+            for j in range(i + 1, n):
+                a, b = percorso[i - 1], percorso[i]
+                c, e = percorso[j], percorso[(j + 1) % n]
+                delta = d[a][c] + d[b][e] - d[a][b] - d[c][e]
+                if delta < -1e-9:
+                    percorso[i:j + 1] = percorso[i:j + 1][::-1]
+                    migliorato = migliorato_almeno_una_volta = True
+    return migliorato_almeno_una_volta
+
+
+def or_opt(d, percorso: List[int], scadenza: float) -> bool:
+    """Sposta segmenti di 1-3 tappe nella posizione migliore (nodo 0 fisso)"""
+    n = len(percorso)
+    migliorato_almeno_una_volta = False
+    migliorato = True
+    while migliorato and time.perf_counter() < scadenza:
+        migliorato = False
+        for lunghezza in (1, 2, 3):
+            for i in range(1, n - lunghezza + 1):
+                fine = i + lunghezza - 1
+                prima, s0, s1, dopo = percorso[i - 1], percorso[i], percorso[fine], percorso[(fine + 1) % n]
+                guadagno = d[prima][s0] + d[s1][dopo] - d[prima][dopo]
+
+                resto = percorso[:i] + percorso[fine + 1:]
+                segmento = percorso[i:fine + 1]
+                migliore, posizione = guadagno - 1e-9, None
+                for k in range(len(resto)):
+                    if k == i - 1:
+                        continue
+                    u, v = resto[k], resto[(k + 1) % len(resto)]
+                    costo = d[u][s0] + d[s1][v] - d[u][v]
+                    if costo < migliore:
+                        migliore, posizione = costo, k
+
+                if posizione is not None:
+                    percorso[:] = resto[:posizione + 1] + segmento + resto[posizione + 1:]
+                    migliorato = migliorato_almeno_una_volta = True
+                    break
+            if migliorato:
+                break
+    return migliorato_almeno_una_volta
+
+
+def inserimento_economico(d, percorso: List[int], nodi: Sequence[int]) -> List[int]:
+    """
+    Inserisce i nodi nel giro chiuso, ognuno nel punto che lo allunga meno.
+    Con distanze mancanti (NaN) il nodo va in fondo.
+    """
+    percorso = list(percorso)
+    for nodo in nodi:
+        migliore, posizione = math.inf, len(percorso)
+        for k in range(len(percorso)):
+            u, v = percorso[k], percorso[(k + 1) % len(percorso)]
+            costo = d[u][nodo] + d[nodo][v] - d[u][v]
+            if costo < migliore:  # False con NaN
+                migliore, posizione = costo, k + 1
+        percorso.insert(posizione, nodo)
+    return percorso
+
+
+def risolvi_tsp(d: np.ndarray, budget_ms: float = 100) -> List[int]:
+    """
+    Giro chiuso che parte dal nodo 0 e visita tutti i nodi.
+
+    Args:
+        d: Matrice distanze n x n (simmetrica per il 2-opt)
+        budget_ms: Tempo massimo per i miglioramenti locali
+
+    Returns:
+        Permutazione dei nodi che inizia con 0
+    """
+    n = len(d)
+    if n <= 3:
+        return list(range(n))
+
+    scadenza = time.perf_counter() + budget_ms / 1000
+    righe = d.tolist()  # accesso per indice più veloce degli array numpy nei cicli
+
+    percorso = vicino_piu_vicino(righe, 0)
+    migliorato = True
+    while migliorato and time.perf_counter() < scadenza:
+        migliorato = due_opt(righe, percorso, scadenza)
+        migliorato = or_opt(righe, percorso, scadenza) or migliorato
+    return percorso
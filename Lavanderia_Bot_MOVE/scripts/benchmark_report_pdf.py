@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Benchmark della generazione del report PDF (ReportPDF.generate_pdf_report).
+
+Genera un report sintetico (default 200 task divisi tra 6 operatori, con
+giri, orari e materiali) e misura tempo e picco di memoria (tracemalloc) di:
+- rendering completo, con cache sezioni vuota
+- rendering con cache sezioni piena (PDF corretto senza modifiche)
+
+Uso:
+    python scripts/benchmark_report_pdf.py [--tasks 200] [--operatori 6] [--ripetizioni 3]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+# Moduli del bot (import flat come in bot.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'funzioni'))
+
+from report_pdf import ReportPDF
+
+MATERIALI = {
+    'carta_igienica': 2,
+    'bustine_monouso_(bagnoschiuma/intimo/shampoo)': 4,
+    'tappetini_bagno': 1,
+    'asciugamani_grandi': 2,
+    'asciugamani_piccoli': 2,
+    'set_lenzuola_matrimoniali': 1,
+    'set_lenzuola_singole': 1,
+    'cialde_caffè': 4,
+    'sacchetti_spazzatura': 2,
+}
+
+
+def report_sintetico(num_tasks: int, num_operatori: int, seed: int = 1) -> dict:
+    """Report con la stessa struttura di MasterProcessor.elabora_pdf + giri per operatore"""
+    rnd = random.Random(seed)
+    operatori = [f"OPERATORE {i + 1}" for i in range(num_operatori)]
+
+    tasks = []
+    for i in range(num_tasks):
+        persone = rnd.randint(1, 6)
+        materiali = {k: v * persone if 'lenzuola' not in k else v for k, v in MATERIALI.items()}
+        materiali['tipo_macchina_caffe'] = rnd.choice(['Nespresso', 'Lavazza A Modo Mio', 'Non specificata'])
+        tasks.append({
+            'nome_proprieta': f"Appartamento {i + 1:03d}",
+            'nome_ota': f"OTA {i + 1}",
+            'indirizzo': f"Via Emilia Centro {rnd.randint(1, 300)}, 41121 Modena (MO)",
+            'tipo_evento': rnd.choice(['Check-in', 'Check-out']),
+            'tipo_pulizia': rnd.choice(['Cambio Biancheria', 'Pulizia Ordinaria']),
+            'tipo_task': rnd.choice(['check-in', 'check-out']),
+            'num_persone': persone,
+            'note_raw': 'Lasciare le chiavi in cassetta' if rnd.random() < 0.3 else '',
+            'camere_matrimoniali': 1,
+            'camere_singole': rnd.randint(0, 2),
+            'bagni': rnd.randint(1, 2),
+            'magazzino': 'Corso Adriano',
+            'destinazione_riferimento': rnd.choice(['Abitazione/cantina', 'Corso Adriano']),
+            'ha_cantina': rnd.random() < 0.5,
+            'pulizie_interne': rnd.choice(['Vero', 'Falso']),
+            'operatore': operatori[i % num_operatori],
+            'ora_arrivo_stimata': f"{9 + i % 8:02d}:{(i * 7) % 60:02d}",
+            'orario_vincolo': '12:00' if i % 10 == 0 else None,
+            'materiali_necessari': materiali,
+        })
+
+    totali = {}
+    for task in tasks:
+        for k, v in task['materiali_necessari'].items():
+            if isinstance(v, int):
+                totali[k] = totali.get(k, 0) + v
+
+    giri = [{
+        'operatore': op, 'success': True, 'deposito': 'Corso Adriano 12, Modena', 'tappe': num_tasks // num_operatori,
+        'viaggi': 2, 'set_lenzuola': 30, 'total_distance_km': 18.5, 'total_duration_minutes': 55,
+        'route_url': 'https://www.google.com/maps/dir/?api=1&origin=Modena&destination=Modena', 'ritardi': [],
+    } for op in operatori]
+
+    return {
+        'tasks': tasks,
+        'totale_task': num_tasks,
+        'summary': {'check_in': num_tasks // 2, 'check_out': num_tasks - num_tasks // 2},
+        'materiali_totali': totali,
+        'route_info': {'success': True, 'total_distance_km': 18.5 * num_operatori,
+                       'total_duration_minutes': 55 * num_operatori, 'route_url': '', 'giri': giri},
+    }
+
+
+def tempo(funzione) -> float:
+    """Secondi per una chiamata"""
+    inizio = time.perf_counter()
+    funzione()
+    return time.perf_counter() - inizio
+
+
+def picco_memoria(funzione) -> float:
+    """Picco di memoria allocata (MB) durante una chiamata (misurato a parte: tracemalloc rallenta)"""
+    tracemalloc.start()
+    funzione()
+    _, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return picco / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generazione report PDF")
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--operatori', type=int, default=6)
+    parser.add_argument('--ripetizioni', type=int, default=3)
+    args = parser.parse_args()
+
+    report = report_sintetico(args.tasks, args.operatori)
+    cartella = tempfile.mkdtemp(prefix='benchmark_report_')
+    output_path = os.path.join(cartella, 'report.pdf')
+
+    print("=" * 60)
+    print(f"📄 BENCHMARK REPORT PDF: {args.tasks} task, {args.operatori} operatori")
+    print("=" * 60)
+
+    try:
+        cache_dir = os.path.join(cartella, 'sezioni')
+        report_pdf = ReportPDF(cartella, cache_dir=cache_dir)
+        genera = lambda: report_pdf.generate_pdf_report(report, output_path)
+
+        tempi = {'completo': [], 'da cache': []}
+        for _ in range(args.ripetizioni):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            tempi['completo'].append(tempo(genera))
+            tempi['da cache'].append(tempo(genera))
+
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        memoria = {'completo': picco_memoria(genera), 'da cache': picco_memoria(genera)}
+
+        for nome, misure in tempi.items():
+            print(f"{nome:<10} {min(misure) * 1000:8.0f} ms (migliore di {len(misure)})   "
+                  f"picco memoria {memoria[nome]:6.1f} MB")
+        print(f"Dimensione PDF: {os.path.getsize(output_path) / 1024:.0f} KB")
+    finally:
+        shutil.rmtree(cartella, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,8 +16,11 @@ from telegram.ext import (
 )
 
 import funzioni.database as db
-from funzioni.config import TELEGRAM_BOT_TOKEN, ADMIN_TELEGRAM_ID, validate_config
+import funzioni.database_async as db_async
+from funzioni.config import TELEGRAM_BOT_TOKEN, ADMIN_TELEGRAM_ID, DATABASE_BACKEND, validate_config
 from funzioni.utils import setup_logging, format_ora
+from funzioni.google_maps_helper import precarica_geocoding
+from funzioni.http_client import client_http
 
 # Import handlers
 from funzioni.user_handlers import (
@@ -173,7 +176,7 @@ async def callback_query_handler(update: Update, context):
         return
     
     elif data == "back_menu":
-        user = db.get_user(update.effective_user.id)
+        user = await db_async.get_user(update.effective_user.id)
         if user:
             from funzioni.user_handlers import show_main_menu
             await show_main_menu(update, context, user)
@@ -250,10 +253,26 @@ def main():
     # Inizializza database
     print("\n📦 Inizializzazione database...")
     db.init_database()
+    if DATABASE_BACKEND == 'sqlite':
+        # Gli Excel per l'ufficio vengono rigenerati dal database SQLite
+        db.avvia_export_periodico()
+    else:
+        # Le scritture del journal vengono riportate negli Excel in background
+        db.avvia_compattatore_journal()
+    
+    # Geocoding in background degli appartamenti senza coordinate in colonna M
+    accodati = precarica_geocoding(db.get_all_appartamenti())
+    if accodati:
+        print(f"🗺️  Geocoding in background di {accodati} indirizzi")
     
     # Crea application
     print(f"\n🔑 Connessione a Telegram...")
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    async def chiusura(application):
+        """Shutdown: chiude le connessioni verso Google Maps e attende le scritture DB in coda"""
+        client_http.chiudi()
+        db_async.chiudi()
+    
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_shutdown(chiusura).build()
     
     # ==================== HANDLERS PULSANTI ====================
     
@@ -264,7 +283,7 @@ def main():
     async def handle_finisci_appartamento(update: Update, context):
         """Gestisce pulsante 'Finisci Appartamento'"""
         user_id = update.effective_user.id
-        turno = db.get_turno_in_corso(user_id)
+        turno = await db_async.get_turno_in_corso(user_id)
         
         if not turno:
             await update.message.reply_text(
@@ -11,7 +11,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest
 
-from . import database as db
+from . import database_async as db
 from .utils import (
     format_turno_info, format_richiesta_info, format_ora, format_ore,
     format_data, format_data_italiana, get_settimana_corrente, get_mese_corrente
@@ -71,7 +71,7 @@ async def admin_turni_in_corso(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     # Usa la funzione del database
-    turni = db.get_all_turni_in_corso()
+    turni = await db.get_all_turni_in_corso()
     
     if not turni:
         text = "📋 *Turni in corso*\n\n"
@@ -127,8 +127,8 @@ async def admin_turni_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Conta turni oggi e globali per mostrare numeri
-    turni_oggi = db.get_turni_completati_oggi()
-    turni_globali = db.get_all_turni_completati(limit=100)
+    turni_oggi = await db.get_turni_completati_oggi()
+    turni_globali = await db.get_all_turni_completati(limit=100)
     
     text = "✅ *TURNI COMPLETATI*\n\n"
     text += f"📅 Turni di oggi: *{len(turni_oggi)}*\n"
@@ -168,7 +168,7 @@ async def admin_turni_oggi(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
     
-    turni = db.get_turni_completati_oggi()
+    turni = await db.get_turni_completati_oggi()
     oggi = datetime.now().strftime('%d/%m/%Y')
     
     if not turni:
@@ -229,7 +229,7 @@ async def admin_turni_globali(update: Update, context: ContextTypes.DEFAULT_TYPE
     if not is_admin(update.effective_user.id):
         return
     
-    turni = db.get_all_turni_completati(limit=50)
+    turni = await db.get_all_turni_completati(limit=50)
     
     if not turni:
         text = "📊 *Tutti i turni completati*\n\n"
@@ -284,12 +284,12 @@ async def admin_export_turni(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     if tipo == 'oggi':
-        turni = db.get_turni_completati_oggi()
+        turni = await db.get_turni_completati_oggi()
         oggi = datetime.now().strftime('%Y%m%d')
         filename = f"turni_oggi_{oggi}.xlsx"
         titolo = f"Turni {datetime.now().strftime('%d/%m/%Y')}"
     else:
-        turni = db.get_all_turni_completati(limit=500)
+        turni = await db.get_all_turni_completati(limit=500)
         filename = f"turni_globali_{datetime.now().strftime('%Y%m%d')}.xlsx"
         titolo = "Tutti i Turni"
     
@@ -298,7 +298,7 @@ async def admin_export_turni(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     # Genera Excel
-    excel_file = db.esporta_turni_excel(turni, titolo)
+    excel_file = await db.esporta_turni_excel(turni, titolo)
     
     # Invia file
     await query.message.reply_document(
@@ -331,7 +331,7 @@ async def mostra_richieste_in_sospeso(update: Update, context: ContextTypes.DEFA
         )
         return
     
-    richieste = db.get_richieste_non_completate()
+    richieste = await db.get_richieste_non_completate()
     
     if not richieste:
         text = "📋 *RICHIESTE IN SOSPESO*\n\n"
@@ -405,7 +405,7 @@ async def aggiorna_richieste_full_callback(update: Update, context: ContextTypes
     except:
         pass
     
-    richieste = db.get_richieste_non_completate()
+    richieste = await db.get_richieste_non_completate()
     
     if not richieste:
         text = "📋 *RICHIESTE IN SOSPESO*\n\n"
@@ -467,7 +467,7 @@ async def aggiorna_richieste_callback(update: Update, context: ContextTypes.DEFA
     if not is_admin(update.effective_user.id):
         return
     
-    richieste = db.get_richieste_non_completate()
+    richieste = await db.get_richieste_non_completate()
     
     keyboard = []
     
@@ -537,7 +537,7 @@ async def admin_richieste_prodotti(update: Update, context: ContextTypes.DEFAULT
     if not is_admin(update.effective_user.id):
         return
     
-    richieste = db.get_richieste_non_completate()
+    richieste = await db.get_richieste_non_completate()
     
     keyboard = []
     
@@ -593,11 +593,11 @@ async def completa_richiesta(update: Update, context: ContextTypes.DEFAULT_TYPE)
     richiesta_id = int(query.data.split('_')[1])
     
     # Ottieni info richiesta prima di completarla
-    richiesta = db.get_richiesta(richiesta_id)
+    richiesta = await db.get_richiesta(richiesta_id)
     
     if richiesta:
         # Completa nel database
-        db.complete_richiesta(richiesta_id)
+        await db.complete_richiesta(richiesta_id)
         
         await query.answer("✅ Richiesta completata!")
         
@@ -659,7 +659,7 @@ async def pulisci_richieste_completate(update: Update, context: ContextTypes.DEF
             pass
         return
     
-    deleted = db.delete_richieste_completate()
+    deleted = await db.delete_richieste_completate()
     
     try:
         await query.answer(f"🗑️ {deleted} richieste eliminate")
@@ -724,14 +724,14 @@ async def mostra_report(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return
     
     # Ottieni tutti gli utenti
-    utenti = db.get_all_users()
+    utenti = await db.get_all_users()
     
     text = f"⏰ *REPORT ORE*\n{titolo}\n\n"
     
     ore_totali_complessive = 0
     
     for user in utenti:
-        turni = db.get_turni_by_user(user['telegram_id'], data_inizio, data_fine)
+        turni = await db.get_turni_by_user(user['telegram_id'], data_inizio, data_fine)
         turni_completati = [t for t in turni if t['status'] == 'completato']
         
         if not turni_completati:
@@ -813,7 +813,7 @@ async def mostra_video_per_data(update: Update, context: ContextTypes.DEFAULT_TY
         return
     
     # Ottieni turni della data
-    turni = db.get_turni_by_date(data)
+    turni = await db.get_turni_by_date(data)
     
     text = f"📹 *ARCHIVIO VIDEO*\n{format_data_italiana(data)}\n\n"
     
@@ -975,7 +975,7 @@ async def admin_gestione_utenti(update: Update, context: ContextTypes.DEFAULT_TY
     if not is_admin(update.effective_user.id):
         return
     
-    utenti = db.get_all_users()
+    utenti = await db.get_all_users()
     
     text = f"👥 *GESTIONE UTENTI* ({len(utenti)})\n\n"
     
@@ -987,7 +987,7 @@ async def admin_gestione_utenti(update: Update, context: ContextTypes.DEFAULT_TY
             text += f"   @{user['username']}\n"
         
         # Statistiche rapide
-        ore_totali = db.get_ore_totali_user(user['telegram_id'])
+        ore_totali = await db.get_ore_totali_user(user['telegram_id'])
         text += f"   ⏱️  Ore totali: {format_ore(ore_totali)}\n"
         
         text += "\n"
@@ -1009,7 +1009,7 @@ async def admin_statistiche(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Conta utenti
-    utenti = db.get_all_users()
+    utenti = await db.get_all_users()
     num_utenti = len(utenti)
     
     # Conta turni da Excel
@@ -1033,7 +1033,7 @@ async def admin_statistiche(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         pass
     
-    richieste_pending = len(db.get_richieste_non_completate())
+    richieste_pending = len(await db.get_richieste_non_completate())
     
     # Storage
     storage = get_storage_stats()
@@ -35,6 +35,10 @@ EXPORTS_DIR.mkdir(exist_ok=True)
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
 
+# Directory Cache (geocoding)
+CACHE_DIR = BASE_DIR / 'cache'
+CACHE_DIR.mkdir(exist_ok=True)
+
 
 def read_config_file(filename: str) -> str:
     """Legge un file dalla directory Config"""
@@ -132,6 +136,28 @@ NOTIFICA_ALERT_TURNO_LUNGO = True
 
 DATABASE_PATH = DATABASE_DIR / 'pulizie.db'
 
+# Backend dati per utenti, turni e richieste:
+#   'excel'  -> users.xlsx / turni.xlsx / richieste_prodotti.xlsx (default)
+#   'sqlite' -> DATABASE_PATH in modalità WAL, Excel rigenerati periodicamente per l'ufficio
+DATABASE_BACKEND = 'excel'
+
+# Ogni quanti minuti rigenerare gli Excel quando DATABASE_BACKEND = 'sqlite'
+EXCEL_EXPORT_INTERVAL_MINUTES = 15
+
+# Backend 'excel': le scritture su turni/richieste vanno in un journal append-only
+# e vengono riportate negli Excel in blocco ogni N secondi
+JOURNAL_COMPATTAZIONE_SECONDI = 30
+
+
+# ==================== GEOCODING ====================
+
+# Cache su disco degli indirizzi già geocodificati (chiave = indirizzo normalizzato)
+GEOCODE_CACHE_PATH = CACHE_DIR / 'geocode_cache.json'
+
+# Validità di un risultato trovato (giorni) e di un "indirizzo non trovato" (giorni)
+GEOCODE_CACHE_TTL_GIORNI = 180
+GEOCODE_CACHE_TTL_NEGATIVO_GIORNI = 7
+
 
 # ==================== LOGGING ====================
 
@@ -228,7 +254,7 @@ if __name__ == '__main__':
     # Test configurazione
     print(f"📂 Base directory: {BASE_DIR}")
     print(f"📂 Videos directory: {VIDEOS_DIR}")
-    print(f"📂 Database: {DATABASE_PATH}")
+    print(f"📂 Database: {DATABASE_PATH} (backend: {DATABASE_BACKEND})")
     print(f"🔑 Bot token: {'✅ Presente' if TELEGRAM_BOT_TOKEN else '❌ Mancante'}")
     print(f"👨‍💼 Admin ID: {'✅ Presente' if ADMIN_TELEGRAM_ID else '❌ Mancante'}")
     print()
@@ -1,12 +1,17 @@
 """
 Database manager per il bot delle pulizie
-TUTTO BASATO SU EXCEL - No SQLite
+Default: TUTTO BASATO SU EXCEL.
+Con DATABASE_BACKEND = 'sqlite' (config.py) utenti, turni e richieste passano
+su SQLite (vedi database_sqlite.py) mantenendo le stesse funzioni pubbliche.
 """
 
 import os
 import shutil
 import time
 import logging
+import threading
+import atexit
+from io import BytesIO
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Tuple
 import openpyxl
@@ -14,6 +19,11 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment
 from filelock import FileLock
 
+from .config import DATABASE_BACKEND, JOURNAL_COMPATTAZIONE_SECONDI, GPS_TOLERANCE_METERS
+from .journal import Journal
+from .sequenze import SequenzaId
+from .registro_appartamenti import RegistroAppartamenti
+
 logger = logging.getLogger(__name__)
 
 # Path Excel files - Database CONDIVISO (un livello sopra il bot)
@@ -25,10 +35,20 @@ EXCEL_RICHIESTE_PATH = os.path.join(EXCEL_DIR, 'richieste_prodotti.xlsx')
 EXCEL_MATERIALI_PATH = os.path.join(EXCEL_DIR, 'materiali_pulizie_appartamenti.xlsx')
 
 # Cache per performance
-_cache_timestamp = 0
-_cache_turni = []
 _last_request_time = {}  # Rate limiting per richieste
 
+# Colonne di turni.xlsx e richieste_prodotti.xlsx (ordine del file)
+TURNI_COLONNE = ['id', 'user_telegram_id', 'user_nome', 'user_cognome', 'appartamento_id',
+                 'appartamento_nome', 'data', 'timestamp_ingresso', 'timestamp_uscita',
+                 'ore_lavorate', 'video_ingresso_path', 'video_ingresso_file_id',
+                 'video_uscita_path', 'video_uscita_file_id', 'status']
+RICHIESTE_COLONNE = ['id', 'user_telegram_id', 'user_nome', 'appartamento_id', 'appartamento_nome',
+                     'tipo_richiesta', 'descrizione_prodotti', 'info_consegna',
+                     'completato', 'data_richiesta', 'data_completamento', 'message_id']
+
+# Journal delle scritture su turni/richieste (compattato negli Excel in background)
+JOURNAL_PATH = os.path.join(EXCEL_DIR, 'journal_scritture.jsonl')
+
 # ==================== UTILITY FUNCTIONS ====================
 
 def backup_excel():
@@ -95,6 +115,226 @@ def can_create_request(user_id: int, cooldown_seconds: int = 60) -> bool:
     _last_request_time[user_id] = now
     return True
 
+# ==================== TABELLE IN MEMORIA + JOURNAL ====================
+#
+# turni e richieste sono tenuti in memoria (snapshot Excel + voci del journal non
+# ancora compattate). Le scritture vanno nel journal append-only (fsync) e negli
+# indici in memoria; un thread in background le riporta negli Excel a blocchi.
+
+def _stat_file(path: str):
+    """Firma del file (mtime_ns, size) usata per validare le cache in memoria"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _TabellaResidente:
+    """
+    Tabella Excel residente in memoria con indici per colonna.
+    
+    Lo snapshot viene riletto solo se la firma mtime/size del file cambia (es. file
+    modificato a mano dall'ufficio); dopo il caricamento vengono riapplicate le voci
+    del journal non ancora compattate.
+    """
+    
+    def __init__(self, nome: str, path: str, colonne: List[str], indici: List[str]):
+        self.nome = nome
+        self.path = path
+        self.colonne = colonne
+        self.lock = threading.RLock()
+        self._firma = 0
+        self._righe = []
+        self._by_id = {}
+        self._indici = {colonna: {} for colonna in indici}
+    
+    def _indicizza(self, riga: Dict):
+        self._by_id[riga['id']] = riga
+        for colonna, indice in self._indici.items():
+            indice.setdefault(riga[colonna], []).append(riga)
+    
+    def _applica(self, voce: Dict):
+        """Applica una voce del journal (idempotente)"""
+        if voce['op'] == 'insert':
+            riga = {c: voce['riga'].get(c) for c in self.colonne}
+            if riga['id'] in self._by_id:
+                return
+            self._righe.append(riga)
+            self._indicizza(riga)
+        elif voce['op'] == 'update':
+            riga = self._by_id.get(voce['id'])
+            if riga is None:
+                return
+            for colonna, valore in voce['campi'].items():
+                indice = self._indici.get(colonna)
+                if indice is not None and riga in indice.get(riga[colonna], []):
+                    indice[riga[colonna]].remove(riga)
+                riga[colonna] = valore
+                if indice is not None:
+                    indice.setdefault(valore, []).append(riga)
+    
+    def _carica(self):
+        """(Ri)carica lo snapshot Excel se è cambiato e riapplica il journal"""
+        firma = _stat_file(self.path)
+        if self._firma == firma:
+            return
+        
+        wb = openpyxl.load_workbook(self.path, read_only=True)
+        try:
+            righe = []
+            for row in wb.active.iter_rows(min_row=2, values_only=True):
+                if not any(v is not None for v in row):
+                    continue
+                valori = list(row[:len(self.colonne)])
+                valori += [None] * (len(self.colonne) - len(valori))
+                righe.append(dict(zip(self.colonne, valori)))
+        finally:
+            wb.close()
+        
+        self._righe = righe
+        self._by_id = {}
+        for indice in self._indici.values():
+            indice.clear()
+        for riga in righe:
+            self._indicizza(riga)
+        
+        voci = [v for v in _journal.voci() if v.get('tabella') == self.nome]
+        for voce in voci:
+            self._applica(voce)
+        
+        self._firma = firma
+        logger.info(f"Tabella {self.nome} caricata in memoria: {len(righe)} righe + {len(voci)} voci journal")
+    
+    def tutte(self) -> List[Dict]:
+        with self.lock:
+            self._carica()
+            return list(self._righe)
+    
+    def cerca(self, colonna: str, valore) -> List[Dict]:
+        """Righe con colonna == valore (lookup sull'indice)"""
+        with self.lock:
+            self._carica()
+            return list(self._indici[colonna].get(valore, []))
+    
+    def get(self, id_riga) -> Optional[Dict]:
+        with self.lock:
+            self._carica()
+            return self._by_id.get(id_riga)
+    
+    def max_id(self) -> int:
+        with self.lock:
+            self._carica()
+            return max((i for i in self._by_id if isinstance(i, int)), default=0)
+    
+    def scrivi(self, voce: Dict):
+        """Registra una scrittura: journal su disco (fsync) + aggiornamento in memoria"""
+        voce = dict(voce, tabella=self.nome)
+        with self.lock:
+            self._carica()
+            _journal.append(voce)
+            self._applica(voce)
+    
+    def dopo_compattazione(self, firma_prima, firma_dopo):
+        """Il compattatore ha riscritto l'Excel: evita di ricaricarlo se eravamo allineati"""
+        with self.lock:
+            self._firma = firma_dopo if self._firma == firma_prima else 0
+    
+    def invalida(self):
+        with self.lock:
+            self._firma = 0
+
+
+_journal = Journal(JOURNAL_PATH)
+_tabella_turni = _TabellaResidente('turni', EXCEL_TURNI_PATH, TURNI_COLONNE,
+                                   indici=['user_telegram_id', 'data', 'status'])
+_tabella_richieste = _TabellaResidente('richieste', EXCEL_RICHIESTE_PATH, RICHIESTE_COLONNE,
+                                       indici=['completato'])
+_TABELLE = {t.nome: t for t in (_tabella_turni, _tabella_richieste)}
+
+# Contatori ID persistenti (turni.xlsx.seq, richieste_prodotti.xlsx.seq)
+_sequenza_turni = SequenzaId(EXCEL_TURNI_PATH)
+_sequenza_richieste = SequenzaId(EXCEL_RICHIESTE_PATH)
+_compattazione_lock = threading.Lock()
+_compattatore_thread = None
+
+
+def compatta_journal() -> int:
+    """
+    Riporta negli Excel le voci del journal (un load/save per file per blocco).
+    Restituisce il numero di voci compattate.
+    """
+    with _compattazione_lock:
+        totale = 0
+        while True:
+            path_blocco = _journal.ruota()
+            if not path_blocco:
+                return totale
+            
+            voci = Journal.leggi(path_blocco)
+            for nome, tabella in _TABELLE.items():
+                voci_tabella = [v for v in voci if v.get('tabella') == nome]
+                if not voci_tabella:
+                    continue
+                
+                try:
+                    with FileLock(f"{tabella.path}.lock", timeout=10):
+                        firma_prima = _stat_file(tabella.path)
+                        wb = openpyxl.load_workbook(tabella.path)
+                        ws = wb.active
+                        
+                        riga_per_id = {}
+                        for row_idx, row in enumerate(ws.iter_rows(min_row=2, max_col=1), start=2):
+                            if row[0].value is not None:
+                                riga_per_id[row[0].value] = row_idx
+                        
+                        for voce in voci_tabella:
+                            if voce['op'] == 'insert':
+                                if voce['riga']['id'] in riga_per_id:
+                                    continue  # già compattata (blocco ripreso dopo un crash)
+                                ws.append([voce['riga'].get(c, '') for c in tabella.colonne])
+                                riga_per_id[voce['riga']['id']] = ws.max_row
+                            elif voce['op'] == 'update':
+                                row_idx = riga_per_id.get(voce['id'])
+                                if row_idx is None:
+                                    continue
+                                for colonna, valore in voce['campi'].items():
+                                    ws.cell(row_idx, tabella.colonne.index(colonna) + 1, valore)
+                        
+                        wb.save(tabella.path)
+                        wb.close()
+                        tabella.dopo_compattazione(firma_prima, _stat_file(tabella.path))
+                except PermissionError:
+                    # Tipico su Windows con il file aperto in Excel: si riprova al prossimo giro
+                    logger.error(f"Compattazione rimandata, file bloccato: {tabella.path}")
+                    return totale
+                except Exception as e:
+                    logger.error(f"Errore compattazione journal su {tabella.path}: {e}", exc_info=True)
+                    return totale
+            
+            _journal.conferma(path_blocco)
+            totale += len(voci)
+            logger.info(f"Journal compattato: {len(voci)} voci scritte negli Excel")
+
+
+def avvia_compattatore_journal(intervallo_secondi: int = JOURNAL_COMPATTAZIONE_SECONDI):
+    """Avvia il thread che compatta il journal ogni N secondi (e una volta all'uscita)"""
+    global _compattatore_thread
+    
+    if _compattatore_thread is not None:
+        return
+    
+    stop = threading.Event()
+    
+    def loop():
+        while not stop.wait(intervallo_secondi):
+            if _journal.ha_voci():
+                compatta_journal()
+    
+    _compattatore_thread = threading.Thread(target=loop, name='compattatore-journal', daemon=True)
+    _compattatore_thread.start()
+    atexit.register(compatta_journal)
+    atexit.register(stop.set)
+    logger.info(f"Compattatore journal attivo (ogni {intervallo_secondi} secondi)")
+
+
 # ==================== DATABASE INITIALIZATION ====================
 
 def init_database():
@@ -118,10 +358,7 @@ def init_database():
         wb = Workbook()
         ws = wb.active
         ws.title = "Turni"
-        ws.append(['id', 'user_telegram_id', 'user_nome', 'user_cognome', 'appartamento_id', 
-                   'appartamento_nome', 'data', 'timestamp_ingresso', 'timestamp_uscita', 
-                   'ore_lavorate', 'video_ingresso_path', 'video_ingresso_file_id',
-                   'video_uscita_path', 'video_uscita_file_id', 'status'])
+        ws.append(TURNI_COLONNE)
         for cell in ws[1]:
             cell.font = Font(bold=True)
         wb.save(EXCEL_TURNI_PATH)
@@ -135,9 +372,7 @@ def init_database():
         # Colonne: id, user_telegram_id, user_nome, appartamento_id, appartamento_nome,
         #          tipo_richiesta (pulizie/appartamento), descrizione_prodotti, 
         #          info_consegna, completato, data_richiesta, data_completamento, message_id
-        ws.append(['id', 'user_telegram_id', 'user_nome', 'appartamento_id', 'appartamento_nome',
-                   'tipo_richiesta', 'descrizione_prodotti', 'info_consegna',
-                   'completato', 'data_richiesta', 'data_completamento', 'message_id'])
+        ws.append(RICHIESTE_COLONNE)
         for cell in ws[1]:
             cell.font = Font(bold=True)
         wb.save(EXCEL_RICHIESTE_PATH)
@@ -156,6 +391,15 @@ def init_database():
         except:
             pass
     
+    # Riporta negli Excel eventuali scritture rimaste nel journal (es. arresto non pulito)
+    if _journal.ha_voci():
+        voci = compatta_journal()
+        print(f"✅ Journal: {voci} scritture pendenti riportate negli Excel")
+    
+    # Allinea i contatori ID al massimo già presente (file esistenti o contatori mancanti)
+    _sequenza_turni.inizializza(_tabella_turni.max_id())
+    _sequenza_richieste.inizializza(_tabella_richieste.max_id())
+    
     print("✅ Database Excel inizializzato correttamente")
 
 
@@ -269,73 +513,46 @@ def user_exists(telegram_id: int) -> bool:
 # ==================== TURNI (Excel) ====================
 
 def _get_next_turno_id() -> int:
-    """Ottiene il prossimo ID turno con file locking per evitare duplicati"""
-    lock = FileLock(f"{EXCEL_TURNI_PATH}.lock", timeout=10)
-    wb = None
-    try:
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-            ws = wb.active
-            max_id = 0
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if row[0] and isinstance(row[0], int):
-                    max_id = max(max_id, row[0])
-            return max_id + 1
-    except:
-        return 1
-    finally:
-        if wb:
-            wb.close()
+    """Alloca il prossimo ID turno dal contatore persistente (O(1), atomico)"""
+    return _sequenza_turni.prossimo(_tabella_turni.max_id)
 
 def create_turno(user_id: int, appartamento_id: int, video_path: str, 
                  video_file_id: str, timestamp: datetime) -> int:
-    """Crea nuovo turno (ingresso) in Excel con file locking e controllo turno doppio"""
-    lock = FileLock(f"{EXCEL_TURNI_PATH}.lock", timeout=10)
-    
+    """Crea nuovo turno (ingresso) tramite journal, con controllo turno doppio"""
     try:
-        # VERIFICA TURNO GIÀ APERTO (previene turni doppi)
-        turno_aperto = get_turno_in_corso(user_id)
-        if turno_aperto:
-            logger.warning(f"Turno già aperto per user {user_id}: {turno_aperto['appartamento_nome']}")
-            raise ValueError(f"Hai già un turno aperto all'appartamento {turno_aperto['appartamento_nome']}")
-        
-        user = get_user(user_id)
-        appartamento = get_appartamento(appartamento_id)
-        
-        if not user or not appartamento:
-            logger.error(f"User o appartamento non trovato: user_id={user_id}, app_id={appartamento_id}")
-            return 0
-        
-        turno_id = _get_next_turno_id()
-        
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_TURNI_PATH)
-            ws = wb.active
+        with _tabella_turni.lock:
+            # VERIFICA TURNO GIÀ APERTO (previene turni doppi)
+            turno_aperto = get_turno_in_corso(user_id)
+            if turno_aperto:
+                logger.warning(f"Turno già aperto per user {user_id}: {turno_aperto['appartamento_nome']}")
+                raise ValueError(f"Hai già un turno aperto all'appartamento {turno_aperto['appartamento_nome']}")
             
-            ws.append([
-                turno_id,                                      # id
-                user_id,                                       # user_telegram_id
-                user['nome'],                                  # user_nome (CORRETTO)
-                user['cognome'],                               # user_cognome (CORRETTO)
-                appartamento_id,                               # appartamento_id (CORRETTO)
-                appartamento['nome'],                          # appartamento_nome (CORRETTO)
-                timestamp.date().strftime('%Y-%m-%d'),         # data
-                timestamp.strftime('%Y-%m-%d %H:%M:%S'),       # timestamp_ingresso
-                '',                                            # timestamp_uscita
-                0,                                             # ore_lavorate
-                video_path,                                    # video_ingresso_path
-                video_file_id,                                 # video_ingresso_file_id
-                '',                                            # video_uscita_path
-                '',                                            # video_uscita_file_id
-                'in_corso'                                     # status
-            ])
+            user = get_user(user_id)
+            appartamento = get_appartamento(appartamento_id)
             
-            wb.save(EXCEL_TURNI_PATH)
-            wb.close()
+            if not user or not appartamento:
+                logger.error(f"User o appartamento non trovato: user_id={user_id}, app_id={appartamento_id}")
+                return 0
+            
+            turno_id = _get_next_turno_id()
             
-            # Invalida cache
-            global _cache_timestamp
-            _cache_timestamp = 0
+            _tabella_turni.scrivi({'op': 'insert', 'riga': {
+                'id': turno_id,
+                'user_telegram_id': user_id,
+                'user_nome': user['nome'],
+                'user_cognome': user['cognome'],
+                'appartamento_id': appartamento_id,
+                'appartamento_nome': appartamento['nome'],
+                'data': timestamp.date().strftime('%Y-%m-%d'),
+                'timestamp_ingresso': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'timestamp_uscita': '',
+                'ore_lavorate': 0,
+                'video_ingresso_path': video_path,
+                'video_ingresso_file_id': video_file_id,
+                'video_uscita_path': '',
+                'video_uscita_file_id': '',
+                'status': 'in_corso'
+            }})
             
             logger.info(f"Turno {turno_id} creato: {user['nome']} @ {appartamento['nome']}")
             return turno_id
@@ -347,37 +564,33 @@ def create_turno(user_id: int, appartamento_id: int, video_path: str,
         logger.error(f"File Excel non trovato: {EXCEL_TURNI_PATH}")
         return 0
     except PermissionError:
-        logger.error(f"Permessi insufficienti per scrivere su: {EXCEL_TURNI_PATH}")
+        logger.error(f"Permessi insufficienti per scrivere il journal: {JOURNAL_PATH}")
         return 0
     except Exception as e:
         logger.error(f"Errore create_turno: {e}", exc_info=True)
         return 0
 
 def get_turno_in_corso(user_id: int) -> Optional[Dict]:
-    """Ottiene turno in corso per utente da Excel"""
-    wb = None
+    """Ottiene turno in corso per utente (tabella in memoria, indice per utente)"""
     try:
-        wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-        ws = wb.active
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[1] == user_id and row[14] == 'in_corso':  # status = 'in_corso' (colonna 14, non 15!)
+        for turno in _tabella_turni.cerca('user_telegram_id', user_id):
+            if turno['status'] == 'in_corso':
                 return {
-                    'id': row[0],
-                    'user_telegram_id': row[1],
-                    'nome': row[2],                          # CORRETTO: user_nome
-                    'cognome': row[3],                       # CORRETTO: user_cognome
-                    'appartamento_id': row[4],               # CORRETTO: appartamento_id
-                    'appartamento_nome': row[5],             # CORRETTO: appartamento_nome
-                    'data': row[6],
-                    'timestamp_ingresso': row[7],
-                    'timestamp_uscita': row[8],
-                    'ore_lavorate': row[9],
-                    'video_ingresso_path': row[10],
-                    'video_ingresso_file_id': row[11],
-                    'video_uscita_path': row[12],
-                    'video_uscita_file_id': row[13],
-                    'status': row[14],
+                    'id': turno['id'],
+                    'user_telegram_id': turno['user_telegram_id'],
+                    'nome': turno['user_nome'],
+                    'cognome': turno['user_cognome'],
+                    'appartamento_id': turno['appartamento_id'],
+                    'appartamento_nome': turno['appartamento_nome'],
+                    'data': turno['data'],
+                    'timestamp_ingresso': turno['timestamp_ingresso'],
+                    'timestamp_uscita': turno['timestamp_uscita'],
+                    'ore_lavorate': turno['ore_lavorate'],
+                    'video_ingresso_path': turno['video_ingresso_path'],
+                    'video_ingresso_file_id': turno['video_ingresso_file_id'],
+                    'video_uscita_path': turno['video_uscita_path'],
+                    'video_uscita_file_id': turno['video_uscita_file_id'],
+                    'status': turno['status'],
                     'indirizzo': ''  # Non serve, ma per compatibilità
                 }
         
@@ -385,187 +598,137 @@ def get_turno_in_corso(user_id: int) -> Optional[Dict]:
     except Exception as e:
         print(f"❌ Errore get_turno_in_corso: {e}")
         return None
-    finally:
-        if wb:
-            wb.close()
 
 def complete_turno(turno_id: int, video_path: str, video_file_id: str, timestamp: datetime):
-    """Completa turno (uscita) e calcola ore lavorate in Excel con file locking"""
-    lock = FileLock(f"{EXCEL_TURNI_PATH}.lock", timeout=10)
-    
+    """Completa turno (uscita) e calcola ore lavorate tramite journal"""
     try:
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_TURNI_PATH)
-            ws = wb.active
+        with _tabella_turni.lock:
+            turno = _tabella_turni.get(turno_id)
+            if turno is None:
+                logger.warning(f"Turno {turno_id} non trovato per completamento")
+                return None
             
-            for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-                if row[0].value == turno_id:
-                    # Calcola ore
-                    ts_ingresso_str = row[7].value  # timestamp_ingresso (colonna 7, non 8!)
-                    if isinstance(ts_ingresso_str, str):
-                        timestamp_ingresso = datetime.strptime(ts_ingresso_str, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        timestamp_ingresso = ts_ingresso_str
-                    
-                    ore_lavorate = (timestamp - timestamp_ingresso).total_seconds() / 3600
-                    
-                    # Valida ore (max 24 ore)
-                    if ore_lavorate > 24:
-                        logger.warning(f"Turno {turno_id}: ore lavorate sospette ({ore_lavorate:.2f}h)")
-                    
-                    # Aggiorna riga (correzione indici: le colonne Excel sono 1-indexed!)
-                    ws.cell(row_idx, 9, timestamp.strftime('%Y-%m-%d %H:%M:%S'))   # timestamp_uscita (col 9)
-                    ws.cell(row_idx, 10, round(ore_lavorate, 2))                    # ore_lavorate (col 10)
-                    ws.cell(row_idx, 13, video_path)                                # video_uscita_path (col 13)
-                    ws.cell(row_idx, 14, video_file_id)                             # video_uscita_file_id (col 14)
-                    ws.cell(row_idx, 15, 'completato')                              # status (col 15)
-                    
-                    wb.save(EXCEL_TURNI_PATH)
-                    wb.close()
-                    
-                    # Invalida cache
-                    global _cache_timestamp
-                    _cache_timestamp = 0
-                    
-                    logger.info(f"Turno {turno_id} completato: {ore_lavorate:.2f}h")
-                    return ore_lavorate
+            # Calcola ore
+            ts_ingresso_str = turno['timestamp_ingresso']
+            if isinstance(ts_ingresso_str, str):
+                timestamp_ingresso = datetime.strptime(ts_ingresso_str, '%Y-%m-%d %H:%M:%S')
+            else:
+                timestamp_ingresso = ts_ingresso_str
             
-            wb.close()
-            logger.warning(f"Turno {turno_id} non trovato per completamento")
-            return None
+            ore_lavorate = (timestamp - timestamp_ingresso).total_seconds() / 3600
+            
+            # Valida ore (max 24 ore)
+            if ore_lavorate > 24:
+                logger.warning(f"Turno {turno_id}: ore lavorate sospette ({ore_lavorate:.2f}h)")
+            
+            _tabella_turni.scrivi({'op': 'update', 'id': turno_id, 'campi': {
+                'timestamp_uscita': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'ore_lavorate': round(ore_lavorate, 2),
+                'video_uscita_path': video_path,
+                'video_uscita_file_id': video_file_id,
+                'status': 'completato'
+            }})
+            
+            logger.info(f"Turno {turno_id} completato: {ore_lavorate:.2f}h")
+            return ore_lavorate
             
     except FileNotFoundError:
         logger.error(f"File Excel non trovato: {EXCEL_TURNI_PATH}")
         return None
     except PermissionError:
-        logger.error(f"Permessi insufficienti per scrivere su: {EXCEL_TURNI_PATH}")
+        logger.error(f"Permessi insufficienti per scrivere il journal: {JOURNAL_PATH}")
         return None
     except Exception as e:
         logger.error(f"Errore complete_turno: {e}", exc_info=True)
         return None
 
 def get_turni_by_date(data: datetime.date) -> List[Dict]:
-    """Ottiene tutti i turni di una data da Excel"""
+    """Ottiene tutti i turni di una data (tabella in memoria, indice per data)"""
     try:
-        wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-        ws = wb.active
-        
-        data_str = data.strftime('%Y-%m-%d')
-        turni = []
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[6] == data_str:  # data è colonna 6, non 7!
-                turni.append({
-                    'id': row[0],
-                    'user_telegram_id': row[1],
-                    'nome': row[2],           # CORRETTO
-                    'cognome': row[3],        # CORRETTO
-                    'appartamento_nome': row[5],  # CORRETTO
-                    'data': row[6],           # CORRETTO
-                    'timestamp_ingresso': row[7],  # CORRETTO
-                    'timestamp_uscita': row[8],    # CORRETTO
-                    'ore_lavorate': row[9],   # CORRETTO
-                    'status': row[14]         # CORRETTO
-                })
-        
-        wb.close()
-        return turni
+        return [{
+            'id': t['id'],
+            'user_telegram_id': t['user_telegram_id'],
+            'nome': t['user_nome'],
+            'cognome': t['user_cognome'],
+            'appartamento_nome': t['appartamento_nome'],
+            'data': t['data'],
+            'timestamp_ingresso': t['timestamp_ingresso'],
+            'timestamp_uscita': t['timestamp_uscita'],
+            'ore_lavorate': t['ore_lavorate'],
+            'status': t['status']
+        } for t in _tabella_turni.cerca('data', data.strftime('%Y-%m-%d'))]
     except Exception as e:
         print(f"❌ Errore get_turni_by_date: {e}")
         return []
 
 def get_turni_by_user(user_id: int, data_inizio: datetime.date = None, 
                       data_fine: datetime.date = None) -> List[Dict]:
-    """Ottiene turni di un utente in un periodo da Excel"""
-    wb = None
+    """Ottiene turni di un utente in un periodo (tabella in memoria, indice per utente)"""
     try:
-        wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-        ws = wb.active
-        
         turni = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[1] == user_id:
-                # Filtra per date se specificate
-                data_turno_str = row[6]  # CORRETTO
-                if data_inizio or data_fine:
-                    data_turno = datetime.strptime(data_turno_str, '%Y-%m-%d').date()
-                    if data_inizio and data_turno < data_inizio:
-                        continue
-                    if data_fine and data_turno > data_fine:
-                        continue
-                
-                turni.append({
-                    'id': row[0],
-                    'appartamento_nome': row[5],   # CORRETTO
-                    'data': row[6],                # CORRETTO
-                    'timestamp_ingresso': row[7],  # CORRETTO
-                    'timestamp_uscita': row[8],    # CORRETTO
-                    'ore_lavorate': row[9],        # CORRETTO
-                    'status': row[14]              # CORRETTO
-                })
+        for t in _tabella_turni.cerca('user_telegram_id', user_id):
+            # Filtra per date se specificate
+            if data_inizio or data_fine:
+                data_turno = datetime.strptime(t['data'], '%Y-%m-%d').date()
+                if data_inizio and data_turno < data_inizio:
+                    continue
+                if data_fine and data_turno > data_fine:
+                    continue
+            
+            turni.append({
+                'id': t['id'],
+                'appartamento_nome': t['appartamento_nome'],
+                'data': t['data'],
+                'timestamp_ingresso': t['timestamp_ingresso'],
+                'timestamp_uscita': t['timestamp_uscita'],
+                'ore_lavorate': t['ore_lavorate'],
+                'status': t['status']
+            })
         
         return turni
     except Exception as e:
         print(f"❌ Errore get_turni_by_user: {e}")
         return []
-    finally:
-        if wb:
-            wb.close()
 
 def get_all_turni_in_corso() -> List[Dict]:
-    """Ottiene tutti i turni in corso"""
-    wb = None
+    """Ottiene tutti i turni in corso (tabella in memoria, indice per status)"""
     try:
-        wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-        ws = wb.active
-        
-        turni = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[14] == 'in_corso':  # status
-                turni.append({
-                    'id': row[0],
-                    'user_id': row[1],
-                    'nome': row[2],
-                    'cognome': row[3],
-                    'appartamento_id': row[4],
-                    'appartamento_nome': row[5],
-                    'data': row[6],
-                    'timestamp_ingresso': row[7],
-                    'video_ingresso': row[10]
-                })
-        
-        return turni
+        return [{
+            'id': t['id'],
+            'user_id': t['user_telegram_id'],
+            'nome': t['user_nome'],
+            'cognome': t['user_cognome'],
+            'appartamento_id': t['appartamento_id'],
+            'appartamento_nome': t['appartamento_nome'],
+            'data': t['data'],
+            'timestamp_ingresso': t['timestamp_ingresso'],
+            'video_ingresso': t['video_ingresso_path']
+        } for t in _tabella_turni.cerca('status', 'in_corso')]
     except Exception as e:
         print(f"❌ Errore get_all_turni_in_corso: {e}")
         return []
-    finally:
-        if wb:
-            wb.close()
+
+def _turno_completato_dict(t: Dict) -> Dict:
+    """Formato comune dei turni completati per il pannello admin"""
+    return {
+        'id': t['id'],
+        'user_id': t['user_telegram_id'],
+        'nome': t['user_nome'],
+        'cognome': t['user_cognome'],
+        'appartamento_id': t['appartamento_id'],
+        'appartamento_nome': t['appartamento_nome'],
+        'data': t['data'],
+        'timestamp_ingresso': t['timestamp_ingresso'],
+        'timestamp_uscita': t['timestamp_uscita'],
+        'ore_lavorate': t['ore_lavorate'],
+        'video_ingresso': t['video_ingresso_path'],
+        'video_uscita': t['video_uscita_path']
+    }
 
 def get_all_turni_completati(limit: int = 50) -> List[Dict]:
     """Ottiene tutti i turni completati (ultimi N)"""
-    wb = None
     try:
-        wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-        ws = wb.active
-        
-        turni = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[14] == 'completato':  # status
-                turni.append({
-                    'id': row[0],
-                    'user_id': row[1],
-                    'nome': row[2],
-                    'cognome': row[3],
-                    'appartamento_id': row[4],
-                    'appartamento_nome': row[5],
-                    'data': row[6],
-                    'timestamp_ingresso': row[7],
-                    'timestamp_uscita': row[8],
-                    'ore_lavorate': row[9],
-                    'video_ingresso': row[10],
-                    'video_uscita': row[12]  # Corretto: video_uscita_path è colonna 12
-                })
+        turni = [_turno_completato_dict(t) for t in _tabella_turni.cerca('status', 'completato')]
         
         # Ordina per data decrescente e limita
         turni.sort(key=lambda x: x['timestamp_uscita'] or '', reverse=True)
@@ -573,35 +736,13 @@ def get_all_turni_completati(limit: int = 50) -> List[Dict]:
     except Exception as e:
         print(f"❌ Errore get_all_turni_completati: {e}")
         return []
-    finally:
-        if wb:
-            wb.close()
 
 def get_turni_completati_oggi() -> List[Dict]:
     """Ottiene tutti i turni completati oggi"""
-    wb = None
     try:
         oggi = datetime.now().strftime('%Y-%m-%d')
-        wb = openpyxl.load_workbook(EXCEL_TURNI_PATH, read_only=True)
-        ws = wb.active
-        
-        turni = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[14] == 'completato' and row[6] == oggi:  # status e data
-                turni.append({
-                    'id': row[0],
-                    'user_id': row[1],
-                    'nome': row[2],
-                    'cognome': row[3],
-                    'appartamento_id': row[4],
-                    'appartamento_nome': row[5],
-                    'data': row[6],
-                    'timestamp_ingresso': row[7],
-                    'timestamp_uscita': row[8],
-                    'ore_lavorate': row[9],
-                    'video_ingresso': row[10],  # video_ingresso_path
-                    'video_uscita': row[12]     # video_uscita_path (corretto da 11 a 12)
-                })
+        turni = [_turno_completato_dict(t) for t in _tabella_turni.cerca('data', oggi)
+                 if t['status'] == 'completato']
         
         # Ordina per timestamp uscita
         turni.sort(key=lambda x: x['timestamp_uscita'] or '', reverse=True)
@@ -609,14 +750,9 @@ def get_turni_completati_oggi() -> List[Dict]:
     except Exception as e:
         print(f"❌ Errore get_turni_completati_oggi: {e}")
         return []
-    finally:
-        if wb:
-            wb.close()
 
 def esporta_turni_excel(turni: List[Dict], titolo: str = "Turni") -> BytesIO:
     """Esporta lista turni in file Excel"""
-    from io import BytesIO
-    
     wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = titolo[:31]  # Max 31 caratteri per nome foglio
@@ -690,35 +826,18 @@ def get_ore_totali_user(user_id: int, data: datetime.date = None) -> float:
 # ==================== RICHIESTE PRODOTTI (Excel + Telegram) ====================
 
 def _get_next_richiesta_id() -> int:
-    """Ottiene il prossimo ID richiesta con file locking per evitare duplicati"""
-    lock = FileLock(f"{EXCEL_RICHIESTE_PATH}.lock", timeout=10)
-    wb = None
-    try:
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH, read_only=True)
-            ws = wb.active
-            max_id = 0
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if row[0] and isinstance(row[0], int):
-                    max_id = max(max_id, row[0])
-            return max_id + 1
-    except:
-        return 1
-    finally:
-        if wb:
-            wb.close()
+    """Alloca il prossimo ID richiesta dal contatore persistente (O(1), atomico)"""
+    return _sequenza_richieste.prossimo(_tabella_richieste.max_id)
 
 def create_richiesta(user_id: int, appartamento_id: int, descrizione: str, 
                      tipo_richiesta: str = 'generico', info_consegna: str = '',
                      turno_id: int = None, message_id: int = None) -> int:
-    """Crea nuova richiesta prodotti in Excel con rate limiting e file locking
+    """Crea nuova richiesta prodotti tramite journal, con rate limiting
     
     Args:
         tipo_richiesta: 'pulizie' | 'appartamento' | 'generico'
         info_consegna: Info su luogo e data consegna (opzionale)
     """
-    lock = FileLock(f"{EXCEL_RICHIESTE_PATH}.lock", timeout=10)
-    
     try:
         # RATE LIMITING (evita spam di richieste)
         if not can_create_request(user_id, cooldown_seconds=30):
@@ -741,35 +860,26 @@ def create_richiesta(user_id: int, appartamento_id: int, descrizione: str,
         # Sanitizza info consegna
         info_consegna = sanitize_text(info_consegna, max_length=300)
         
-        richiesta_id = _get_next_richiesta_id()
-        
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH)
-            ws = wb.active
-            
-            # Nuova struttura: id, user_telegram_id, user_nome, appartamento_id, appartamento_nome,
-            #                  tipo_richiesta, descrizione_prodotti, info_consegna,
-            #                  completato, data_richiesta, data_completamento, message_id
-            ws.append([
-                richiesta_id,
-                user_id,
-                f"{user['nome']} {user['cognome']}",
-                appartamento_id,
-                appartamento['nome'],
-                tipo_richiesta,
-                descrizione,
-                info_consegna,
-                'NO',  # completato
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                '',  # data_completamento
-                message_id or ''  # message_id per aggiornare messaggio Telegram
-            ])
+        with _tabella_richieste.lock:
+            richiesta_id = _get_next_richiesta_id()
             
-            wb.save(EXCEL_RICHIESTE_PATH)
-            wb.close()
-            
-            logger.info(f"Richiesta {richiesta_id} creata: {user['nome']} @ {appartamento['nome']}")
-            return richiesta_id
+            _tabella_richieste.scrivi({'op': 'insert', 'riga': {
+                'id': richiesta_id,
+                'user_telegram_id': user_id,
+                'user_nome': f"{user['nome']} {user['cognome']}",
+                'appartamento_id': appartamento_id,
+                'appartamento_nome': appartamento['nome'],
+                'tipo_richiesta': tipo_richiesta,
+                'descrizione_prodotti': descrizione,
+                'info_consegna': info_consegna,
+                'completato': 'NO',
+                'data_richiesta': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'data_completamento': '',
+                'message_id': message_id or ''  # message_id per aggiornare messaggio Telegram
+            }})
+        
+        logger.info(f"Richiesta {richiesta_id} creata: {user['nome']} @ {appartamento['nome']}")
+        return richiesta_id
             
     except ValueError:
         # Errore di validazione (rate limit o descrizione corta)
@@ -778,70 +888,59 @@ def create_richiesta(user_id: int, appartamento_id: int, descrizione: str,
         logger.error(f"File Excel non trovato: {EXCEL_RICHIESTE_PATH}")
         return 0
     except PermissionError:
-        logger.error(f"Permessi insufficienti per scrivere su: {EXCEL_RICHIESTE_PATH}")
+        logger.error(f"Permessi insufficienti per scrivere il journal: {JOURNAL_PATH}")
         return 0
     except Exception as e:
         logger.error(f"Errore create_richiesta: {e}", exc_info=True)
         return 0
 
+def _richiesta_dict(r: Dict) -> Dict:
+    """Campi comuni delle richieste lette dalla tabella in memoria"""
+    return {
+        'id': r['id'],
+        'user_nome_completo': r['user_nome'],
+        'nome': r['user_nome'].split()[0] if r['user_nome'] else '',
+        'cognome': ' '.join(r['user_nome'].split()[1:]) if r['user_nome'] else '',
+        'appartamento_id': r['appartamento_id'],
+        'appartamento_nome': r['appartamento_nome'],
+        'tipo_richiesta': r['tipo_richiesta'],
+        'descrizione_prodotti': r['descrizione_prodotti'],
+        'info_consegna': r['info_consegna'],
+        'data_richiesta': r['data_richiesta'],
+        'message_id': r['message_id']
+    }
+
 def get_richieste_non_completate() -> List[Dict]:
-    """Ottiene tutte le richieste non completate da Excel"""
-    wb = None
+    """Ottiene tutte le richieste non completate (tabella in memoria, indice su completato)"""
     try:
-        wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH, read_only=True)
-        ws = wb.active
-        
         richieste = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            # Nuova struttura: completato è colonna 8 (indice 8)
-            if row[8] == 'NO':  # completato = 'NO'
-                richieste.append({
-                    'id': row[0],
-                    'user_telegram_id': row[1],
-                    'user_nome_completo': row[2],
-                    'nome': row[2].split()[0] if row[2] else '',
-                    'cognome': ' '.join(row[2].split()[1:]) if row[2] else '',
-                    'appartamento_id': row[3],
-                    'appartamento_nome': row[4],
-                    'tipo_richiesta': row[5] if len(row) > 5 else 'generico',
-                    'descrizione_prodotti': row[6],
-                    'info_consegna': row[7] if len(row) > 7 else '',
-                    'completato': False,
-                    'data_richiesta': row[9],
-                    'message_id': row[11] if len(row) > 11 else None
-                })
+        for r in _tabella_richieste.cerca('completato', 'NO'):
+            richiesta = _richiesta_dict(r)
+            richiesta['user_telegram_id'] = r['user_telegram_id']
+            richiesta['completato'] = False
+            richieste.append(richiesta)
         
         return richieste
     except Exception as e:
         print(f"❌ Errore get_richieste_non_completate: {e}")
         return []
-    finally:
-        if wb:
-            wb.close()
 
 def complete_richiesta(richiesta_id: int):
-    """Segna richiesta come completata in Excel con file locking"""
-    lock = FileLock(f"{EXCEL_RICHIESTE_PATH}.lock", timeout=10)
-    
+    """Segna richiesta come completata tramite journal"""
     try:
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH)
-            ws = wb.active
-            
-            for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-                if row[0].value == richiesta_id:
-                    ws.cell(row_idx, 9, 'SI')  # completato (colonna 9)
-                    ws.cell(row_idx, 11, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))  # data_completamento (colonna 11)
-                    wb.save(EXCEL_RICHIESTE_PATH)
-                    logger.info(f"Richiesta {richiesta_id} completata")
-                    break
-            
-            wb.close()
+        with _tabella_richieste.lock:
+            if _tabella_richieste.get(richiesta_id) is None:
+                return
+            _tabella_richieste.scrivi({'op': 'update', 'id': richiesta_id, 'campi': {
+                'completato': 'SI',
+                'data_completamento': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }})
+        logger.info(f"Richiesta {richiesta_id} completata")
             
     except FileNotFoundError:
         logger.error(f"File Excel non trovato: {EXCEL_RICHIESTE_PATH}")
     except PermissionError:
-        logger.error(f"Permessi insufficienti per scrivere su: {EXCEL_RICHIESTE_PATH}")
+        logger.error(f"Permessi insufficienti per scrivere il journal: {JOURNAL_PATH}")
     except Exception as e:
         logger.error(f"Errore complete_richiesta: {e}", exc_info=True)
 
@@ -850,7 +949,10 @@ def delete_richieste_completate():
     lock = FileLock(f"{EXCEL_RICHIESTE_PATH}.lock", timeout=10)
     
     try:
-        with lock:
+        # Prima porta nell'Excel tutte le scritture ancora nel journal
+        compatta_journal()
+        
+        with _tabella_richieste.lock, lock:
             wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH)
             ws = wb.active
             
@@ -865,6 +967,7 @@ def delete_richieste_completate():
             
             wb.save(EXCEL_RICHIESTE_PATH)
             wb.close()
+            _tabella_richieste.invalida()
             
             logger.info(f"Eliminate {len(rows_to_delete)} richieste completate")
             return len(rows_to_delete)
@@ -880,116 +983,62 @@ def delete_richieste_completate():
         return 0
 
 def get_richiesta(richiesta_id: int) -> Optional[Dict]:
-    """Ottiene dettagli richiesta da Excel"""
-    wb = None
+    """Ottiene dettagli richiesta (tabella in memoria)"""
     try:
-        wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH, read_only=True)
-        ws = wb.active
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if row[0] == richiesta_id:
-                return {
-                    'id': row[0],
-                    'telegram_id': row[1],
-                    'user_nome_completo': row[2],
-                    'nome': row[2].split()[0] if row[2] else '',
-                    'cognome': ' '.join(row[2].split()[1:]) if row[2] else '',
-                    'appartamento_id': row[3],
-                    'appartamento_nome': row[4],
-                    'tipo_richiesta': row[5] if len(row) > 5 else 'generico',
-                    'descrizione_prodotti': row[6],
-                    'info_consegna': row[7] if len(row) > 7 else '',
-                    'completato': row[8] == 'SI',
-                    'data_richiesta': row[9],
-                    'message_id': row[11] if len(row) > 11 else None
-                }
+        r = _tabella_richieste.get(richiesta_id)
+        if r is None:
+            return None
         
-        return None
+        richiesta = _richiesta_dict(r)
+        richiesta['telegram_id'] = r['user_telegram_id']
+        richiesta['completato'] = r['completato'] == 'SI'
+        return richiesta
     except Exception as e:
         print(f"❌ Errore get_richiesta: {e}")
         return None
-    finally:
-        if wb:
-            wb.close()
 
 def update_richiesta_message_id(richiesta_id: int, message_id: int):
-    """Aggiorna il message_id Telegram della richiesta per edit successivo con file locking"""
-    lock = FileLock(f"{EXCEL_RICHIESTE_PATH}.lock", timeout=10)
-    
+    """Aggiorna il message_id Telegram della richiesta per edit successivo (tramite journal)"""
     try:
-        with lock:
-            wb = openpyxl.load_workbook(EXCEL_RICHIESTE_PATH)
-            ws = wb.active
-            
-            for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-                if row[0].value == richiesta_id:
-                    ws.cell(row_idx, 12, message_id)  # Colonna 12 = message_id
-                    wb.save(EXCEL_RICHIESTE_PATH)
-                    logger.info(f"Message ID {message_id} salvato per richiesta {richiesta_id}")
-                    break
-            
-            wb.close()
+        with _tabella_richieste.lock:
+            if _tabella_richieste.get(richiesta_id) is None:
+                return
+            _tabella_richieste.scrivi({'op': 'update', 'id': richiesta_id, 'campi': {
+                'message_id': message_id
+            }})
+        logger.info(f"Message ID {message_id} salvato per richiesta {richiesta_id}")
             
     except FileNotFoundError:
         logger.error(f"File Excel non trovato: {EXCEL_RICHIESTE_PATH}")
     except PermissionError:
-        logger.error(f"Permessi insufficienti per scrivere su: {EXCEL_RICHIESTE_PATH}")
+        logger.error(f"Permessi insufficienti per scrivere il journal: {JOURNAL_PATH}")
     except Exception as e:
         logger.error(f"Errore update_richiesta_message_id: {e}", exc_info=True)
 
 
 # ==================== APPARTAMENTI (da Excel) ====================
 
+# Istanza unica condivisa da user_handlers e admin_handlers (tramite le funzioni qui sotto)
+registro_appartamenti = RegistroAppartamenti(EXCEL_APPARTAMENTI_PATH, cella_metri=GPS_TOLERANCE_METERS)
+
 def get_appartamento(appartamento_id: int) -> Optional[Dict]:
-    """Ottiene info appartamento da Excel"""
-    appartamenti = get_all_appartamenti()
-    for app in appartamenti:
-        if app['id'] == appartamento_id:
-            return app
-    return None
+    """Ottiene info appartamento (lookup per id sul registro in memoria)"""
+    return registro_appartamenti.get(appartamento_id)
+
+def get_appartamento_by_nome(nome: str) -> Optional[Dict]:
+    """Ottiene info appartamento per nome (maiuscole/accenti/punteggiatura ignorati)"""
+    return registro_appartamenti.get_by_nome(nome)
 
 def get_all_appartamenti() -> List[Dict]:
-    """Legge tutti gli appartamenti dall'Excel"""
-    if not os.path.exists(EXCEL_APPARTAMENTI_PATH):
-        print(f"⚠️ File Excel appartamenti non trovato: {EXCEL_APPARTAMENTI_PATH}")
-        return []
-    
-    wb = None
-    try:
-        wb = openpyxl.load_workbook(EXCEL_APPARTAMENTI_PATH, read_only=True)
-        sheet = wb.active
-        
-        appartamenti = []
-        
-        # Leggi righe Excel: A=Gestione, B=Nome, C=Nome OTA, D=Indirizzo, M=Coordinate GPS (colonna 12)
-        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=1):
-            if not row or not row[1]:  # Salta righe vuote (verifica colonna B = nome)
-                continue
-            
-            # Colonna M (indice 12) per coordinate GPS nel formato "lat,lon"
-            coordinate = str(row[12]).strip() if len(row) > 12 and row[12] and str(row[12]).strip() not in ['', 'None', 'Vero', 'Falso'] else None
-            
-            appartamento = {
-                'id': row_num,  # Usa numero riga come ID
-                'nome': str(row[1]) if len(row) > 1 and row[1] else 'Senza nome',  # Colonna B
-                'indirizzo': str(row[3]) if len(row) > 3 and row[3] else '',  # Colonna D
-                'coordinate': coordinate,  # Colonna M
-                'attivo': str(row[4]) if len(row) > 4 and row[4] else 'Vero'  # Colonna E
-            }
-            
-            appartamenti.append(appartamento)
-        
-        # NON fare geocoding automatico - troppo lento
-        # Il geocoding viene fatto solo quando serve (ricerca GPS)
-        
-        return appartamenti
-        
-    except Exception as e:
-        print(f"❌ Errore lettura Excel appartamenti: {e}")
-        return []
-    finally:
-        if wb:
-            wb.close()
+    """Tutti gli appartamenti dall'Excel (riletto solo se il file è cambiato)"""
+    # NON fare geocoding automatico - troppo lento
+    # Il geocoding viene fatto solo quando serve (ricerca GPS)
+    return registro_appartamenti.tutti()
+
+def get_appartamenti_vicini(lat: float, lon: float, raggio_metri: float = GPS_TOLERANCE_METERS,
+                            limite: int = 20) -> List[Dict]:
+    """Appartamenti entro raggio_metri ordinati per distanza (chiave 'distanza' in metri)"""
+    return registro_appartamenti.vicini(lat, lon, raggio_metri, limite)
 
 
 # ==================== MATERIALI PULIZIE E APPARTAMENTO ====================
@@ -1089,6 +1138,23 @@ def get_report_giornaliero(data: datetime.date) -> Dict:
     }
 
 
+# ==================== BACKEND SQLITE (opzionale) ====================
+
+# Con DATABASE_BACKEND = 'sqlite' le funzioni utenti/turni/richieste vengono sostituite
+# da quelle di database_sqlite (stesse firme e stessi dizionari restituiti).
+# Le funzioni rimaste qui (es. user_exists, get_ore_totali_user, get_report_giornaliero)
+# usano automaticamente le versioni SQLite perché risolvono i nomi a runtime.
+if DATABASE_BACKEND == 'sqlite':
+    from .database_sqlite import (  # noqa: F811
+        init_database, backup_excel, register_user, get_user, get_all_users,
+        create_turno, get_turno_in_corso, complete_turno, get_turni_by_date, get_turni_by_user,
+        get_all_turni_in_corso, get_all_turni_completati, get_turni_completati_oggi,
+        create_richiesta, get_richieste_non_completate, complete_richiesta,
+        delete_richieste_completate, get_richiesta, update_richiesta_message_id,
+        esporta_excel, avvia_export_periodico,
+    )
+
+
 if __name__ == '__main__':
     # Test inizializzazione
     init_database()
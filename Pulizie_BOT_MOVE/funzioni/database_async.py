@@ -0,0 +1,95 @@
+"""
+Facciata async di database.py per gli handler Telegram
+
+Le funzioni di database.py sono sincrone (openpyxl, FileLock fino a 10 s):
+chiamate direttamente da un handler async bloccherebbero il polling per tutti
+gli utenti. Qui ogni funzione ha la stessa firma ma va usata con await:
+
+    from . import database_async as db
+    turno_id = await db.create_turno(user_id, appartamento_id, video_path, video_file_id, timestamp)
+
+- letture: thread pool (più letture in parallelo)
+- scritture: un solo thread dedicato, quindi eseguite una alla volta e
+  nell'ordine di arrivo (coda FIFO dell'executor)
+
+Funziona con entrambi i backend (excel/sqlite): si appoggia ai nomi già
+risolti in database.py.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from . import database as _db
+
+_executor_letture = ThreadPoolExecutor(max_workers=4, thread_name_prefix='db-lettura')
+_executor_scritture = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-scrittura')
+
+
+def _in_executor(executor, funzione):
+    """Wrapper async che esegue funzione nell'executor indicato"""
+    @functools.wraps(funzione)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(funzione, *args, **kwargs))
+    return wrapper
+
+
+def _lettura(funzione):
+    return _in_executor(_executor_letture, funzione)
+
+
+def _scrittura(funzione):
+    return _in_executor(_executor_scritture, funzione)
+
+
+# ==================== USERS ====================
+
+register_user = _scrittura(_db.register_user)
+get_user = _lettura(_db.get_user)
+get_all_users = _lettura(_db.get_all_users)
+
+
+# ==================== TURNI ====================
+
+create_turno = _scrittura(_db.create_turno)
+complete_turno = _scrittura(_db.complete_turno)
+get_turno_in_corso = _lettura(_db.get_turno_in_corso)
+get_all_turni_in_corso = _lettura(_db.get_all_turni_in_corso)
+get_turni_by_date = _lettura(_db.get_turni_by_date)
+get_turni_by_user = _lettura(_db.get_turni_by_user)
+get_all_turni_completati = _lettura(_db.get_all_turni_completati)
+get_turni_completati_oggi = _lettura(_db.get_turni_completati_oggi)
+get_ore_totali_user = _lettura(_db.get_ore_totali_user)
+esporta_turni_excel = _lettura(_db.esporta_turni_excel)
+
+
+# ==================== RICHIESTE ====================
+
+create_richiesta = _scrittura(_db.create_richiesta)
+complete_richiesta = _scrittura(_db.complete_richiesta)
+delete_richieste_completate = _scrittura(_db.delete_richieste_completate)
+update_richiesta_message_id = _scrittura(_db.update_richiesta_message_id)
+get_richiesta = _lettura(_db.get_richiesta)
+get_richieste_non_completate = _lettura(_db.get_richieste_non_completate)
+
+
+# ==================== APPARTAMENTI E MATERIALI ====================
+
+get_appartamento = _lettura(_db.get_appartamento)
+get_appartamento_by_nome = _lettura(_db.get_appartamento_by_nome)
+get_all_appartamenti = _lettura(_db.get_all_appartamenti)
+get_appartamenti_vicini = _lettura(_db.get_appartamenti_vicini)
+get_materiali_pulizie = _lettura(_db.get_materiali_pulizie)
+get_materiali_appartamento = _lettura(_db.get_materiali_appartamento)
+
+
+# ==================== BACKUP ====================
+
+backup_excel = _scrittura(_db.backup_excel)
+
+
+def chiudi():
+    """Attende le scritture in coda e ferma gli executor (shutdown del bot)"""
+    _executor_scritture.shutdown(wait=True)
+    _executor_letture.shutdown(wait=True)
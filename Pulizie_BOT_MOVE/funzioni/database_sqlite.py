@@ -0,0 +1,667 @@
+"""
+Backend SQLite per il bot delle pulizie
+Utenti, turni e richieste su SQLite (WAL) con le STESSE firme di database.py.
+
+Attivato con DATABASE_BACKEND = 'sqlite' in config.py: database.py sostituisce le
+proprie funzioni utenti/turni/richieste con quelle di questo modulo, quindi gli
+handler non cambiano. Appartamenti e materiali restano letti dagli Excel.
+
+Gli Excel users/turni/richieste in Database/ vengono rigenerati periodicamente
+(esporta_excel) per l'ufficio: in questa modalità sono SOLO una copia di lettura,
+le modifiche fatte a mano negli Excel non vengono reimportate.
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+import atexit
+from datetime import datetime
+from typing import Optional, List, Dict
+
+import openpyxl
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from filelock import FileLock
+
+from .config import DATABASE_PATH, EXCEL_EXPORT_INTERVAL_MINUTES
+from .database import (
+    EXCEL_DIR, EXCEL_USERS_PATH, EXCEL_TURNI_PATH, EXCEL_RICHIESTE_PATH, TURNI_COLONNE, RICHIESTE_COLONNE,
+    sanitize_text, can_create_request, get_appartamento, backup_excel as _backup_file_excel,
+)
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = str(DATABASE_PATH)
+
+USERS_COLONNE = ['telegram_id', 'username', 'nome', 'cognome', 'phone', 'created_at']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    telegram_id INTEGER PRIMARY KEY,
+    username TEXT,
+    nome TEXT,
+    cognome TEXT,
+    phone TEXT,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS turni (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_telegram_id INTEGER NOT NULL,
+    user_nome TEXT,
+    user_cognome TEXT,
+    appartamento_id INTEGER,
+    appartamento_nome TEXT,
+    data TEXT,
+    timestamp_ingresso TEXT,
+    timestamp_uscita TEXT,
+    ore_lavorate REAL DEFAULT 0,
+    video_ingresso_path TEXT,
+    video_ingresso_file_id TEXT,
+    video_uscita_path TEXT,
+    video_uscita_file_id TEXT,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turni_user ON turni(user_telegram_id, status);
+CREATE INDEX IF NOT EXISTS idx_turni_data ON turni(data, status);
+CREATE INDEX IF NOT EXISTS idx_turni_status_uscita ON turni(status, timestamp_uscita);
+-- Un solo turno aperto per utente (protegge anche da doppio click concorrente)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_turni_un_solo_aperto
+    ON turni(user_telegram_id) WHERE status = 'in_corso';
+
+CREATE TABLE IF NOT EXISTS richieste (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_telegram_id INTEGER,
+    user_nome TEXT,
+    appartamento_id INTEGER,
+    appartamento_nome TEXT,
+    tipo_richiesta TEXT,
+    descrizione_prodotti TEXT,
+    info_consegna TEXT,
+    completato TEXT NOT NULL DEFAULT 'NO',
+    data_richiesta TEXT,
+    data_completamento TEXT,
+    message_id
+);
+CREATE INDEX IF NOT EXISTS idx_richieste_completato ON richieste(completato);
+"""
+
+# Una connessione per thread (sqlite3 non condivide le connessioni tra thread)
+_local = threading.local()
+_export_thread = None
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Connessione SQLite del thread corrente (WAL, busy timeout 10s)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+    return conn
+
+
+# ==================== DATABASE INITIALIZATION ====================
+
+def init_database():
+    """Crea lo schema SQLite e, al primo avvio, importa i dati dagli Excel esistenti"""
+    os.makedirs(EXCEL_DIR, exist_ok=True)
+    conn = _get_conn()
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+    _importa_da_excel(conn)
+    print(f"✅ Database SQLite inizializzato correttamente ({DB_PATH})")
+
+
+def _righe_excel(path: str, num_colonne: int) -> List[list]:
+    """Legge le righe dati di un Excel (header escluso), normalizzate a num_colonne"""
+    if not os.path.exists(path):
+        return []
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        righe = []
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            if not row or row[0] is None:
+                continue
+            valori = list(row[:num_colonne])
+            valori += [None] * (num_colonne - len(valori))
+            righe.append(valori)
+        return righe
+    finally:
+        wb.close()
+
+
+def _importa_da_excel(conn: sqlite3.Connection):
+    """Import una-tantum: popola le tabelle vuote con il contenuto degli Excel"""
+    tabelle = [
+        ('users', USERS_COLONNE, EXCEL_USERS_PATH),
+        ('turni', TURNI_COLONNE, EXCEL_TURNI_PATH),
+        ('richieste', RICHIESTE_COLONNE, EXCEL_RICHIESTE_PATH),
+    ]
+    for tabella, colonne, path in tabelle:
+        if conn.execute(f"SELECT 1 FROM {tabella} LIMIT 1").fetchone():
+            continue
+        righe = _righe_excel(path, len(colonne))
+        if not righe:
+            continue
+        segnaposto = ', '.join('?' * len(colonne))
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {tabella} ({', '.join(colonne)}) VALUES ({segnaposto})",
+                righe
+            )
+        logger.info(f"Importate {len(righe)} righe da {os.path.basename(path)} in SQLite")
+        print(f"📥 Importate {len(righe)} righe da {os.path.basename(path)}")
+
+
+# ==================== USERS (SQLite) ====================
+
+def _user_dict(row: sqlite3.Row) -> Dict:
+    return {
+        'telegram_id': row['telegram_id'],
+        'username': row['username'],
+        'nome': row['nome'],
+        'cognome': row['cognome'],
+        'phone_number': row['phone'],
+        'created_at': row['created_at']
+    }
+
+
+def register_user(telegram_id: int, username: str, nome: str, cognome: str, phone: str = None) -> bool:
+    """Registra un nuovo utente con validazione"""
+    try:
+        nome = sanitize_text(nome, max_length=50)
+        cognome = sanitize_text(cognome, max_length=50)
+        username = sanitize_text(username or '', max_length=50)
+
+        if len(nome) < 2 or len(cognome) < 2:
+            logger.error(f"Nome/cognome troppo corti: {nome} {cognome}")
+            return False
+
+        conn = _get_conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO users (telegram_id, username, nome, cognome, phone, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (telegram_id, username, nome, cognome, phone or '',
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+        if cur.rowcount == 0:
+            return False
+
+        logger.info(f"Utente registrato: {nome} {cognome} (ID: {telegram_id})")
+        return True
+    except Exception as e:
+        logger.error(f"Errore registrazione utente: {e}", exc_info=True)
+        return False
+
+
+def get_user(telegram_id: int) -> Optional[Dict]:
+    """Ottiene info utente"""
+    try:
+        row = _get_conn().execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+        return _user_dict(row) if row else None
+    except Exception as e:
+        print(f"❌ Errore get_user: {e}")
+        return None
+
+
+def get_all_users() -> List[Dict]:
+    """Ottiene tutti gli utenti"""
+    try:
+        rows = _get_conn().execute("SELECT * FROM users ORDER BY rowid").fetchall()
+        return [_user_dict(row) for row in rows]
+    except Exception as e:
+        print(f"❌ Errore get_all_users: {e}")
+        return []
+
+
+# ==================== TURNI (SQLite) ====================
+
+def create_turno(user_id: int, appartamento_id: int, video_path: str,
+                 video_file_id: str, timestamp: datetime) -> int:
+    """Crea nuovo turno (ingresso) con controllo turno doppio"""
+    try:
+        turno_aperto = get_turno_in_corso(user_id)
+        if turno_aperto:
+            logger.warning(f"Turno già aperto per user {user_id}: {turno_aperto['appartamento_nome']}")
+            raise ValueError(f"Hai già un turno aperto all'appartamento {turno_aperto['appartamento_nome']}")
+
+        user = get_user(user_id)
+        appartamento = get_appartamento(appartamento_id)
+
+        if not user or not appartamento:
+            logger.error(f"User o appartamento non trovato: user_id={user_id}, app_id={appartamento_id}")
+            return 0
+
+        conn = _get_conn()
+        try:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO turni (user_telegram_id, user_nome, user_cognome, appartamento_id, "
+                    "appartamento_nome, data, timestamp_ingresso, timestamp_uscita, ore_lavorate, "
+                    "video_ingresso_path, video_ingresso_file_id, video_uscita_path, video_uscita_file_id, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, '', 0, ?, ?, '', '', 'in_corso')",
+                    (user_id, user['nome'], user['cognome'], appartamento_id, appartamento['nome'],
+                     timestamp.date().strftime('%Y-%m-%d'), timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                     video_path, video_file_id)
+                )
+        except sqlite3.IntegrityError:
+            # Indice univoco: un altro turno è stato aperto nel frattempo
+            turno_aperto = get_turno_in_corso(user_id)
+            nome_app = turno_aperto['appartamento_nome'] if turno_aperto else ''
+            raise ValueError(f"Hai già un turno aperto all'appartamento {nome_app}")
+
+        turno_id = cur.lastrowid
+        logger.info(f"Turno {turno_id} creato: {user['nome']} @ {appartamento['nome']}")
+        return turno_id
+
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Errore create_turno: {e}", exc_info=True)
+        return 0
+
+
+def get_turno_in_corso(user_id: int) -> Optional[Dict]:
+    """Ottiene turno in corso per utente"""
+    try:
+        row = _get_conn().execute(
+            "SELECT * FROM turni WHERE user_telegram_id = ? AND status = 'in_corso' LIMIT 1",
+            (user_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'id': row['id'],
+            'user_telegram_id': row['user_telegram_id'],
+            'nome': row['user_nome'],
+            'cognome': row['user_cognome'],
+            'appartamento_id': row['appartamento_id'],
+            'appartamento_nome': row['appartamento_nome'],
+            'data': row['data'],
+            'timestamp_ingresso': row['timestamp_ingresso'],
+            'timestamp_uscita': row['timestamp_uscita'],
+            'ore_lavorate': row['ore_lavorate'],
+            'video_ingresso_path': row['video_ingresso_path'],
+            'video_ingresso_file_id': row['video_ingresso_file_id'],
+            'video_uscita_path': row['video_uscita_path'],
+            'video_uscita_file_id': row['video_uscita_file_id'],
+            'status': row['status'],
+            'indirizzo': ''  # Non serve, ma per compatibilità
+        }
+    except Exception as e:
+        print(f"❌ Errore get_turno_in_corso: {e}")
+        return None
+
+
+def complete_turno(turno_id: int, video_path: str, video_file_id: str, timestamp: datetime):
+    """Completa turno (uscita) e calcola ore lavorate"""
+    try:
+        conn = _get_conn()
+        with conn:
+            row = conn.execute("SELECT timestamp_ingresso FROM turni WHERE id = ?", (turno_id,)).fetchone()
+            if not row:
+                logger.warning(f"Turno {turno_id} non trovato per completamento")
+                return None
+
+            timestamp_ingresso = datetime.strptime(row['timestamp_ingresso'], '%Y-%m-%d %H:%M:%S')
+            ore_lavorate = (timestamp - timestamp_ingresso).total_seconds() / 3600
+
+            if ore_lavorate > 24:
+                logger.warning(f"Turno {turno_id}: ore lavorate sospette ({ore_lavorate:.2f}h)")
+
+            conn.execute(
+                "UPDATE turni SET timestamp_uscita = ?, ore_lavorate = ?, video_uscita_path = ?, "
+                "video_uscita_file_id = ?, status = 'completato' WHERE id = ?",
+                (timestamp.strftime('%Y-%m-%d %H:%M:%S'), round(ore_lavorate, 2),
+                 video_path, video_file_id, turno_id)
+            )
+
+        logger.info(f"Turno {turno_id} completato: {ore_lavorate:.2f}h")
+        return ore_lavorate
+    except Exception as e:
+        logger.error(f"Errore complete_turno: {e}", exc_info=True)
+        return None
+
+
+def get_turni_by_date(data: datetime.date) -> List[Dict]:
+    """Ottiene tutti i turni di una data"""
+    try:
+        rows = _get_conn().execute(
+            "SELECT * FROM turni WHERE data = ? ORDER BY id", (data.strftime('%Y-%m-%d'),)
+        ).fetchall()
+        return [{
+            'id': r['id'],
+            'user_telegram_id': r['user_telegram_id'],
+            'nome': r['user_nome'],
+            'cognome': r['user_cognome'],
+            'appartamento_nome': r['appartamento_nome'],
+            'data': r['data'],
+            'timestamp_ingresso': r['timestamp_ingresso'],
+            'timestamp_uscita': r['timestamp_uscita'],
+            'ore_lavorate': r['ore_lavorate'],
+            'status': r['status']
+        } for r in rows]
+    except Exception as e:
+        print(f"❌ Errore get_turni_by_date: {e}")
+        return []
+
+
+def get_turni_by_user(user_id: int, data_inizio: datetime.date = None,
+                      data_fine: datetime.date = None) -> List[Dict]:
+    """Ottiene turni di un utente in un periodo"""
+    try:
+        query = "SELECT * FROM turni WHERE user_telegram_id = ?"
+        params = [user_id]
+        # Le date sono salvate come 'YYYY-MM-DD': il confronto tra stringhe è corretto
+        if data_inizio:
+            query += " AND data >= ?"
+            params.append(data_inizio.strftime('%Y-%m-%d'))
+        if data_fine:
+            query += " AND data <= ?"
+            params.append(data_fine.strftime('%Y-%m-%d'))
+
+        rows = _get_conn().execute(query + " ORDER BY id", params).fetchall()
+        return [{
+            'id': r['id'],
+            'appartamento_nome': r['appartamento_nome'],
+            'data': r['data'],
+            'timestamp_ingresso': r['timestamp_ingresso'],
+            'timestamp_uscita': r['timestamp_uscita'],
+            'ore_lavorate': r['ore_lavorate'],
+            'status': r['status']
+        } for r in rows]
+    except Exception as e:
+        print(f"❌ Errore get_turni_by_user: {e}")
+        return []
+
+
+def get_all_turni_in_corso() -> List[Dict]:
+    """Ottiene tutti i turni in corso"""
+    try:
+        rows = _get_conn().execute("SELECT * FROM turni WHERE status = 'in_corso' ORDER BY id").fetchall()
+        return [{
+            'id': r['id'],
+            'user_id': r['user_telegram_id'],
+            'nome': r['user_nome'],
+            'cognome': r['user_cognome'],
+            'appartamento_id': r['appartamento_id'],
+            'appartamento_nome': r['appartamento_nome'],
+            'data': r['data'],
+            'timestamp_ingresso': r['timestamp_ingresso'],
+            'video_ingresso': r['video_ingresso_path']
+        } for r in rows]
+    except Exception as e:
+        print(f"❌ Errore get_all_turni_in_corso: {e}")
+        return []
+
+
+def _turno_completato_dict(r: sqlite3.Row) -> Dict:
+    return {
+        'id': r['id'],
+        'user_id': r['user_telegram_id'],
+        'nome': r['user_nome'],
+        'cognome': r['user_cognome'],
+        'appartamento_id': r['appartamento_id'],
+        'appartamento_nome': r['appartamento_nome'],
+        'data': r['data'],
+        'timestamp_ingresso': r['timestamp_ingresso'],
+        'timestamp_uscita': r['timestamp_uscita'],
+        'ore_lavorate': r['ore_lavorate'],
+        'video_ingresso': r['video_ingresso_path'],
+        'video_uscita': r['video_uscita_path']
+    }
+
+
+def get_all_turni_completati(limit: int = 50) -> List[Dict]:
+    """Ottiene tutti i turni completati (ultimi N)"""
+    try:
+        rows = _get_conn().execute(
+            "SELECT * FROM turni WHERE status = 'completato' "
+            "ORDER BY timestamp_uscita DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [_turno_completato_dict(r) for r in rows]
+    except Exception as e:
+        print(f"❌ Errore get_all_turni_completati: {e}")
+        return []
+
+
+def get_turni_completati_oggi() -> List[Dict]:
+    """Ottiene tutti i turni completati oggi"""
+    try:
+        rows = _get_conn().execute(
+            "SELECT * FROM turni WHERE data = ? AND status = 'completato' "
+            "ORDER BY timestamp_uscita DESC", (datetime.now().strftime('%Y-%m-%d'),)
+        ).fetchall()
+        return [_turno_completato_dict(r) for r in rows]
+    except Exception as e:
+        print(f"❌ Errore get_turni_completati_oggi: {e}")
+        return []
+
+
+# ==================== RICHIESTE PRODOTTI (SQLite) ====================
+
+def _richiesta_dict(r: sqlite3.Row) -> Dict:
+    """Campi comuni delle richieste (come letti da richieste_prodotti.xlsx)"""
+    user_nome = r['user_nome']
+    return {
+        'id': r['id'],
+        'user_nome_completo': user_nome,
+        'nome': user_nome.split()[0] if user_nome else '',
+        'cognome': ' '.join(user_nome.split()[1:]) if user_nome else '',
+        'appartamento_id': r['appartamento_id'],
+        'appartamento_nome': r['appartamento_nome'],
+        'tipo_richiesta': r['tipo_richiesta'],
+        'descrizione_prodotti': r['descrizione_prodotti'],
+        'info_consegna': r['info_consegna'],
+        'data_richiesta': r['data_richiesta'],
+        'message_id': r['message_id']
+    }
+
+
+def create_richiesta(user_id: int, appartamento_id: int, descrizione: str,
+                     tipo_richiesta: str = 'generico', info_consegna: str = '',
+                     turno_id: int = None, message_id: int = None) -> int:
+    """Crea nuova richiesta prodotti con rate limiting
+
+    Args:
+        tipo_richiesta: 'pulizie' | 'appartamento' | 'generico'
+        info_consegna: Info su luogo e data consegna (opzionale)
+    """
+    try:
+        if not can_create_request(user_id, cooldown_seconds=30):
+            logger.warning(f"Rate limit superato per user {user_id}")
+            raise ValueError("⚠️ Aspetta almeno 30 secondi prima di inviare un'altra richiesta")
+
+        user = get_user(user_id)
+        appartamento = get_appartamento(appartamento_id)
+
+        if not user or not appartamento:
+            logger.error(f"User o appartamento non trovato: user_id={user_id}, app_id={appartamento_id}")
+            return 0
+
+        descrizione = sanitize_text(descrizione, max_length=500)
+        if len(descrizione) < 3:
+            logger.warning(f"Descrizione troppo corta: '{descrizione}'")
+            raise ValueError("⚠️ Descrizione troppo corta (minimo 3 caratteri)")
+
+        info_consegna = sanitize_text(info_consegna, max_length=300)
+
+        conn = _get_conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO richieste (user_telegram_id, user_nome, appartamento_id, appartamento_nome, "
+                "tipo_richiesta, descrizione_prodotti, info_consegna, completato, data_richiesta, "
+                "data_completamento, message_id) VALUES (?, ?, ?, ?, ?, ?, ?, 'NO', ?, '', ?)",
+                (user_id, f"{user['nome']} {user['cognome']}", appartamento_id, appartamento['nome'],
+                 tipo_richiesta, descrizione, info_consegna,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message_id or '')
+            )
+
+        richiesta_id = cur.lastrowid
+        logger.info(f"Richiesta {richiesta_id} creata: {user['nome']} @ {appartamento['nome']}")
+        return richiesta_id
+
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Errore create_richiesta: {e}", exc_info=True)
+        return 0
+
+
+def get_richieste_non_completate() -> List[Dict]:
+    """Ottiene tutte le richieste non completate"""
+    try:
+        rows = _get_conn().execute("SELECT * FROM richieste WHERE completato = 'NO' ORDER BY id").fetchall()
+        richieste = []
+        for r in rows:
+            richiesta = _richiesta_dict(r)
+            richiesta['user_telegram_id'] = r['user_telegram_id']
+            richiesta['completato'] = False
+            richieste.append(richiesta)
+        return richieste
+    except Exception as e:
+        print(f"❌ Errore get_richieste_non_completate: {e}")
+        return []
+
+
+def complete_richiesta(richiesta_id: int):
+    """Segna richiesta come completata"""
+    try:
+        conn = _get_conn()
+        with conn:
+            cur = conn.execute(
+                "UPDATE richieste SET completato = 'SI', data_completamento = ? WHERE id = ?",
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), richiesta_id)
+            )
+        if cur.rowcount:
+            logger.info(f"Richiesta {richiesta_id} completata")
+    except Exception as e:
+        logger.error(f"Errore complete_richiesta: {e}", exc_info=True)
+
+
+def delete_richieste_completate():
+    """Elimina tutte le richieste completate"""
+    try:
+        conn = _get_conn()
+        with conn:
+            cur = conn.execute("DELETE FROM richieste WHERE completato = 'SI'")
+        logger.info(f"Eliminate {cur.rowcount} richieste completate")
+        return cur.rowcount
+    except Exception as e:
+        logger.error(f"Errore delete_richieste_completate: {e}", exc_info=True)
+        return 0
+
+
+def get_richiesta(richiesta_id: int) -> Optional[Dict]:
+    """Ottiene dettagli richiesta"""
+    try:
+        r = _get_conn().execute("SELECT * FROM richieste WHERE id = ?", (richiesta_id,)).fetchone()
+        if not r:
+            return None
+        richiesta = _richiesta_dict(r)
+        richiesta['telegram_id'] = r['user_telegram_id']
+        richiesta['completato'] = r['completato'] == 'SI'
+        return richiesta
+    except Exception as e:
+        print(f"❌ Errore get_richiesta: {e}")
+        return None
+
+
+def update_richiesta_message_id(richiesta_id: int, message_id: int):
+    """Aggiorna il message_id Telegram della richiesta per edit successivo"""
+    try:
+        conn = _get_conn()
+        with conn:
+            cur = conn.execute("UPDATE richieste SET message_id = ? WHERE id = ?", (message_id, richiesta_id))
+        if cur.rowcount:
+            logger.info(f"Message ID {message_id} salvato per richiesta {richiesta_id}")
+    except Exception as e:
+        logger.error(f"Errore update_richiesta_message_id: {e}", exc_info=True)
+
+
+# ==================== EXPORT EXCEL PER L'UFFICIO ====================
+
+def _scrivi_excel(path: str, titolo: str, colonne: List[str], righe) -> None:
+    """Rigenera un file Excel in modo atomico (file temporaneo + replace sotto FileLock)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titolo)
+    header = []
+    for nome in colonne:
+        cell = WriteOnlyCell(ws, value=nome)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    for riga in righe:
+        ws.append(list(riga))
+
+    tmp_path = f"{path}.tmp"
+    wb.save(tmp_path)
+    with FileLock(f"{path}.lock", timeout=10):
+        os.replace(tmp_path, path)
+
+
+def esporta_excel() -> bool:
+    """Esporta users/turni/richieste da SQLite negli Excel condivisi in Database/"""
+    try:
+        conn = _get_conn()
+        _scrivi_excel(EXCEL_USERS_PATH, "Users", USERS_COLONNE,
+                      conn.execute(f"SELECT {', '.join(USERS_COLONNE)} FROM users ORDER BY rowid"))
+        _scrivi_excel(EXCEL_TURNI_PATH, "Turni", TURNI_COLONNE,
+                      conn.execute(f"SELECT {', '.join(TURNI_COLONNE)} FROM turni ORDER BY id"))
+        _scrivi_excel(EXCEL_RICHIESTE_PATH, "Richieste", RICHIESTE_COLONNE,
+                      conn.execute(f"SELECT {', '.join(RICHIESTE_COLONNE)} FROM richieste ORDER BY id"))
+        logger.info("Export Excel da SQLite completato")
+        return True
+    except Exception as e:
+        logger.error(f"Errore export Excel da SQLite: {e}", exc_info=True)
+        return False
+
+
+def avvia_export_periodico(intervallo_minuti: int = EXCEL_EXPORT_INTERVAL_MINUTES):
+    """Avvia il thread che rigenera gli Excel ogni N minuti (e una volta all'uscita)"""
+    global _export_thread
+
+    if _export_thread is not None:
+        return
+
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(intervallo_minuti * 60):
+            esporta_excel()
+
+    _export_thread = threading.Thread(target=loop, name='export-excel', daemon=True)
+    _export_thread.start()
+    atexit.register(esporta_excel)
+    atexit.register(stop.set)
+    logger.info(f"Export Excel periodico attivo (ogni {intervallo_minuti} minuti)")
+
+
+def backup_excel():
+    """Backup in modalità SQLite: copia consistente del .db + export e backup degli Excel"""
+    try:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        backup_dir = os.path.join(EXCEL_DIR, 'backups')
+        os.makedirs(backup_dir, exist_ok=True)
+
+        backup_path = os.path.join(backup_dir, f"{os.path.basename(DB_PATH)}.{timestamp}.bak")
+        dest = sqlite3.connect(backup_path)
+        try:
+            _get_conn().backup(dest)
+        finally:
+            dest.close()
+        logger.info(f"Backup creato: {backup_path}")
+
+        esporta_excel()
+        return 1 + _backup_file_excel()
+    except Exception as e:
+        logger.error(f"Errore durante backup: {e}")
+        return 0
@@ -0,0 +1,107 @@
+"""
+Cache persistente del geocoding (file JSON)
+
+Chiave = indirizzo normalizzato, valore = coordinate trovate oppure None
+("indirizzo non trovato", cache negativa). Ogni voce ha la data di scrittura
+e scade dopo il suo TTL: i risultati positivi durano a lungo, quelli negativi
+poco, così un indirizzo corretto in Excel viene ritentato presto.
+
+Formato file:
+    {"via roma 1 modena": {"coords": [44.64, 10.92], "ts": 1700000000.0}, ...}
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Optional, Tuple
+
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+# Sentinella per distinguere "non in cache" da "in cache come non trovato"
+MANCANTE = object()
+
+
+def normalizza_indirizzo(indirizzo: str) -> str:
+    """Chiave di cache: minuscolo, spazi e punteggiatura compattati"""
+    if not indirizzo:
+        return ''
+    testo = re.sub(r'[\s,;.]+', ' ', str(indirizzo).lower())
+    return testo.strip()
+
+
+class CacheGeocoding:
+    """Cache indirizzo -> coordinate su disco, thread-safe"""
+
+    def __init__(self, path: str, ttl_secondi: float, ttl_negativo_secondi: float):
+        self.path = str(path)
+        self.ttl = ttl_secondi
+        self.ttl_negativo = ttl_negativo_secondi
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.path}.lock", timeout=10)
+        self._voci = None
+
+    def _carica(self):
+        if self._voci is not None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._voci = json.load(f)
+        except FileNotFoundError:
+            self._voci = {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Cache geocoding illeggibile, si riparte vuota: {e}")
+            self._voci = {}
+
+    def _salva(self):
+        tmp_path = f"{self.path}.tmp"
+        with self._file_lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._voci, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def get(self, indirizzo: str):
+        """
+        Coordinate in cache per l'indirizzo.
+
+        Returns:
+            (lat, lon), None se l'indirizzo è noto come non trovato,
+            MANCANTE se non è in cache o la voce è scaduta
+        """
+        chiave = normalizza_indirizzo(indirizzo)
+        if not chiave:
+            return MANCANTE
+
+        with self._lock:
+            self._carica()
+            voce = self._voci.get(chiave)
+
+        if voce is None:
+            return MANCANTE
+
+        coords = voce.get('coords')
+        ttl = self.ttl if coords else self.ttl_negativo
+        if time.time() - voce.get('ts', 0) > ttl:
+            return MANCANTE
+        return tuple(coords) if coords else None
+
+    def set(self, indirizzo: str, coords: Optional[Tuple[float, float]]):
+        """Salva un risultato (coords=None per "indirizzo non trovato")"""
+        chiave = normalizza_indirizzo(indirizzo)
+        if not chiave:
+            return
+
+        with self._lock:
+            self._carica()
+            self._voci[chiave] = {
+                'coords': [coords[0], coords[1]] if coords else None,
+                'ts': time.time()
+            }
+            try:
+                self._salva()
+            except Exception as e:
+                logger.error(f"Errore salvataggio cache geocoding: {e}")
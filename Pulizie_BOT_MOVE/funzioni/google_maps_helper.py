@@ -3,41 +3,159 @@ Google Maps API Helper
 Geocoding e calcolo distanze utilizzando Google Maps Platform
 """
 
-import requests
+import queue
+import threading
 from typing import Optional, Tuple
-from .config import GOOGLE_MAPS_API_KEY
+from .config import (GOOGLE_MAPS_API_KEY, GEOCODE_CACHE_PATH,
+                     GEOCODE_CACHE_TTL_GIORNI, GEOCODE_CACHE_TTL_NEGATIVO_GIORNI)
+from .geocode_cache import CacheGeocoding, MANCANTE, normalizza_indirizzo
+from .http_client import client_http
 
 
-def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+# ==================== CACHE GEOCODING ====================
+
+geocode_cache = CacheGeocoding(
+    GEOCODE_CACHE_PATH,
+    ttl_secondi=GEOCODE_CACHE_TTL_GIORNI * 86400,
+    ttl_negativo_secondi=GEOCODE_CACHE_TTL_NEGATIVO_GIORNI * 86400
+)
+
+# Indirizzi da geocodificare in background (mai sul percorso delle richieste utente)
+_coda_geocoding = queue.Queue()
+_in_coda = set()
+_in_coda_lock = threading.Lock()
+_worker_geocoding = None
+
+
+def _worker_geocoding_loop():
+    while True:
+        indirizzo = _coda_geocoding.get()
+        try:
+            if geocode_cache.get(indirizzo) is MANCANTE:
+                coords = geocode_address(indirizzo)
+                if coords:
+                    print(f"✅ Geocoding in background: {indirizzo} -> {coords}")
+        except Exception as e:
+            print(f"❌ Errore geocoding in background: {e}")
+        finally:
+            with _in_coda_lock:
+                _in_coda.discard(normalizza_indirizzo(indirizzo))
+            _coda_geocoding.task_done()
+
+
+def accoda_geocoding(indirizzo: str):
+    """Mette un indirizzo in coda per il geocoding in background (senza duplicati)"""
+    global _worker_geocoding
+    
+    chiave = normalizza_indirizzo(indirizzo)
+    if not chiave or not GOOGLE_MAPS_API_KEY:
+        return
+    
+    with _in_coda_lock:
+        if chiave in _in_coda:
+            return
+        _in_coda.add(chiave)
+        
+        if _worker_geocoding is None or not _worker_geocoding.is_alive():
+            _worker_geocoding = threading.Thread(
+                target=_worker_geocoding_loop, name='geocoding-background', daemon=True
+            )
+            _worker_geocoding.start()
+    
+    _coda_geocoding.put(indirizzo)
+
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+NEARBY_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+
+
+# ==================== GEOCODING ====================
+
+def _params_geocode(address: str) -> dict:
+    return {
+        'address': address,
+        'key': GOOGLE_MAPS_API_KEY
+    }
+
+
+def _risultato_geocode(address: str, data: dict) -> Optional[Tuple[float, float]]:
+    """Estrae le coordinate dalla risposta e aggiorna la cache"""
+    if data['status'] == 'OK' and len(data['results']) > 0:
+        location = data['results'][0]['geometry']['location']
+        coords = (location['lat'], location['lng'])
+        geocode_cache.set(address, coords)
+        return coords
+    else:
+        print(f"⚠️ Geocoding fallito per '{address}': {data['status']}")
+        if data['status'] == 'ZERO_RESULTS':
+            # Indirizzo inesistente: cache negativa (errori temporanei/quota si ritentano)
+            geocode_cache.set(address, None)
+        return None
+
+
+def geocode_address(address: str, usa_cache: bool = True) -> Optional[Tuple[float, float]]:
     """
     Converte un indirizzo in coordinate GPS usando Google Geocoding API
+    Il risultato (anche "non trovato") viene salvato nella cache su disco.
+    Chiamata bloccante: dagli handler usare solo la cache (enrich_appartamenti_with_geocoding).
     Returns: (lat, lon) oppure None
     """
+    if usa_cache:
+        cached = geocode_cache.get(address)
+        if cached is not MANCANTE:
+            return cached
+    
     if not GOOGLE_MAPS_API_KEY:
         print("⚠️ Google Maps API key non configurata")
         return None
     
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {
-        'address': address,
-        'key': GOOGLE_MAPS_API_KEY
-    }
-    
     try:
-        response = requests.get(url, params=params, timeout=5)
-        data = response.json()
-        
-        if data['status'] == 'OK' and len(data['results']) > 0:
-            location = data['results'][0]['geometry']['location']
-            return (location['lat'], location['lng'])
-        else:
-            print(f"⚠️ Geocoding fallito per '{address}': {data['status']}")
-            return None
+        data = client_http.get_json_sync(GEOCODE_URL, params=_params_geocode(address), timeout=5)
+        return _risultato_geocode(address, data)
     except Exception as e:
         print(f"❌ Errore geocoding: {e}")
         return None
 
 
+# ==================== DISTANCE MATRIX ====================
+
+def _params_distance_matrix(origins: list, destinations: list) -> dict:
+    # Converti coordinate in formato "lat,lon"
+    def format_location(loc):
+        if isinstance(loc, tuple):
+            return f"{loc[0]},{loc[1]}"
+        return str(loc)
+    
+    return {
+        'origins': "|".join([format_location(o) for o in origins]),
+        'destinations': "|".join([format_location(d) for d in destinations]),
+        'mode': 'driving',  # driving, walking, bicycling, transit
+        'language': 'it',
+        'key': GOOGLE_MAPS_API_KEY
+    }
+
+
+def _risultato_distance_matrix(data: dict) -> dict:
+    if data['status'] == 'OK':
+        results = []
+        for row in data['rows']:
+            for element in row['elements']:
+                if element['status'] == 'OK':
+                    results.append({
+                        'distance_meters': element['distance']['value'],
+                        'distance_text': element['distance']['text'],
+                        'duration_seconds': element['duration']['value'],
+                        'duration_text': element['duration']['text']
+                    })
+                else:
+                    results.append(None)
+        return {'results': results, 'raw': data}
+    else:
+        print(f"⚠️ Distance Matrix fallito: {data['status']}")
+        return {}
+
+
 def get_distance_matrix(origins: list, destinations: list) -> dict:
     """
     Calcola distanze e tempi di percorrenza tra più origini e destinazioni
@@ -54,50 +172,44 @@ def get_distance_matrix(origins: list, destinations: list) -> dict:
         print("⚠️ Google Maps API key non configurata")
         return {}
     
-    # Converti coordinate in formato "lat,lon"
-    def format_location(loc):
-        if isinstance(loc, tuple):
-            return f"{loc[0]},{loc[1]}"
-        return str(loc)
-    
-    origins_str = "|".join([format_location(o) for o in origins])
-    destinations_str = "|".join([format_location(d) for d in destinations])
-    
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    params = {
-        'origins': origins_str,
-        'destinations': destinations_str,
-        'mode': 'driving',  # driving, walking, bicycling, transit
-        'language': 'it',
-        'key': GOOGLE_MAPS_API_KEY
-    }
-    
     try:
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if data['status'] == 'OK':
-            results = []
-            for row in data['rows']:
-                for element in row['elements']:
-                    if element['status'] == 'OK':
-                        results.append({
-                            'distance_meters': element['distance']['value'],
-                            'distance_text': element['distance']['text'],
-                            'duration_seconds': element['duration']['value'],
-                            'duration_text': element['duration']['text']
-                        })
-                    else:
-                        results.append(None)
-            return {'results': results, 'raw': data}
-        else:
-            print(f"⚠️ Distance Matrix fallito: {data['status']}")
-            return {}
+        data = client_http.get_json_sync(DISTANCE_MATRIX_URL, params=_params_distance_matrix(origins, destinations))
+        return _risultato_distance_matrix(data)
     except Exception as e:
         print(f"❌ Errore Distance Matrix: {e}")
         return {}
 
 
+# ==================== PLACES ====================
+
+def _params_nearby(lat: float, lon: float, radius: int, place_type: str) -> dict:
+    return {
+        'location': f"{lat},{lon}",
+        'radius': radius,
+        'type': place_type,
+        'language': 'it',
+        'key': GOOGLE_MAPS_API_KEY
+    }
+
+
+def _risultato_nearby(data: dict) -> list:
+    if data['status'] == 'OK':
+        places = []
+        for place in data['results']:
+            places.append({
+                'name': place.get('name'),
+                'address': place.get('vicinity'),
+                'lat': place['geometry']['location']['lat'],
+                'lon': place['geometry']['location']['lng'],
+                'rating': place.get('rating'),
+                'place_id': place.get('place_id')
+            })
+        return places
+    else:
+        print(f"⚠️ Nearby search fallito: {data['status']}")
+        return []
+
+
 def get_nearby_places(lat: float, lon: float, radius: int = 500, place_type: str = 'point_of_interest') -> list:
     """
     Trova luoghi nelle vicinanze usando Google Places API
@@ -114,43 +226,24 @@ def get_nearby_places(lat: float, lon: float, radius: int = 500, place_type: str
         print("⚠️ Google Maps API key non configurata")
         return []
     
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        'location': f"{lat},{lon}",
-        'radius': radius,
-        'type': place_type,
-        'language': 'it',
-        'key': GOOGLE_MAPS_API_KEY
-    }
-    
     try:
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if data['status'] == 'OK':
-            places = []
-            for place in data['results']:
-                places.append({
-                    'name': place.get('name'),
-                    'address': place.get('vicinity'),
-                    'lat': place['geometry']['location']['lat'],
-                    'lon': place['geometry']['location']['lng'],
-                    'rating': place.get('rating'),
-                    'place_id': place.get('place_id')
-                })
-            return places
-        else:
-            print(f"⚠️ Nearby search fallito: {data['status']}")
-            return []
+        data = client_http.get_json_sync(NEARBY_URL, params=_params_nearby(lat, lon, radius, place_type))
+        return _risultato_nearby(data)
     except Exception as e:
         print(f"❌ Errore nearby search: {e}")
         return []
 
 
+# ==================== APPARTAMENTI ====================
+
 def enrich_appartamenti_with_geocoding(appartamenti: list) -> list:
     """
     Arricchisce lista appartamenti con coordinate GPS ottenute da indirizzi
     Se un appartamento ha già coordinate, le mantiene.
+    
+    Usa solo la cache su disco, senza chiamate di rete: gli indirizzi non
+    ancora in cache vengono accodati al geocoding in background e saranno
+    disponibili dalle richieste successive.
     """
     if not GOOGLE_MAPS_API_KEY:
         return appartamenti
@@ -159,28 +252,46 @@ def enrich_appartamenti_with_geocoding(appartamenti: list) -> list:
     for app in appartamenti:
         app_copy = dict(app)
         
-        # Se non ha coordinate o sono vuote, prova geocoding
+        # Se non ha coordinate o sono vuote, cerca nella cache del geocoding
         if not app.get('coordinate') or app['coordinate'] == '':
             if app.get('indirizzo'):
-                print(f"🔍 Geocoding: {app['nome']} - {app['indirizzo']}")
-                coords = geocode_address(app['indirizzo'])
-                if coords:
+                coords = geocode_cache.get(app['indirizzo'])
+                if coords is MANCANTE:
+                    accoda_geocoding(app['indirizzo'])
+                elif coords:
                     app_copy['coordinate'] = f"{coords[0]},{coords[1]}"
                     app_copy['geocoded'] = True
-                    print(f"✅ Coordinate trovate: {coords}")
         
         enriched.append(app_copy)
     
     return enriched
 
 
+def precarica_geocoding(appartamenti: list) -> int:
+    """
+    Accoda in background il geocoding degli appartamenti senza coordinate
+    non ancora in cache (da chiamare all'avvio del bot).
+    Returns: numero di indirizzi accodati
+    """
+    if not GOOGLE_MAPS_API_KEY:
+        return 0
+    
+    accodati = 0
+    for app in appartamenti:
+        if (not app.get('coordinate')) and app.get('indirizzo'):
+            if geocode_cache.get(app['indirizzo']) is MANCANTE:
+                accoda_geocoding(app['indirizzo'])
+                accodati += 1
+    return accodati
+
+
 if __name__ == '__main__':
     # Test API
     print("🗺️  Test Google Maps API\n")
     
     # Test Geocoding
     print("1️⃣ Geocoding indirizzo...")
-    coords = geocode_address("Via Roma 1, Milano")
+    coords = geocode_address("Via Roma 1, Milano", usa_cache=False)
     if coords:
         print(f"   ✅ Coordinate: {coords}")
     
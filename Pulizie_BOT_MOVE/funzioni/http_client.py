@@ -0,0 +1,88 @@
+"""
+Client HTTP condiviso per le API esterne (Google Maps)
+
+ClientHttp.get_json_sync() (requests.Session) è usato dagli script e dal
+thread di geocoding in background (gli handler Telegram leggono solo la
+cache): riusa le connessioni (keep-alive), limita le richieste
+contemporanee e ritenta con backoff esponenziale su errori di rete,
+HTTP 429 e 5xx.
+"""
+
+import time
+import random
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Status HTTP per cui ha senso ritentare
+STATUS_RITENTABILI = {429, 500, 502, 503, 504}
+
+
+class ClientHttp:
+    """Client HTTP con pool di connessioni, concorrenza limitata e retry"""
+
+    def __init__(self, max_connessioni: int = 10, max_concorrenti: int = 5,
+                 tentativi: int = 3, backoff_base: float = 0.5, timeout: float = 10):
+        self.max_connessioni = max_connessioni
+        self.max_concorrenti = max_concorrenti
+        self.tentativi = tentativi
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._semaforo_sync = threading.BoundedSemaphore(max_concorrenti)
+
+    def _attesa(self, tentativo: int) -> float:
+        """Backoff esponenziale con un po' di jitter"""
+        return self.backoff_base * (2 ** tentativo) * (1 + random.random() * 0.25)
+
+    # ==================== SYNC ====================
+
+    def _prepara_sync(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_connessioni,
+                                      pool_maxsize=self.max_connessioni)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def get_json_sync(self, url: str, params: dict = None, timeout: float = None) -> dict:
+        """
+        GET che restituisce il JSON della risposta.
+        Solleva l'ultima eccezione se tutti i tentativi falliscono.
+        """
+        session = self._prepara_sync()
+
+        for tentativo in range(self.tentativi):
+            try:
+                with self._semaforo_sync:
+                    response = session.get(url, params=params, timeout=timeout or self.timeout)
+                if response.status_code in STATUS_RITENTABILI and tentativo < self.tentativi - 1:
+                    logger.warning(f"HTTP {response.status_code} da {url}, nuovo tentativo")
+                else:
+                    response.raise_for_status()
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if tentativo == self.tentativi - 1:
+                    raise
+                logger.warning(f"Errore di rete verso {url} ({e}), nuovo tentativo")
+            time.sleep(self._attesa(tentativo))
+
+    def chiudi(self):
+        """Chiude le connessioni keep-alive (da chiamare allo shutdown del bot)"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+# Istanza condivisa da tutto il bot
+client_http = ClientHttp()
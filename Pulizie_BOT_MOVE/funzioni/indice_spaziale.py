@@ -0,0 +1,76 @@
+"""
+Indice spaziale a griglia per la ricerca "appartamenti vicini"
+
+I punti vengono divisi in celle lat/lon di lato ~cella_metri. Una ricerca entro
+un raggio controlla solo le celle che intersecano il cerchio (di solito 3x3),
+quindi il costo dipende dagli appartamenti nella zona e non dal totale.
+Le coordinate sono tenute in array float64 e le distanze dei candidati sono
+calcolate in un solo passaggio vettoriale (utils.distanze_haversine).
+"""
+
+import math
+from typing import List, Tuple, Any, Dict
+
+import numpy as np
+
+from .utils import distanze_haversine
+
+METRI_PER_GRADO_LAT = 111320.0
+
+
+class IndiceSpaziale:
+    """Griglia lat/lon costruita una volta sola su una lista di punti"""
+
+    def __init__(self, punti: List[Tuple[float, float, Any]], cella_metri: float = 300):
+        """
+        Args:
+            punti: lista di (lat, lon, oggetto)
+            cella_metri: lato indicativo della cella (conviene ~ raggio di ricerca tipico)
+        """
+        self.lats = np.array([p[0] for p in punti], dtype=np.float64)
+        self.lons = np.array([p[1] for p in punti], dtype=np.float64)
+        self.oggetti = [p[2] for p in punti]
+
+        self.cella_lat = cella_metri / METRI_PER_GRADO_LAT
+        # Larghezza in longitudine calcolata alla latitudine media dei punti
+        lat_media = float(self.lats.mean()) if punti else 0.0
+        self.cella_lon = cella_metri / (METRI_PER_GRADO_LAT * max(math.cos(math.radians(lat_media)), 0.01))
+
+        celle: Dict[Tuple[int, int], List[int]] = {}
+        for i, (lat, lon) in enumerate(zip(self.lats, self.lons)):
+            celle.setdefault(self._cella(lat, lon), []).append(i)
+        self._celle = {k: np.array(v, dtype=np.intp) for k, v in celle.items()}
+
+    def _cella(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cella_lat), math.floor(lon / self.cella_lon))
+
+    def entro_raggio(self, lat: float, lon: float, raggio_metri: float) -> List[Tuple[float, Any]]:
+        """
+        Tutti i punti entro raggio_metri da (lat, lon), ordinati per distanza.
+
+        Returns:
+            lista di (distanza_metri, oggetto)
+        """
+        if not self._celle:
+            return []
+
+        # Estensione del cerchio in gradi (in longitudine dipende dalla latitudine)
+        d_lat = raggio_metri / METRI_PER_GRADO_LAT
+        cos_lat = math.cos(math.radians(lat))
+        if cos_lat < 0.01:
+            candidati = np.arange(len(self.oggetti))
+        else:
+            d_lon = raggio_metri / (METRI_PER_GRADO_LAT * cos_lat)
+            r_min, c_min = self._cella(lat - d_lat, lon - d_lon)
+            r_max, c_max = self._cella(lat + d_lat, lon + d_lon)
+            blocchi = [self._celle[(r, c)]
+                       for r in range(r_min, r_max + 1)
+                       for c in range(c_min, c_max + 1)
+                       if (r, c) in self._celle]
+            if not blocchi:
+                return []
+            candidati = np.concatenate(blocchi)
+
+        distanze, ordine = distanze_haversine(lat, lon, self.lats[candidati], self.lons[candidati])
+        return [(float(distanze[k]), self.oggetti[candidati[k]])
+                for k in ordine if distanze[k] <= raggio_metri]
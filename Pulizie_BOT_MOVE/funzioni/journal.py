@@ -0,0 +1,103 @@
+"""
+Journal append-only delle scritture (JSON lines)
+
+Ogni scrittura è una riga JSON aggiunta in fondo al file e resa persistente con
+fsync prima di restituire il controllo. Il file viene poi "compattato" negli
+Excel da database.py (compatta_journal) e svuotato.
+
+Rotazione per la compattazione:
+    journal.jsonl  ->  journal.jsonl.compacting  (voci in corso di compattazione)
+Le nuove scritture continuano su un journal.jsonl nuovo. Se il processo si
+interrompe a metà, il file .compacting resta su disco e viene ripreso al giro
+successivo (le voci sono idempotenti: insert per id, update per campi).
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Journal append-only con fsync, thread-safe"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.path_compattazione = f"{path}.compacting"
+        self._lock = threading.Lock()
+        self._file = None
+
+    def append(self, voce: Dict):
+        """Aggiunge una voce e attende che sia su disco (flush + fsync)"""
+        riga = json.dumps(voce, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(riga)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def leggi(path: str) -> List[Dict]:
+        """Legge le voci di un file journal (ignora un'eventuale ultima riga troncata)"""
+        if not os.path.exists(path):
+            return []
+
+        voci = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for num, riga in enumerate(f, start=1):
+                riga = riga.strip()
+                if not riga:
+                    continue
+                try:
+                    voci.append(json.loads(riga))
+                except json.JSONDecodeError:
+                    logger.warning(f"Riga journal non valida ignorata ({os.path.basename(path)}:{num})")
+        return voci
+
+    def voci(self) -> List[Dict]:
+        """Tutte le voci non ancora confermate nello snapshot, in ordine di scrittura"""
+        with self._lock:
+            return self.leggi(self.path_compattazione) + self.leggi(self.path)
+
+    def ha_voci(self) -> bool:
+        """True se ci sono voci da compattare"""
+        for path in (self.path_compattazione, self.path):
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                return True
+        return False
+
+    def ruota(self) -> Optional[str]:
+        """
+        Prepara un blocco di voci da compattare e ne restituisce il path.
+        Se è rimasto un .compacting da un giro precedente viene restituito quello.
+        """
+        with self._lock:
+            if os.path.exists(self.path_compattazione):
+                return self.path_compattazione
+
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                return None
+
+            # Su Windows non si può rinominare un file aperto
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            os.replace(self.path, self.path_compattazione)
+            return self.path_compattazione
+
+    def conferma(self, path: str):
+        """Elimina un blocco di voci ormai compattato negli Excel"""
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def chiudi(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
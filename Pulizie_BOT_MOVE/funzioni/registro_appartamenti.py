@@ -0,0 +1,143 @@
+"""
+Registro appartamenti in memoria
+Legge appartamenti.xlsx una volta e lo rilegge solo quando il file cambia
+(mtime/size). Lookup per id e per nome normalizzato, coordinate già in float
+e indice spaziale per la ricerca degli appartamenti vicini.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from typing import Optional, List, Dict
+
+import openpyxl
+
+from .utils import parse_coordinate
+from .indice_spaziale import IndiceSpaziale
+
+
+def normalizza_nome(testo: str) -> str:
+    """Normalizza un nome per i confronti: minuscolo, senza accenti né punteggiatura"""
+    if not testo:
+        return ''
+    testo = unicodedata.normalize('NFKD', str(testo))
+    testo = ''.join(c for c in testo if not unicodedata.combining(c))
+    testo = re.sub(r'[^a-z0-9]+', ' ', testo.lower())
+    return testo.strip()
+
+
+class RegistroAppartamenti:
+    """
+    Appartamenti da Excel tenuti in memoria.
+
+    Ogni appartamento è un dict con le chiavi storiche di get_all_appartamenti
+    (id, nome, indirizzo, coordinate, attivo) più 'lat'/'lon' già convertiti in
+    float (None se la colonna M è vuota o non valida).
+    """
+
+    def __init__(self, path: str, cella_metri: float = 300):
+        self.path = path
+        self.cella_metri = cella_metri
+        self.versione = 0          # incrementata ad ogni ricaricamento
+        self._lock = threading.RLock()
+        self._firma = None
+        self._lista = []
+        self._by_id = {}
+        self._by_nome = {}
+        self._indice = None
+
+    def _valida(self):
+        """Ricarica l'Excel solo se mtime/size sono cambiati dall'ultima lettura"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            print(f"⚠️ File Excel appartamenti non trovato: {self.path}")
+            return
+
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._firma:
+            return
+
+        try:
+            self._carica()
+            self._firma = firma
+            self.versione += 1
+        except Exception as e:
+            # Si tengono i dati dell'ultima lettura valida e si riprova alla prossima chiamata
+            print(f"❌ Errore lettura Excel appartamenti: {e}")
+
+    def _carica(self):
+        wb = openpyxl.load_workbook(self.path, read_only=True)
+        try:
+            sheet = wb.active
+            lista = []
+
+            # Leggi righe Excel: A=Gestione, B=Nome, C=Nome OTA, D=Indirizzo, M=Coordinate GPS (colonna 12)
+            for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=1):
+                if not row or not row[1]:  # Salta righe vuote (verifica colonna B = nome)
+                    continue
+
+                # Colonna M (indice 12) per coordinate GPS nel formato "lat,lon"
+                coordinate = str(row[12]).strip() if len(row) > 12 and row[12] and str(row[12]).strip() not in ['', 'None', 'Vero', 'Falso'] else None
+                coords = parse_coordinate(coordinate) if coordinate else None
+
+                lista.append({
+                    'id': row_num,  # Usa numero riga come ID
+                    'nome': str(row[1]) if len(row) > 1 and row[1] else 'Senza nome',  # Colonna B
+                    'indirizzo': str(row[3]) if len(row) > 3 and row[3] else '',  # Colonna D
+                    'coordinate': coordinate,  # Colonna M
+                    'attivo': str(row[4]) if len(row) > 4 and row[4] else 'Vero',  # Colonna E
+                    'lat': coords[0] if coords else None,
+                    'lon': coords[1] if coords else None
+                })
+        finally:
+            wb.close()
+
+        by_nome = {}
+        for app in lista:
+            by_nome.setdefault(normalizza_nome(app['nome']), app)
+
+        self._lista = lista
+        self._by_id = {app['id']: app for app in lista}
+        self._by_nome = by_nome
+
+        # Indice spaziale ricostruito solo qui, cioè quando l'Excel cambia
+        self._indice = IndiceSpaziale(
+            [(app['lat'], app['lon'], app) for app in lista if app['lat'] is not None],
+            cella_metri=self.cella_metri
+        )
+
+    def tutti(self) -> List[Dict]:
+        """Tutti gli appartamenti (copie: i chiamanti possono modificarle)"""
+        with self._lock:
+            self._valida()
+            return [dict(app) for app in self._lista]
+
+    def get(self, appartamento_id: int) -> Optional[Dict]:
+        with self._lock:
+            self._valida()
+            app = self._by_id.get(appartamento_id)
+            return dict(app) if app else None
+
+    def get_by_nome(self, nome: str) -> Optional[Dict]:
+        """Lookup per nome normalizzato (maiuscole, accenti e punteggiatura ignorati)"""
+        with self._lock:
+            self._valida()
+            app = self._by_nome.get(normalizza_nome(nome))
+            return dict(app) if app else None
+
+    def vicini(self, lat: float, lon: float, raggio_metri: float, limite: int = None) -> List[Dict]:
+        """
+        Appartamenti entro raggio_metri da (lat, lon), ordinati per distanza.
+        Ogni dict restituito ha in più la chiave 'distanza' (metri).
+        """
+        with self._lock:
+            self._valida()
+            if self._indice is None:
+                return []
+            trovati = self._indice.entro_raggio(lat, lon, raggio_metri)
+
+        if limite is not None:
+            trovati = trovati[:limite]
+        return [dict(app, distanza=distanza) for distanza, app in trovati]
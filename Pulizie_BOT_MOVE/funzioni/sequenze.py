@@ -0,0 +1,61 @@
+"""
+Sequenze ID persistenti (file contatore accanto all'Excel)
+
+Esempio: turni.xlsx -> turni.xlsx.seq contiene l'ultimo ID assegnato.
+Ogni allocazione legge e riscrive solo il contatore sotto FileLock, in tempo
+costante e in modo atomico anche tra processi diversi. Gli ID non vengono mai
+riutilizzati, nemmeno dopo l'eliminazione delle righe più recenti.
+"""
+
+import os
+import logging
+from typing import Callable
+
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+class SequenzaId:
+    """Contatore ID persistente protetto da file lock"""
+
+    def __init__(self, path_excel: str):
+        self.path = f"{path_excel}.seq"
+        self._lock = FileLock(f"{path_excel}.seq.lock", timeout=10)
+
+    def _leggi(self) -> int:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _scrivi(self, valore: int):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(valore))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def inizializza(self, max_id_esistente: int):
+        """Allinea il contatore al massimo ID già presente (mai all'indietro)"""
+        with self._lock:
+            attuale = self._leggi()
+            if max_id_esistente > attuale:
+                self._scrivi(max_id_esistente)
+                logger.info(f"Sequenza {os.path.basename(self.path)} inizializzata a {max_id_esistente}")
+
+    def prossimo(self, max_id_esistente: Callable[[], int] = None) -> int:
+        """
+        Restituisce il prossimo ID. Se il contatore non esiste ancora viene
+        inizializzato con max_id_esistente() (solo la prima volta).
+        """
+        with self._lock:
+            if not os.path.exists(self.path) and max_id_esistente is not None:
+                attuale = max_id_esistente()
+            else:
+                attuale = self._leggi()
+            nuovo = attuale + 1
+            self._scrivi(nuovo)
+            return nuovo
@@ -10,7 +10,7 @@ from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
 
-from . import database as db
+from . import database_async as db
 from .utils import (
     format_turno_info, format_ora, format_ore, 
     calcola_distanza_haversine, format_distanza, parse_coordinate
@@ -40,7 +40,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Verifica se utente è già registrato
         logger.info(f"Recupero dati utente {user_id}...")
-        user = db.get_user(user_id)
+        user = await db.get_user(user_id)
         logger.info(f"Risultato get_user: {user}")
         
         if user:
@@ -105,10 +105,10 @@ async def registrazione_nome(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return REGISTRAZIONE_NOME
     
     # Registra utente
-    success = db.register_user(user_id, username, nome, cognome)
+    success = await db.register_user(user_id, username, nome, cognome)
     
     if success:
-        user_data = db.get_user(user_id)
+        user_data = await db.get_user(user_id)
         await show_main_menu(update, context, user_data)
         logger.info(f"Nuovo utente registrato: {nome} {cognome} ({user_id})")
     else:
@@ -146,7 +146,7 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, use
     nome = user['nome']
     
     # Verifica se ha turno in corso
-    turno_in_corso = db.get_turno_in_corso(user_id)
+    turno_in_corso = await db.get_turno_in_corso(user_id)
     
     # Usa la funzione helper per la tastiera
     reply_markup = get_main_keyboard(user_id)
@@ -181,7 +181,7 @@ async def seleziona_appartamento(update: Update, context: ContextTypes.DEFAULT_T
     if query:
         await query.answer()
     
-    user = db.get_user(update.effective_user.id)
+    user = await db.get_user(update.effective_user.id)
     
     # Chiedi posizione o cerca (senza mostra tutti per evitare troppi pulsanti)
     keyboard = [
@@ -203,64 +203,54 @@ async def seleziona_appartamento(update: Update, context: ContextTypes.DEFAULT_T
     return SELEZIONE_IMMOBILE
 
 
-async def mostra_appartamenti(update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                               user_location: Optional[tuple] = None):
-    """Mostra lista appartamenti (opzionalmente filtrati per distanza con Google Maps API)"""
-    query = update.callback_query
-    if query:
-        await query.answer()
+async def _appartamenti_vicini(user_location: tuple, con_geocoding: bool = False) -> list:
+    """
+    Appartamenti entro GPS_TOLERANCE_METERS dalla posizione utente, ordinati per
+    distanza (max 20). Usa l'indice spaziale del registro appartamenti.
     
-    appartamenti = db.get_all_appartamenti()
+    Con con_geocoding=True (e Google Maps configurato) vengono considerati anche
+    gli appartamenti senza coordinate in colonna M il cui indirizzo è già nella
+    cache del geocoding (gli altri vengono geocodificati in background).
+    """
+    user_lat, user_lon = user_location
+    vicini = await db.get_appartamenti_vicini(user_lat, user_lon, GPS_TOLERANCE_METERS, limite=20)
     
-    # Arricchisci appartamenti con geocoding se mancano coordinate
-    from .google_maps_helper import enrich_appartamenti_with_geocoding, get_distance_matrix
     from .config import GOOGLE_MAPS_API_KEY
-    
-    # Se Google Maps è configurato, usa geocoding per indirizzi senza coordinate
-    if GOOGLE_MAPS_API_KEY:
-        appartamenti = enrich_appartamenti_with_geocoding(appartamenti)
-    
-    # Se abbiamo posizione utente, calcola distanze
-    appartamenti_con_distanza = []
-    
-    for app in appartamenti:
-        app_data = dict(app)
+    if con_geocoding and GOOGLE_MAPS_API_KEY:
+        from .google_maps_helper import enrich_appartamenti_with_geocoding
         
-        if user_location and app.get('coordinate'):
-            # Parse coordinate appartamento
-            coords = parse_coordinate(app['coordinate'])
+        senza_coordinate = [app for app in await db.get_all_appartamenti() if app['lat'] is None]
+        for app in enrich_appartamenti_with_geocoding(senza_coordinate):
+            coords = parse_coordinate(app.get('coordinate'))
             if coords:
-                app_lat, app_lon = coords
-                user_lat, user_lon = user_location
-                
-                # Usa Haversine per distanza veloce
-                distanza = calcola_distanza_haversine(user_lat, user_lon, app_lat, app_lon)
-                app_data['distanza'] = distanza
-            else:
-                app_data['distanza'] = None
-        else:
-            app_data['distanza'] = None
-        
-        appartamenti_con_distanza.append(app_data)
+                distanza = calcola_distanza_haversine(user_lat, user_lon, coords[0], coords[1])
+                if distanza <= GPS_TOLERANCE_METERS:
+                    vicini.append(dict(app, distanza=distanza))
+        vicini.sort(key=lambda x: x['distanza'])
     
-    # Ordina per distanza se disponibile
-    if user_location:
-        appartamenti_con_distanza.sort(key=lambda x: x['distanza'] if x['distanza'] is not None else float('inf'))
+    return vicini[:20]
+
+
+async def mostra_appartamenti(update: Update, context: ContextTypes.DEFAULT_TYPE, 
+                               user_location: Optional[tuple] = None):
+    """Mostra lista appartamenti (opzionalmente filtrati per distanza con Google Maps API)"""
+    query = update.callback_query
+    if query:
+        await query.answer()
     
     # Crea keyboard - se GPS attivo, mostra solo quelli entro 300m
     keyboard = []
     
     if user_location:
-        # Filtra solo appartamenti entro 300m
+        # Solo appartamenti entro 300m, già ordinati per distanza
         text = "📍 *Appartamenti vicini (entro 300 m):*\n\n"
         
-        for app in appartamenti_con_distanza[:20]:
-            if app['distanza'] is not None and app['distanza'] <= GPS_TOLERANCE_METERS:
-                dist_str = format_distanza(app['distanza'])
-                label = f"📍 {app['nome']} ({dist_str})"
-                keyboard.append([
-                    InlineKeyboardButton(label, callback_data=f"app_{app['id']}")
-                ])
+        for app in await _appartamenti_vicini(user_location, con_geocoding=True):
+            dist_str = format_distanza(app['distanza'])
+            label = f"📍 {app['nome']} ({dist_str})"
+            keyboard.append([
+                InlineKeyboardButton(label, callback_data=f"app_{app['id']}")
+            ])
         
         if not keyboard:
             # Nessun appartamento vicino - offri ricerca
@@ -274,7 +264,7 @@ async def mostra_appartamenti(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Senza GPS, mostra tutti (questo caso non dovrebbe più verificarsi)
         text = "📍 *Seleziona l'appartamento:*\n\n"
         
-        for app in appartamenti_con_distanza:
+        for app in await db.get_all_appartamenti():
             label = f"🏠 {app['nome']}"
             keyboard.append([
                 InlineKeyboardButton(label, callback_data=f"app_{app['id']}")
@@ -352,7 +342,7 @@ async def appartamento_selezionato(update: Update, context: ContextTypes.DEFAULT
     else:
         app_id = int(query.data.split('_')[1])
     
-    appartamento = db.get_appartamento(app_id)
+    appartamento = await db.get_appartamento(app_id)
     
     if not appartamento:
         await query.edit_message_text("❌ Appartamento non trovato")
@@ -381,7 +371,7 @@ async def appartamento_selezionato(update: Update, context: ContextTypes.DEFAULT
 async def ricevi_video_ingresso(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Riceve video di ingresso e crea turno"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     appartamento = context.user_data.get('appartamento_selezionato')
     
     if not appartamento:
@@ -419,7 +409,7 @@ async def ricevi_video_ingresso(update: Update, context: ContextTypes.DEFAULT_TY
         
         # Crea turno nel database (con gestione turno doppio)
         try:
-            turno_id = db.create_turno(
+            turno_id = await db.create_turno(
                 user_id=user_id,
                 appartamento_id=appartamento['id'],
                 video_path=video_path,
@@ -496,7 +486,7 @@ async def termina_turno(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Estrai turno_id
     turno_id = int(query.data.split('_')[1])
-    turno = db.get_turno_in_corso(update.effective_user.id)
+    turno = await db.get_turno_in_corso(update.effective_user.id)
     
     if not turno or turno['id'] != turno_id:
         await query.edit_message_text("❌ Turno non trovato o già completato")
@@ -519,7 +509,7 @@ async def termina_turno(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ricevi_video_uscita(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Riceve video di uscita e completa turno"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     # Verifica che sia un video
     if not update.message.video and not (update.message.document and update.message.document.mime_type and 'video' in update.message.document.mime_type):
@@ -531,7 +521,7 @@ async def ricevi_video_uscita(update: Update, context: ContextTypes.DEFAULT_TYPE
         return VIDEO_USCITA
     
     # Prendi turno in corso
-    turno = db.get_turno_in_corso(user_id)
+    turno = await db.get_turno_in_corso(user_id)
     
     if not turno:
         await update.message.reply_text(
@@ -560,7 +550,7 @@ async def ricevi_video_uscita(update: Update, context: ContextTypes.DEFAULT_TYPE
             pass
         
         # Completa turno nel database
-        ore_lavorate = db.complete_turno(
+        ore_lavorate = await db.complete_turno(
             turno_id=turno['id'],
             video_path=video_path,
             video_file_id=video_file_id,
@@ -597,7 +587,7 @@ async def ricevi_video_uscita(update: Update, context: ContextTypes.DEFAULT_TYPE
         context.user_data['ultimo_appartamento'] = turno['appartamento_nome']
         
         # Torna al menu principale
-        user_data = db.get_user(user_id)
+        user_data = await db.get_user(user_id)
         await show_main_menu(update, context, user_data)
         
         return ConversationHandler.END
@@ -633,7 +623,7 @@ async def segnala_prodotti(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return SEGNALA_PRODOTTI
     
     # Da pulsante - controlla se ha turno aperto
-    turno = db.get_turno_in_corso(user_id)
+    turno = await db.get_turno_in_corso(user_id)
     
     if turno:
         # Ha turno aperto - usa quello
@@ -684,52 +674,18 @@ async def mostra_appartamenti_per_segnalazione(update: Update, context: ContextT
     if query:
         await query.answer()
     
-    appartamenti = db.get_all_appartamenti()
-    
-    # Arricchisci con geocoding se necessario
-    from .google_maps_helper import enrich_appartamenti_with_geocoding
-    from .config import GOOGLE_MAPS_API_KEY
-    
-    if GOOGLE_MAPS_API_KEY:
-        appartamenti = enrich_appartamenti_with_geocoding(appartamenti)
-    
-    # Calcola distanze se abbiamo GPS
-    appartamenti_con_distanza = []
-    
-    for app in appartamenti:
-        app_data = dict(app)
-        
-        if user_location and app.get('coordinate'):
-            coords = parse_coordinate(app['coordinate'])
-            if coords:
-                app_lat, app_lon = coords
-                user_lat, user_lon = user_location
-                distanza = calcola_distanza_haversine(user_lat, user_lon, app_lat, app_lon)
-                app_data['distanza'] = distanza
-            else:
-                app_data['distanza'] = None
-        else:
-            app_data['distanza'] = None
-        
-        appartamenti_con_distanza.append(app_data)
-    
-    # Ordina per distanza
-    if user_location:
-        appartamenti_con_distanza.sort(key=lambda x: x['distanza'] if x['distanza'] is not None else float('inf'))
-    
     # Crea keyboard - se GPS attivo, mostra solo quelli entro 300m
     keyboard = []
     
     if user_location:
         text = "📦 *Cosa manca?*\n\n📍 *Appartamenti vicini (entro 300 m):*\n\n"
         
-        for app in appartamenti_con_distanza[:20]:
-            if app['distanza'] is not None and app['distanza'] <= GPS_TOLERANCE_METERS:
-                dist_str = format_distanza(app['distanza'])
-                label = f"📍 {app['nome']} ({dist_str})"
-                keyboard.append([
-                    InlineKeyboardButton(label, callback_data=f"segnala_app_{app['id']}")
-                ])
+        for app in await _appartamenti_vicini(user_location, con_geocoding=True):
+            dist_str = format_distanza(app['distanza'])
+            label = f"📍 {app['nome']} ({dist_str})"
+            keyboard.append([
+                InlineKeyboardButton(label, callback_data=f"segnala_app_{app['id']}")
+            ])
         
         if not keyboard:
             keyboard = [
@@ -741,7 +697,7 @@ async def mostra_appartamenti_per_segnalazione(update: Update, context: ContextT
     else:
         text = "📦 *Cosa manca?*\n\n📍 *Seleziona l'appartamento:*\n\n"
         
-        for app in appartamenti_con_distanza:
+        for app in await db.get_all_appartamenti():
             label = f"🏠 {app['nome']}"
             keyboard.append([
                 InlineKeyboardButton(label, callback_data=f"segnala_app_{app['id']}")
@@ -807,7 +763,7 @@ async def segnala_ricevi_gps(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def ricevi_segnalazione(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Riceve segnalazione prodotti e notifica admin"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     query = update.callback_query
     message = update.message
     
@@ -828,7 +784,7 @@ async def ricevi_segnalazione(update: Update, context: ContextTypes.DEFAULT_TYPE
     if query and query.data.startswith('segnala_app_'):
         await query.answer()
         app_id = int(query.data.split('_')[2])
-        appartamento = db.get_appartamento(app_id)
+        appartamento = await db.get_appartamento(app_id)
         
         context.user_data['appartamento_segnalazione'] = app_id
         
@@ -846,13 +802,13 @@ async def ricevi_segnalazione(update: Update, context: ContextTypes.DEFAULT_TYPE
     descrizione = update.message.text.strip()
     
     # Usa turno se disponibile, altrimenti appartamento selezionato
-    turno = db.get_turno_in_corso(user_id)
+    turno = await db.get_turno_in_corso(user_id)
     
     if turno:
         appartamento_id = turno['appartamento_id']
         appartamento_nome = turno['appartamento_nome']
     elif appartamento_id:
-        appartamento = db.get_appartamento(appartamento_id)
+        appartamento = await db.get_appartamento(appartamento_id)
         appartamento_nome = appartamento['nome']
     else:
         await update.message.reply_text(
@@ -863,7 +819,7 @@ async def ricevi_segnalazione(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Crea richiesta (con gestione errori di validazione)
     try:
-        richiesta_id = db.create_richiesta(
+        richiesta_id = await db.create_richiesta(
             user_id=user_id,
             appartamento_id=appartamento_id,
             descrizione=descrizione,
@@ -908,12 +864,12 @@ async def ricevi_segnalazione(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         
         # Aggiorna richiesta con message_id per edit successivo
-        db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
+        await db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
     
     logger.info(f"Richiesta prodotti {richiesta_id}: {user['nome']} @ {appartamento_nome}")
     
     # Torna al menu principale
-    user_data = db.get_user(user_id)
+    user_data = await db.get_user(user_id)
     await show_main_menu(update, context, user_data)
     
     return ConversationHandler.END
@@ -924,10 +880,10 @@ async def ricevi_segnalazione(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def manca_materiale_pulizie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inizia flusso per segnalazione materiale pulizie mancante"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     # Leggi prodotti da Excel
-    materiali = db.get_materiali_pulizie()
+    materiali = await db.get_materiali_pulizie()
     
     if not materiali:
         await update.message.reply_text(
@@ -967,7 +923,7 @@ async def manca_pulizie_callback(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     data = query.data
-    materiali = db.get_materiali_pulizie()
+    materiali = await db.get_materiali_pulizie()
     selezionati = context.user_data.get('prodotti_selezionati_pulizie', [])
     
     if data == "matpul_annulla":
@@ -1136,37 +1092,14 @@ async def matpul_ricevi_posizione(update: Update, context: ContextTypes.DEFAULT_
         reply_markup=get_main_keyboard(update.effective_user.id)
     )
     
-    appartamenti = db.get_all_appartamenti()
-    
-    # Calcola distanze
-    appartamenti_con_distanza = []
-    for app in appartamenti:
-        app_data = dict(app)
-        if app.get('coordinate'):
-            coords = parse_coordinate(app['coordinate'])
-            if coords:
-                app_lat, app_lon = coords
-                user_lat, user_lon = user_location
-                distanza = calcola_distanza_haversine(user_lat, user_lon, app_lat, app_lon)
-                app_data['distanza'] = distanza
-            else:
-                app_data['distanza'] = None
-        else:
-            app_data['distanza'] = None
-        appartamenti_con_distanza.append(app_data)
-    
-    # Ordina per distanza
-    appartamenti_con_distanza.sort(key=lambda x: x['distanza'] if x['distanza'] is not None else float('inf'))
-    
-    # Crea keyboard - solo quelli entro 300m
+    # Crea keyboard - solo quelli entro 300m (già ordinati per distanza)
     keyboard = []
-    for app in appartamenti_con_distanza[:20]:
-        if app['distanza'] is not None and app['distanza'] <= GPS_TOLERANCE_METERS:
-            dist_str = format_distanza(app['distanza'])
-            label = f"📍 {app['nome']} ({dist_str})"
-            keyboard.append([
-                InlineKeyboardButton(label, callback_data=f"matpul_app_{app['id']}")
-            ])
+    for app in await _appartamenti_vicini(user_location):
+        dist_str = format_distanza(app['distanza'])
+        label = f"📍 {app['nome']} ({dist_str})"
+        keyboard.append([
+            InlineKeyboardButton(label, callback_data=f"matpul_app_{app['id']}")
+        ])
     
     if not keyboard:
         # Nessun appartamento vicino - offri ricerca
@@ -1211,7 +1144,7 @@ async def manca_pulizie_appartamento_callback(update: Update, context: ContextTy
         return RICERCA_APPARTAMENTO
     
     if data == "matpul_mostra_tutti_app":
-        appartamenti = db.get_all_appartamenti()
+        appartamenti = await db.get_all_appartamenti()
         keyboard = []
         for app in appartamenti:
             keyboard.append([
@@ -1228,7 +1161,7 @@ async def manca_pulizie_appartamento_callback(update: Update, context: ContextTy
     
     if data.startswith("matpul_app_"):
         app_id = int(data.split('_')[2])
-        appartamento = db.get_appartamento(app_id)
+        appartamento = await db.get_appartamento(app_id)
         
         if not appartamento:
             await query.edit_message_text("❌ Appartamento non trovato")
@@ -1251,7 +1184,7 @@ async def manca_pulizie_appartamento_callback(update: Update, context: ContextTy
 async def manca_pulizie_info_consegna(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Riceve info consegna e completa richiesta materiale pulizie"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     info_consegna = ""
     if update.message.text and not update.message.text.startswith('/skip'):
@@ -1268,7 +1201,7 @@ async def manca_pulizie_info_consegna(update: Update, context: ContextTypes.DEFA
         return ConversationHandler.END
     
     try:
-        richiesta_id = db.create_richiesta(
+        richiesta_id = await db.create_richiesta(
             user_id=user_id,
             appartamento_id=appartamento['id'],
             descrizione=prodotti,
@@ -1314,7 +1247,7 @@ async def manca_pulizie_info_consegna(update: Update, context: ContextTypes.DEFA
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
-        db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
+        await db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
     
     # Pulisci context
     context.user_data.pop('prodotti_selezionati_pulizie', None)
@@ -1338,7 +1271,7 @@ async def manca_pulizie_info_consegna(update: Update, context: ContextTypes.DEFA
 async def manca_appartamento(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inizia flusso per segnalazione materiale appartamento mancante (operazioni mensili)"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     # Reset
     context.user_data['tipo_segnalazione'] = 'appartamento'
@@ -1402,37 +1335,14 @@ async def matapp_ricevi_posizione(update: Update, context: ContextTypes.DEFAULT_
         reply_markup=get_main_keyboard(update.effective_user.id)
     )
     
-    appartamenti = db.get_all_appartamenti()
-    
-    # Calcola distanze
-    appartamenti_con_distanza = []
-    for app in appartamenti:
-        app_data = dict(app)
-        if app.get('coordinate'):
-            coords = parse_coordinate(app['coordinate'])
-            if coords:
-                app_lat, app_lon = coords
-                user_lat, user_lon = user_location
-                distanza = calcola_distanza_haversine(user_lat, user_lon, app_lat, app_lon)
-                app_data['distanza'] = distanza
-            else:
-                app_data['distanza'] = None
-        else:
-            app_data['distanza'] = None
-        appartamenti_con_distanza.append(app_data)
-    
-    # Ordina per distanza
-    appartamenti_con_distanza.sort(key=lambda x: x['distanza'] if x['distanza'] is not None else float('inf'))
-    
-    # Crea keyboard - solo quelli entro 300m
+    # Crea keyboard - solo quelli entro 300m (già ordinati per distanza)
     keyboard = []
-    for app in appartamenti_con_distanza[:20]:
-        if app['distanza'] is not None and app['distanza'] <= GPS_TOLERANCE_METERS:
-            dist_str = format_distanza(app['distanza'])
-            label = f"📍 {app['nome']} ({dist_str})"
-            keyboard.append([
-                InlineKeyboardButton(label, callback_data=f"matapp_app_{app['id']}")
-            ])
+    for app in await _appartamenti_vicini(user_location):
+        dist_str = format_distanza(app['distanza'])
+        label = f"📍 {app['nome']} ({dist_str})"
+        keyboard.append([
+            InlineKeyboardButton(label, callback_data=f"matapp_app_{app['id']}")
+        ])
     
     if not keyboard:
         # Nessun appartamento vicino - offri ricerca
@@ -1477,7 +1387,7 @@ async def manca_app_selezione_callback(update: Update, context: ContextTypes.DEF
         return RICERCA_APPARTAMENTO
     
     if data == "matapp_mostra_tutti_app":
-        appartamenti = db.get_all_appartamenti()
+        appartamenti = await db.get_all_appartamenti()
         keyboard = []
         for app in appartamenti:
             keyboard.append([
@@ -1494,7 +1404,7 @@ async def manca_app_selezione_callback(update: Update, context: ContextTypes.DEF
     
     if data.startswith("matapp_app_"):
         app_id = int(data.split('_')[2])
-        appartamento = db.get_appartamento(app_id)
+        appartamento = await db.get_appartamento(app_id)
         
         if not appartamento:
             await query.edit_message_text("❌ Appartamento non trovato")
@@ -1504,7 +1414,7 @@ async def manca_app_selezione_callback(update: Update, context: ContextTypes.DEF
         context.user_data['prodotti_selezionati_app'] = []
         
         # Mostra prodotti appartamento
-        materiali = db.get_materiali_appartamento()
+        materiali = await db.get_materiali_appartamento()
         
         keyboard = []
         for i, mat in enumerate(materiali):
@@ -1532,7 +1442,7 @@ async def manca_app_prodotti_callback(update: Update, context: ContextTypes.DEFA
     await query.answer()
     
     data = query.data
-    materiali = db.get_materiali_appartamento()
+    materiali = await db.get_materiali_appartamento()
     selezionati = context.user_data.get('prodotti_selezionati_app', [])
     appartamento = context.user_data.get('appartamento_manca_app', {})
     
@@ -1623,14 +1533,14 @@ async def manca_app_completa(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Completa richiesta manca appartamento (da callback)"""
     query = update.callback_query
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     selezionati = context.user_data.get('prodotti_selezionati_app', [])
     appartamento = context.user_data.get('appartamento_manca_app', {})
     prodotti = ", ".join(selezionati)
     
     try:
-        richiesta_id = db.create_richiesta(
+        richiesta_id = await db.create_richiesta(
             user_id=user_id,
             appartamento_id=appartamento['id'],
             descrizione=prodotti,
@@ -1670,7 +1580,7 @@ async def manca_app_completa(update: Update, context: ContextTypes.DEFAULT_TYPE)
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
-        db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
+        await db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
     
     # Pulisci context
     context.user_data.pop('prodotti_selezionati_app', None)
@@ -1685,14 +1595,14 @@ async def manca_app_completa(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def manca_app_completa_msg(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Completa richiesta manca appartamento (da messaggio)"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     selezionati = context.user_data.get('prodotti_selezionati_app', [])
     appartamento = context.user_data.get('appartamento_manca_app', {})
     prodotti = ", ".join(selezionati)
     
     try:
-        richiesta_id = db.create_richiesta(
+        richiesta_id = await db.create_richiesta(
             user_id=user_id,
             appartamento_id=appartamento['id'],
             descrizione=prodotti,
@@ -1735,7 +1645,7 @@ async def manca_app_completa_msg(update: Update, context: ContextTypes.DEFAULT_T
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
-        db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
+        await db.update_richiesta_message_id(richiesta_id, admin_message.message_id)
     
     # Pulisci context
     context.user_data.pop('prodotti_selezionati_app', None)
@@ -1755,11 +1665,11 @@ async def mostra_ore_oggi(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     oggi = datetime.now().date()
     
     # Ottieni turni di oggi
-    turni = db.get_turni_by_user(user_id, oggi, oggi)
+    turni = await db.get_turni_by_user(user_id, oggi, oggi)
     
     if not turni:
         await query.edit_message_text(
@@ -1824,7 +1734,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def chiedi_allegati_liberi(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Informa l'utente che può allegare liberamente senza entrare in uno stato specifico"""
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     text = "📎 *Allega Liberamente*\n\n"
     text += "Puoi inviare in qualsiasi momento:\n"
@@ -1850,15 +1760,15 @@ async def ricevi_allegati_liberi(update: Update, context: ContextTypes.DEFAULT_T
     from . import allegati_handler as ah
     
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     # Verifica se ha appartamento attivo o chiedi quale
     appartamento = None
     
     # Prova a recuperare appartamento dal turno in corso
-    turno_attivo = db.get_turno_in_corso(user_id)
+    turno_attivo = await db.get_turno_in_corso(user_id)
     if turno_attivo:
-        appartamento = db.get_appartamento(turno_attivo['appartamento_id'])
+        appartamento = await db.get_appartamento(turno_attivo['appartamento_id'])
     
     # Se non ha turno attivo, DEVE scegliere appartamento
     if not appartamento:
@@ -1940,7 +1850,7 @@ async def scegli_appartamento_per_allegato(update: Update, context: ContextTypes
     query = update.callback_query
     await query.answer()
     
-    appartamenti = db.get_all_appartamenti()
+    appartamenti = await db.get_all_appartamenti()
     
     keyboard = []
     
@@ -1973,7 +1883,7 @@ async def appartamento_selezionato_per_allegato(update: Update, context: Context
     
     # Estrai ID appartamento
     app_id = int(query.data.split('_')[2])
-    appartamento = db.get_appartamento(app_id)
+    appartamento = await db.get_appartamento(app_id)
     
     if not appartamento:
         await query.edit_message_text("❌ Appartamento non trovato")
@@ -1986,7 +1896,7 @@ async def appartamento_selezionato_per_allegato(update: Update, context: Context
         return
     
     user_id = query.from_user.id
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     
     from . import allegati_handler as ah
     
@@ -2071,7 +1981,7 @@ async def ricerca_appartamento_testo(update: Update, context: ContextTypes.DEFAU
         )
         return RICERCA_APPARTAMENTO
     
-    appartamenti = db.get_all_appartamenti()
+    appartamenti = await db.get_all_appartamenti()
     ricerca_context = context.user_data.get('ricerca_context', 'turno')
     
     # Filtra appartamenti che matchano la ricerca
@@ -2255,37 +2165,14 @@ async def ricevi_testo_ricerca_allegato(update: Update, context: ContextTypes.DE
 
 async def mostra_appartamenti_per_allegato_gps(update: Update, context: ContextTypes.DEFAULT_TYPE, user_location: tuple):
     """Mostra appartamenti vicini per allegato"""
-    appartamenti = db.get_all_appartamenti()
-    
-    # Calcola distanze
-    appartamenti_con_distanza = []
-    for app in appartamenti:
-        app_data = dict(app)
-        if app.get('coordinate'):
-            coords = parse_coordinate(app['coordinate'])
-            if coords:
-                app_lat, app_lon = coords
-                user_lat, user_lon = user_location
-                distanza = calcola_distanza_haversine(user_lat, user_lon, app_lat, app_lon)
-                app_data['distanza'] = distanza
-            else:
-                app_data['distanza'] = None
-        else:
-            app_data['distanza'] = None
-        appartamenti_con_distanza.append(app_data)
-    
-    # Ordina per distanza
-    appartamenti_con_distanza.sort(key=lambda x: x['distanza'] if x['distanza'] is not None else float('inf'))
-    
-    # Crea keyboard - solo quelli entro 300m
+    # Crea keyboard - solo quelli entro 300m (già ordinati per distanza)
     keyboard = []
-    for app in appartamenti_con_distanza[:20]:
-        if app['distanza'] is not None and app['distanza'] <= GPS_TOLERANCE_METERS:
-            dist_str = format_distanza(app['distanza'])
-            label = f"📍 {app['nome']} ({dist_str})"
-            keyboard.append([
-                InlineKeyboardButton(label, callback_data=f"allega_app_{app['id']}")
-            ])
+    for app in await _appartamenti_vicini(user_location):
+        dist_str = format_distanza(app['distanza'])
+        label = f"📍 {app['nome']} ({dist_str})"
+        keyboard.append([
+            InlineKeyboardButton(label, callback_data=f"allega_app_{app['id']}")
+        ])
     
     if not keyboard:
         # Nessun appartamento vicino - offri ricerca
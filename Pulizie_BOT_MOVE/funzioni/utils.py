@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from typing import Tuple, Optional
 from math import radians, cos, sin, asin, sqrt
 
+import numpy as np
+
 from .config import (
     DATE_FORMAT, TIME_FORMAT, DATETIME_FORMAT,
     LOG_FILE, LOG_LEVEL, GPS_TOLERANCE_METERS
@@ -110,6 +112,47 @@ def calcola_distanza_haversine(lat1: float, lon1: float, lat2: float, lon2: floa
     return c * r
 
 
+def distanze_haversine(lat: float, lon: float, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distanze in metri da un punto a N punti in un solo passaggio vettoriale
+    
+    Args:
+        lat, lon: Punto di riferimento (es. posizione utente)
+        lats, lons: Array (o liste) float64 con le coordinate degli altri punti
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (distanze_metri, indici ordinati per distanza crescente)
+    """
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    lat0, lon0 = radians(lat), radians(lon)
+    
+    a = np.sin((lats - lat0) / 2) ** 2 + cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    distanze = 2 * 6371000 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    
+    return distanze, np.argsort(distanze, kind='stable')
+
+
+def matrice_distanze_haversine(lats, lons) -> np.ndarray:
+    """
+    Matrice NxN delle distanze in metri tra tutti i punti (per pianificare percorsi)
+    
+    Args:
+        lats, lons: Array (o liste) float64 con le coordinate dei punti
+    
+    Returns:
+        np.ndarray: matrice simmetrica [i, j] = distanza tra punto i e punto j
+    """
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    
+    dlat = lats[:, None] - lats[None, :]
+    dlon = lons[:, None] - lons[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lats)[:, None] * np.cos(lats)[None, :] * np.sin(dlon / 2) ** 2
+    
+    return 2 * 6371000 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
 def is_vicino(user_lat: float, user_lon: float, app_lat: float, app_lon: float,
               tolerance: float = GPS_TOLERANCE_METERS) -> Tuple[bool, float]:
     """